@@ -1,87 +1,125 @@
 import chess
+import chess.engine
 
-def analyze_game(game, engine, eco_database):
-    results = {}
-
-    # Temel bilgiler
-    results['White'] = game.headers.get("White", "Unknown")
-    results['Black'] = game.headers.get("Black", "Unknown")
-    results['WhiteElo'] = game.headers.get("WhiteElo", "Unknown")
-    results['BlackElo'] = game.headers.get("BlackElo", "Unknown")
-    results['Result'] = game.headers.get("Result", "Unknown")
-
-    # Tahta ve hamleler
-    board = game.board()
-    move_count = 0
-    white_castled = "Not Castled"
-    black_castled = "Not Castled"
-    is_miniature = "No"
-    for move in game.mainline_moves():
-        move_count += 1
+from eco_utils import eco_database_hash
+from eval_cache import limit_key
+from move_walker import Analyzer, walk_game
+
+# Search of the final position behind ResignationAnalysis.
+FINAL_LIMIT = chess.engine.Limit(time=1)
+
+def _searched_as_far(limit, wanted):
+    """Whether a search under ``limit`` went at least as far as one under ``wanted``."""
+    have, need = limit_key(limit) if limit is not None else None, limit_key(wanted)
+    return have is not None and need is not None and have[0] == need[0] and have[1] >= need[1]
+
+class BasicAnalyzer(Analyzer):
+    """Headers, castling, move count, opening, draw type and resignation analysis."""
+
+    name = "basic"
+    # 2: the final position is no longer taken from a shorter timeline search.
+    version = 2
+    uses_engine = True
+
+    def __init__(self, engine, eco_database, timeline=None):
+        self.engine = engine
+        self.eco_database = eco_database
+        # Openings are looked up in the ECO database, so stored results hold only for the same one.
+        self.data_key = f"eco:{eco_database_hash(eco_database)}"
+        # An eval timeline of the same game, whose last position is reused
+        # when it was searched at least as long as FINAL_LIMIT.
+        self.timeline = timeline
+
+    def start(self, game, board):
+        self.move_count = 0
+        self.white_castled = "Not Castled"
+        self.black_castled = "Not Castled"
+
+    def before_push(self, ctx):
+        board, move = ctx.board, ctx.move
+        self.move_count += 1
 
         if board.is_kingside_castling(move):
             if board.turn:
-                white_castled = "Short"
+                self.white_castled = "Short"
             else:
-                black_castled = "Short"
+                self.black_castled = "Short"
         elif board.is_queenside_castling(move):
             if board.turn:
-                white_castled = "Long"
+                self.white_castled = "Long"
             else:
-                black_castled = "Long"
-
-        board.push(move)
-
-    results['WhiteCastling'] = white_castled
-    results['BlackCastling'] = black_castled
-    results['TotalMoves'] = move_count // 2
-
-    # ECO bilgisi
-    from eco_utils import get_opening_name_and_code
-    eco_code, opening_name = get_opening_name_and_code(board, eco_database)
-    results['OpeningName'] = opening_name
-    results['ECOCode'] = eco_code
-
-    # Sonuç analizi
-    result = game.headers.get("Result", "Unknown")
-    if result == "1/2-1/2": 
-        # Check type of draw
-        if board.is_stalemate():
-            draw_type = "Stalemate"
-        elif board.is_repetition():
-            draw_type = "Threefold Repetition"
-        elif board.is_insufficient_material():
-            draw_type = "Insufficient Material"
-        else:
-            draw_type = "Agreement (Anlaşmalı Berabere)"
-
-        results['DrawType'] = draw_type
-    
-    if result in ["1-0", "0-1"]:
-        evaluation = engine.analyse(board, chess.engine.Limit(time=1))
-        score = evaluation['score'].relative
-        last_move = board.pop()
-        if board.is_checkmate():
-            winning_method = "Checkmate"
-        else:
-            winning_method = "Resignation"
-        board.push(last_move)  
-        results['WinningMethod'] = winning_method
-        if move_count // 2 <= 25:
-            is_miniature = "Yes"
-        results['Miniature'] = is_miniature
-        if score.is_mate():
-            mate_distance = score.mate()
-            if not board.turn:
-                mate_distance *= -1
-
-            if (result == "1-0" and mate_distance < 0 ) or (result == "0-1" and mate_distance > 0):
-                results['ResignationAnalysis'] = "Incorrect, resigning side had a forced mate."
-            elif (result == "1-0" and mate_distance > 0) or (result == "0-1" and mate_distance < 0):
-                results['ResignationAnalysis'] = "Correct, opponent has a forced mate."
+                self.black_castled = "Long"
+
+    def finish(self, game, board):
+        results = {}
+
+        # Temel bilgiler
+        results['White'] = game.headers.get("White", "Unknown")
+        results['Black'] = game.headers.get("Black", "Unknown")
+        results['WhiteElo'] = game.headers.get("WhiteElo", "Unknown")
+        results['BlackElo'] = game.headers.get("BlackElo", "Unknown")
+        results['Result'] = game.headers.get("Result", "Unknown")
+
+        move_count = self.move_count
+        is_miniature = "No"
+        results['WhiteCastling'] = self.white_castled
+        results['BlackCastling'] = self.black_castled
+        results['TotalMoves'] = move_count // 2
+
+        # ECO bilgisi
+        from eco_utils import get_opening_name_and_code
+        eco_code, opening_name = get_opening_name_and_code(board, self.eco_database)
+        results['OpeningName'] = opening_name
+        results['ECOCode'] = eco_code
+
+        # Sonuç analizi
+        result = game.headers.get("Result", "Unknown")
+        if result == "1/2-1/2":
+            # Check type of draw
+            if board.is_stalemate():
+                draw_type = "Stalemate"
+            elif board.is_repetition():
+                draw_type = "Threefold Repetition"
+            elif board.is_insufficient_material():
+                draw_type = "Insufficient Material"
+            else:
+                draw_type = "Agreement (Anlaşmalı Berabere)"
+
+            results['DrawType'] = draw_type
+
+        if result in ["1-0", "0-1"]:
+            timeline = self.timeline
+            if (timeline is not None and len(timeline) == len(board.move_stack) + 1
+                    and _searched_as_far(timeline.limits[-1], FINAL_LIMIT)):
+                evaluation = timeline.best(-1)
             else:
-                results['ResignationAnalysis'] = "Inconsistent evaluation."
-        else:
-            results['ResignationAnalysis'] = "Evaluation does not detect a forced mate."
+                evaluation = self.engine.analyse(board, FINAL_LIMIT)
+            score = evaluation['score'].relative
+            last_move = board.pop()
+            if board.is_checkmate():
+                winning_method = "Checkmate"
+            else:
+                winning_method = "Resignation"
+            board.push(last_move)
+            results['WinningMethod'] = winning_method
+            if move_count // 2 <= 25:
+                is_miniature = "Yes"
+            results['Miniature'] = is_miniature
+            if score.is_mate():
+                mate_distance = score.mate()
+                if not board.turn:
+                    mate_distance *= -1
+
+                if (result == "1-0" and mate_distance < 0 ) or (result == "0-1" and mate_distance > 0):
+                    results['ResignationAnalysis'] = "Incorrect, resigning side had a forced mate."
+                elif (result == "1-0" and mate_distance > 0) or (result == "0-1" and mate_distance < 0):
+                    results['ResignationAnalysis'] = "Correct, opponent has a forced mate."
+                else:
+                    results['ResignationAnalysis'] = "Inconsistent evaluation."
+            else:
+                results['ResignationAnalysis'] = "Evaluation does not detect a forced mate."
 
-    return results
+        return results
+
+def analyze_game(game, engine, eco_database):
+    return walk_game(game, [BasicAnalyzer(engine, eco_database)])
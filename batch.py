@@ -0,0 +1,373 @@
+import argparse
+import multiprocessing.util
+import os
+import signal
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from pgn_utils import collect_pgn_files, iter_games, load_pgn_index, shard_pgn
+from eco_utils import load_eco_database
+from move_store import STORE_SUFFIX, MoveStore
+from stockfish_utils import connect_stockfish, disconnect_stockfish
+from eval_cache import EvalCache, CachedEngine
+from result_store import ResultStore, analyze_incremental, engine_settings
+from result_sinks import open_sink
+from instrumentation import (Instrumentation, InstrumentedEngine, clear_profiles, format_summary, prune_profiles,
+                             read_records)
+from move_walker import walk_game
+from eval_timeline import TimeBudget, search_settings, share_eval_timeline
+from basic_analysis import BasicAnalyzer
+from fork_analysis import ForkAnalyzer
+from check_analysis import CheckAnalyzer
+from en_passant import EnPassantAnalyzer
+from threat_analysis import ThreatAnalyzer
+from pin_analysis import PinAnalyzer
+from zugzwang_analysis import ZugzwangAnalyzer
+from zwichenzug_analysis import ZwischenzugAnalyzer
+
+ANALYZERS = {
+    "basic": lambda engine, eco_database: BasicAnalyzer(engine, eco_database),
+    "forks": lambda engine, eco_database: ForkAnalyzer(),
+    "checks": lambda engine, eco_database: CheckAnalyzer(),
+    "en_passant": lambda engine, eco_database: EnPassantAnalyzer(),
+    "threats": lambda engine, eco_database: ThreatAnalyzer(),
+    "pins": lambda engine, eco_database: PinAnalyzer(),
+    "zugzwang": lambda engine, eco_database: ZugzwangAnalyzer(engine),
+    "zwischenzug": lambda engine, eco_database: ZwischenzugAnalyzer(engine),
+}
+# Engine analyzers of one game share a single eval timeline, see _share_timeline.
+ENGINE_ANALYZERS = {"basic", "zugzwang", "zwischenzug"}
+# The defaults run without an engine; "basic" needs --stockfish.
+DEFAULT_ANALYZERS = ("forks", "checks", "en_passant")
+# Files picked up when a directory is given: PGN files and packed stores.
+SOURCE_SUFFIXES = (".pgn", STORE_SUFFIX)
+
+class GameTimeout(Exception):
+    pass
+
+# Per-worker state, set up once by _init_worker.
+_worker = {}
+
+def _init_worker(eco_directory, stockfish_path, analyzer_names, timeout, eval_cache_path=None,
+                 instrument_path=None, profile_top=0, profile_dir="profiles", result_store_path=None,
+                 time_budget=None):
+    _worker["eco_database"] = load_eco_database(eco_directory)
+    _worker["time_budget"] = time_budget
+    _worker["stockfish_path"] = stockfish_path
+    _worker["eval_cache"] = EvalCache(eval_cache_path) if eval_cache_path else None
+    _worker["instrumentation"] = None
+    if instrument_path:
+        _worker["instrumentation"] = Instrumentation(instrument_path, cache=_worker["eval_cache"],
+                                                     profile_top=profile_top, profile_dir=profile_dir)
+    _worker["engine"] = _connect() if stockfish_path else None
+    _worker["result_store"] = ResultStore(result_store_path) if result_store_path else None
+    _worker["engine_settings"] = (engine_settings(_worker["engine"], search=search_settings(time_budget))
+                                  if stockfish_path else "")
+    _worker["analyzer_names"] = analyzer_names
+    _worker["timeout"] = timeout
+    _build_analyzers()
+    # atexit does not run in pool workers; Finalize does, before the engine
+    # thread could keep the process from exiting.
+    multiprocessing.util.Finalize(None, _close_worker, exitpriority=10)
+
+def _build_analyzers():
+    _worker["analyzers"] = [ANALYZERS[name](_worker["engine"], _worker["eco_database"])
+                            for name in _worker["analyzer_names"]]
+
+def _connect():
+    engine = _worker["process"] = connect_stockfish(_worker["stockfish_path"])
+    if _worker["instrumentation"] is not None:
+        # Inside the cache wrapper, so only real searches are counted.
+        engine = _worker["instrumentation"].engine = InstrumentedEngine(engine)
+    if _worker["eval_cache"] is not None:
+        engine = CachedEngine(engine, _worker["eval_cache"])
+    return engine
+
+def _close_engine():
+    if _worker.get("process") is not None:
+        try:
+            disconnect_stockfish(_worker["process"])
+        except Exception:
+            pass
+        _worker["process"] = _worker["engine"] = None
+
+def _close_worker():
+    _close_engine()
+    if _worker.get("eval_cache") is not None:
+        _worker["eval_cache"].close()
+    if _worker.get("instrumentation") is not None:
+        _worker["instrumentation"].close()
+    if _worker.get("result_store") is not None:
+        _worker["result_store"].close()
+
+def _restart_engine():
+    """Replace an engine that may be stuck in the search a timeout interrupted."""
+    if _worker["stockfish_path"]:
+        _close_engine()
+        _worker["engine"] = _connect()
+        _build_analyzers()
+
+def _on_alarm(signum, frame):
+    raise GameTimeout()
+
+def _share_timeline(game, analyzers, instrumentation=None):
+    """
+    Search the game once for all engine analyzers among ``analyzers``, with
+    ``time_budget`` engine seconds per game when set.
+    """
+    budget = TimeBudget(_worker["time_budget"]) if _worker["time_budget"] else None
+    if instrumentation is None or not any(analyzer.timeline_multipv for analyzer in analyzers):
+        share_eval_timeline(game, _worker["engine"], analyzers, budget)
+    else:
+        with instrumentation.track("eval_timeline"):
+            share_eval_timeline(game, _worker["engine"], analyzers, budget)
+
+def _walk(game, instrumentation=None):
+    analyzers = _worker["analyzers"]
+    if _worker["result_store"] is None:
+        _share_timeline(game, analyzers, instrumentation)
+        return walk_game(game, analyzers, instrumentation)
+    return analyze_incremental(game, analyzers, _worker["result_store"], _worker["engine_settings"],
+                               instrumentation, lambda missing: _share_timeline(game, missing, instrumentation))
+
+def _analyze_one(game, game_id):
+    timeout = _worker["timeout"]
+    # Timeouts need SIGALRM, so they are only enforced on POSIX systems.
+    use_alarm = timeout and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        instrumentation = _worker["instrumentation"]
+        if instrumentation is None:
+            return _walk(game)
+        with instrumentation.game(game_id):
+            return _walk(game, instrumentation)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+def iter_source(path, start=0, stop=None):
+    """Yield games ``start`` to ``stop`` of a PGN file or packed store; packed stores skip PGN parsing."""
+    if path.endswith(STORE_SUFFIX):
+        with MoveStore(path) as store:
+            yield from store.iter_games(start, stop)
+    else:
+        yield from iter_games(path, start, stop, mainline_only=True)
+
+def analyze_task(pgn_file_path, start, stop):
+    """
+    Analyze games ``start`` to ``stop`` of a PGN file or packed store; returns
+    ``(game_id, results, error)`` tuples. A game that cannot be read gets an
+    error record and reading goes on from the next one.
+    """
+    records = []
+    game_number = start
+    games = iter_source(pgn_file_path, start, stop)
+    while True:
+        game_id = f"{pgn_file_path}#{game_number}"
+        try:
+            game = next(games, None)
+        except Exception as e:
+            records.append((game_id, None, f"{type(e).__name__}: {e}"))
+            if stop is None:
+                # Without a stop there is no telling how many games are left unread.
+                break
+            # The generator is finished once it raises: start a new one at the next game.
+            game_number += 1
+            games = iter_source(pgn_file_path, game_number, stop)
+            continue
+        if game is None:
+            break
+        try:
+            records.append((game_id, _analyze_one(game, game_id), None))
+        except GameTimeout:
+            records.append((game_id, None, "timeout"))
+            _restart_engine()
+        except Exception as e:
+            records.append((game_id, None, f"{type(e).__name__}: {e}"))
+        game_number += 1
+    return records
+
+def make_tasks(pgn_files, split="game", workers=1):
+    """Split the files into ``(path, start, stop)`` tasks, one per game or per shard."""
+    tasks = []
+    for pgn_file_path in pgn_files:
+        if pgn_file_path.endswith(STORE_SUFFIX):
+            with MoveStore(pgn_file_path) as store:
+                count = len(store)
+            size = 1 if split == "game" else max(1, -(-count // (workers * 4)))
+            tasks.extend((pgn_file_path, n, min(n + size, count)) for n in range(0, count, size))
+        elif split == "game":
+            tasks.extend((pgn_file_path, n, n + 1) for n in range(len(load_pgn_index(pgn_file_path))))
+        else:
+            tasks.extend((pgn_file_path, start, stop) for start, stop in shard_pgn(pgn_file_path, workers * 4))
+    return tasks
+
+class Progress:
+    """Games-per-second readout written to stderr at most once per ``interval`` seconds."""
+
+    def __init__(self, total_tasks, interval=1.0, stream=sys.stderr):
+        self.total_tasks = total_tasks
+        self.interval = interval
+        self.stream = stream
+        self.started = self.last_report = time.monotonic()
+        self.tasks = self.games = self.errors = 0
+
+    def update(self, records):
+        self.tasks += 1
+        self.games += len(records)
+        self.errors += sum(1 for record in records if record[2] is not None)
+        now = time.monotonic()
+        if now - self.last_report >= self.interval or self.tasks == self.total_tasks:
+            self.last_report = now
+            self.stream.write(f"\r{self.tasks}/{self.total_tasks} tasks, {self.games} games, "
+                              f"{self.errors} errors, {self.rate():.1f} games/s")
+            self.stream.flush()
+
+    def rate(self):
+        return self.games / max(time.monotonic() - self.started, 1e-9)
+
+    def close(self):
+        self.stream.write("\n")
+
+def run_batch(tasks, workers=None, eco_directory="OpeningCodes/tsv", stockfish_path=None,
+              analyzer_names=DEFAULT_ANALYZERS, timeout=None, ordered=False, progress=None,
+              eval_cache_path=None, instrument_path=None, profile_top=0, profile_dir="profiles",
+              result_store_path=None, time_budget=None):
+    """
+    Run the analyzers over ``tasks`` on a process pool and yield
+    ``(game_id, results, error)`` per game.
+
+    Every worker loads the ECO database and connects its engine once; with
+    ``eval_cache_path`` the engines share a persistent evaluation cache.
+    Results come back as tasks finish, or in task order when ``ordered`` is
+    set. A worker process that dies only fails the tasks it may have been
+    running: those are retried once on a fresh pool, one at a time, so
+    only a task that crashes its worker again is reported with a
+    ``"worker crashed"`` error. With ``instrument_path`` every worker
+    appends per-game timings to that JSON lines file, and with
+    ``profile_top`` keeps cProfile profiles of its slowest games in
+    ``profile_dir``. With ``result_store_path`` results already in that
+    :class:`result_store.ResultStore` are reused and only missing ones are
+    computed. The engine analyzers of a game share one eval timeline, spread
+    over ``time_budget`` engine seconds per game when given. The budget is
+    per game and per worker: ``workers`` games search at once, so the run
+    as a whole uses up to ``workers`` times as many engine seconds per
+    second of wall-clock time.
+    """
+    workers = workers or os.cpu_count() or 1
+    initargs = (eco_directory, stockfish_path, tuple(analyzer_names), timeout, eval_cache_path,
+                instrument_path, profile_top, profile_dir, result_store_path, time_budget)
+    pending = list(enumerate(tasks))
+    pending.reverse()
+    retried = set()
+    finished = {}
+    next_to_yield = 0
+    window = workers * 2
+
+    while pending:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=initargs) as pool:
+            in_flight = {}
+            broken = False
+            while (pending or in_flight) and not broken:
+                while pending and len(in_flight) < window:
+                    # Retries run alone, so a second crash is charged to the task that caused it.
+                    if in_flight and (pending[-1][0] in retried
+                                      or any(task_id in retried for task_id, _ in in_flight.values())):
+                        break
+                    task_id, task = pending.pop()
+                    in_flight[pool.submit(analyze_task, *task)] = (task_id, task)
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task_id, task = in_flight.pop(future)
+                    try:
+                        records = future.result()
+                    except BrokenProcessPool:
+                        broken = True
+                        if task_id in retried:
+                            records = [(f"{task[0]}#{n}", None, "worker crashed") for n in range(task[1], task[2])]
+                        else:
+                            retried.add(task_id)
+                            pending.append((task_id, task))
+                            continue
+                    if progress is not None:
+                        progress.update(records)
+                    finished[task_id] = records
+
+                if ordered:
+                    while next_to_yield in finished:
+                        yield from finished.pop(next_to_yield)
+                        next_to_yield += 1
+                else:
+                    for task_id in list(finished):
+                        yield from finished.pop(task_id)
+
+            # The pool is broken: requeue whatever it was still running.
+            for task_id, task in in_flight.values():
+                retried.add(task_id)
+                pending.append((task_id, task))
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze every game of one or more PGN files or directories.")
+    parser.add_argument("paths", nargs="+", help=f"PGN files or directories, or packed stores ({STORE_SUFFIX})")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--split", choices=("game", "shard"), default="game", help="unit of work per task")
+    parser.add_argument("--stockfish", default=None, help="engine path, needed by the engine analyzers")
+    parser.add_argument("--eco", default="OpeningCodes/tsv", help="ECO TSV directory")
+    parser.add_argument("--analyzers", default=",".join(DEFAULT_ANALYZERS),
+                        help=f"comma-separated subset of {','.join(ANALYZERS)}")
+    parser.add_argument("--timeout", type=float, default=None, help="per-game timeout in seconds")
+    parser.add_argument("--time-budget", type=float, default=None,
+                        help="engine seconds per game, spread over the eval timeline shared by the engine analyzers; "
+                             "each worker spends it on its own games, so the total is per game, per worker")
+    parser.add_argument("--eval-cache", default=None, help="SQLite file caching engine evaluations across runs")
+    parser.add_argument("--ordered", action="store_true", help="print results in input order")
+    parser.add_argument("--result-store", default=None,
+                        help="SQLite file of per-game analyzer results; only missing results are computed")
+    parser.add_argument("--instrument", default=None,
+                        help="JSON lines file for per-game, per-analyzer timings; prints a summary at the end")
+    parser.add_argument("--profile-top", type=int, default=0, help="keep cProfile profiles of the N slowest games")
+    parser.add_argument("--profile-dir", default="profiles", help="directory for --profile-top profiles")
+    parser.add_argument("--output", default=None,
+                        help="write one flat record per game to a .jsonl, .csv or .npz (chunk prefix) file "
+                             "instead of printing")
+    args = parser.parse_args()
+
+    analyzer_names = [name for name in args.analyzers.split(",") if name]
+    unknown = set(analyzer_names) - set(ANALYZERS)
+    if unknown:
+        parser.error(f"unknown analyzers: {', '.join(sorted(unknown))}")
+    if ENGINE_ANALYZERS & set(analyzer_names) and not args.stockfish:
+        parser.error(f"--stockfish is required by {', '.join(sorted(ENGINE_ANALYZERS & set(analyzer_names)))}")
+    if args.profile_top and not args.instrument:
+        parser.error("--profile-top needs --instrument")
+    if args.instrument:
+        open(args.instrument, "w").close()
+        clear_profiles(args.profile_dir)
+
+    tasks = make_tasks(collect_pgn_files(args.paths, SOURCE_SUFFIXES), args.split, args.workers or os.cpu_count() or 1)
+    sink = open_sink(args.output) if args.output else None
+    progress = Progress(len(tasks))
+    try:
+        for game_id, results, error in run_batch(tasks, args.workers, args.eco, args.stockfish, analyzer_names,
+                                                 args.timeout, args.ordered, progress, args.eval_cache,
+                                                 args.instrument, args.profile_top, args.profile_dir,
+                                                 args.result_store, args.time_budget):
+            if sink is None:
+                print(f"{game_id}\t{error if error else results}")
+            else:
+                sink(game_id, results, error)
+    finally:
+        if sink is not None:
+            sink.close()
+    progress.close()
+    if args.instrument:
+        print(format_summary(read_records(args.instrument)), file=sys.stderr)
+        for path in prune_profiles(args.profile_dir, args.profile_top):
+            print(f"profile: {path}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import chess
+import chess.engine
+import chess.pgn
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from pgn_utils import collect_pgn_files, iter_games
+from eco_utils import get_opening_name_and_code, load_eco_database
+from instrumentation import InstrumentedEngine
+from move_walker import walk_game
+from eval_timeline import share_eval_timeline
+from batch import ANALYZERS, ENGINE_ANALYZERS
+
+FAKE_ENGINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_uci.py")
+SYNTHETIC_RESULTS = ("1-0", "0-1", "1/2-1/2")
+
+def _walker(*names):
+    def factory(engine, eco_database):
+        analyzers = [ANALYZERS[name](engine, eco_database) for name in names]
+
+        def run(game):
+            share_eval_timeline(game, engine, analyzers)
+            return walk_game(game, analyzers)
+        return run
+    return factory
+
+def _eco(engine, eco_database):
+    def run(game):
+        board = game.board()
+        for move in game.mainline_moves():
+            board.push(move)
+        return get_opening_name_and_code(board, eco_database)
+    return run
+
+# name -> (needs an engine, factory returning a per-game callable)
+BENCHMARKS = {name: (name in ENGINE_ANALYZERS, _walker(name)) for name in ANALYZERS}
+BENCHMARKS.update({
+    "eco": (False, _eco),
+    # Every engine analyzer on one shared eval timeline, as batch runs them.
+    "engine": (True, _walker(*sorted(ENGINE_ANALYZERS))),
+})
+
+def write_synthetic_corpus(path, games, seed=0, max_plies=160):
+    """Write ``games`` random games, the same for a given seed, to a PGN file."""
+    rng = random.Random(seed)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as pgn_file:
+        for number in range(games):
+            board = chess.Board()
+            for _ in range(rng.randint(20, max_plies)):
+                moves = list(board.legal_moves)
+                if not moves:
+                    break
+                captures = [move for move in moves if board.is_capture(move)]
+                # Favour captures a little, so games reach endgames.
+                board.push(rng.choice(captures if captures and rng.random() < 0.3 else moves))
+            game = chess.pgn.Game.from_board(board)
+            game.headers.update(Event="Synthetic", Round=str(number + 1), White="Random", Black="Random",
+                                Result=board.result() if board.is_game_over() else rng.choice(SYNTHETIC_RESULTS))
+            print(game, file=pgn_file, end="\n\n")
+    os.replace(temp_path, path)
+    return path
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def run_benchmark(name, pgn_files, eco_directory, latency=0.0, max_games=None, repeat=1):
+    """
+    Run one benchmark over the games of ``pgn_files`` and return its
+    measurements. Games are parsed before timing starts (the ``parse``
+    benchmark times parsing itself). Engine benchmarks use the fake engine.
+    """
+    if name == "parse":
+        return _run_parse(pgn_files, max_games, repeat)
+    needs_engine, factory = BENCHMARKS[name]
+    games = [game for path in pgn_files for game in iter_games(path, mainline_only=True)][:max_games]
+    plies = sum(len(game.mainline_moves()) for game in games)
+    eco_database = load_eco_database(eco_directory)
+    loaded_rss = _peak_rss_mb()
+
+    engine = process = None
+    if needs_engine:
+        process = chess.engine.SimpleEngine.popen_uci([sys.executable, FAKE_ENGINE, "--latency", str(latency)])
+    try:
+        timings = []
+        for _ in range(repeat):
+            engine = InstrumentedEngine(process) if process else None
+            run = factory(engine, eco_database)
+            wall, cpu = time.perf_counter(), time.process_time()
+            for game in games:
+                run(game)
+            timings.append((time.perf_counter() - wall, time.process_time() - cpu))
+    finally:
+        if process is not None:
+            process.quit()
+    return _measurements(name, games, plies, timings, loaded_rss, engine)
+
+def _run_parse(pgn_files, max_games, repeat):
+    timings = []
+    for _ in range(repeat):
+        wall, cpu = time.perf_counter(), time.process_time()
+        games = plies = 0
+        for path in pgn_files:
+            for game in iter_games(path, mainline_only=True):
+                if max_games is not None and games >= max_games:
+                    break
+                games += 1
+                plies += len(game.mainline_moves())
+        timings.append((time.perf_counter() - wall, time.process_time() - cpu))
+    return _measurements("parse", range(games), plies, timings, None, None)
+
+def _measurements(name, games, plies, timings, loaded_rss, engine):
+    wall, cpu = min(timings)
+    result = {
+        "benchmark": name,
+        "games": len(games),
+        "plies": plies,
+        "wall_s": round(wall, 4),
+        "cpu_s": round(cpu, 4),
+        "games_per_s": round(len(games) / wall, 2) if wall else None,
+        "plies_per_s": round(plies / wall, 1) if wall else None,
+        "loaded_rss_mb": loaded_rss,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+    if engine is not None:
+        result["engine"] = engine.stats()
+        # Time outside the engine: board work, analyzer logic and UCI round trips.
+        result["overhead_s"] = round(wall - engine.seconds, 4)
+    return result
+
+def _metadata(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(FAKE_ENGINE)).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "python_chess": chess.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": vars(args),
+    }
+
+def compare(old, new):
+    """Print plies/s of two result files side by side."""
+    previous = {(r["benchmark"], r["corpus"]): r for r in old["results"]}
+    print(f"{'benchmark':<14}{'corpus':<12}{'old plies/s':>14}{'new plies/s':>14}{'speedup':>10}")
+    for r in new["results"]:
+        before = previous.get((r["benchmark"], r["corpus"]))
+        if before is None or not before["plies_per_s"] or not r["plies_per_s"]:
+            continue
+        print(f"{r['benchmark']:<14}{r['corpus']:<12}{before['plies_per_s']:>14.1f}{r['plies_per_s']:>14.1f}"
+              f"{r['plies_per_s'] / before['plies_per_s']:>9.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analyzers on bundled and synthetic games.")
+    parser.add_argument("--benchmarks", default=",".join(["parse", *BENCHMARKS]),
+                        help="comma-separated subset of parse," + ",".join(BENCHMARKS))
+    parser.add_argument("--corpora", default="pgnfiles,synthetic", help="comma-separated subset of pgnfiles,synthetic")
+    parser.add_argument("--pgn", nargs="+", default=["PgnFiles"],
+                        help="PGN files or directories of the pgnfiles corpus")
+    parser.add_argument("--synthetic-games", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", default=".benchmark", help="where the synthetic corpus is written")
+    parser.add_argument("--eco", default="OpeningCodes/tsv", help="ECO TSV directory")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake engine seconds per search")
+    parser.add_argument("--engine-games", type=int, default=20, help="games per corpus for engine benchmarks")
+    parser.add_argument("--repeat", type=int, default=1, help="passes per benchmark; the fastest is reported")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON results file")
+    parser.add_argument("--compare", default=None, help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    names = [name for name in args.benchmarks.split(",") if name]
+    unknown = set(names) - set(BENCHMARKS) - {"parse"}
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    corpora = {}
+    for corpus in args.corpora.split(","):
+        if corpus == "pgnfiles":
+            corpora[corpus] = collect_pgn_files(args.pgn)
+        elif corpus == "synthetic":
+            os.makedirs(args.work_dir, exist_ok=True)
+            path = os.path.join(args.work_dir, f"synthetic-{args.synthetic_games}-{args.seed}.pgn")
+            if not os.path.exists(path):
+                write_synthetic_corpus(path, args.synthetic_games, args.seed)
+            corpora[corpus] = [path]
+        elif corpus:
+            parser.error(f"unknown corpus: {corpus}")
+
+    results = []
+    print(f"{'benchmark':<14}{'corpus':<12}{'games':>7}{'plies':>9}{'wall s':>9}{'games/s':>10}{'plies/s':>11}"
+          f"{'peak MB':>9}{'engine':>8}")
+    for corpus, pgn_files in corpora.items():
+        for name in names:
+            max_games = args.engine_games if name != "parse" and BENCHMARKS[name][0] else None
+            # A fresh process per benchmark keeps peak memory figures apart.
+            with ProcessPoolExecutor(1) as pool:
+                result = pool.submit(run_benchmark, name, pgn_files, args.eco, args.latency, max_games,
+                                     args.repeat).result()
+            result["corpus"] = corpus
+            results.append(result)
+            engine_calls = result.get("engine", {}).get("calls", "")
+            print(f"{name:<14}{corpus:<12}{result['games']:>7}{result['plies']:>9}{result['wall_s']:>9.2f}"
+                  f"{result['games_per_s'] or 0:>10.1f}{result['plies_per_s'] or 0:>11.1f}"
+                  f"{result['peak_rss_mb'] or 0:>9.1f}{engine_calls:>8}")
+
+    report = {"meta": _metadata(args), "results": results}
+    with open(args.output, "w", encoding="utf-8") as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f"Wrote {args.output}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as old_file:
+            compare(json.load(old_file), report)
+
+if __name__ == "__main__":
+    main()
@@ -1,111 +1,118 @@
 import chess
 import chess.pgn
 
-import chess
-import chess.pgn
+from move_walker import Analyzer, walk_game
+
+def moved_piece_mask(board, move):
+    """
+    Bitboard of the square where the piece moved by ``move`` (the last move
+    on ``board``) now stands. For castling this is the rook, since a king
+    never gives check.
+    """
+    piece_type = board.piece_type_at(move.to_square)
+    king_move_castles = piece_type == chess.KING and (
+        chess.square_distance(move.from_square, move.to_square) > 1
+        or board.occupied & chess.BB_SQUARES[move.from_square])
+    if piece_type is None or king_move_castles:
+        # Castling. In Chess960 notation ``to_square`` is the rook's origin,
+        # which ends up empty or holding the king (with the rook on ``from_square``).
+        mover = not board.turn
+        kingside = chess.square_file(board.king(mover)) == 6
+        return chess.BB_SQUARES[chess.square(5 if kingside else 3, chess.square_rank(move.from_square))]
+    return chess.BB_SQUARES[move.to_square]
+
+def classify_check(board, move, checkers=None):
+    """
+    Split the checkers of ``board`` after ``move`` into ``(direct, discovered)``
+    bitboards: the moved piece itself, and the pieces whose line to the king
+    the move opened. ``checkers`` may pass the already computed checker mask.
+    """
+    checkers = board.checkers_mask() if checkers is None else int(checkers)
+    direct = checkers & moved_piece_mask(board, move)
+    return direct, checkers & ~direct
 
 def is_discovered_check(board, move):
     """
     Determine if a move results in a discovered check.
     A discovered check occurs when a piece moves, uncovering an attack by another piece (bishop, rook, or queen).
     """
-    # Copy the board state before the move
-    board_before_move = board.copy()
-    board_before_move.pop()  # Undo the last move to analyze the position before the move
-
-    # Determine the side that gave the check
-    is_white_turn = board.turn  # If it's White's turn, Black just moved
-    opponent_king_square = board_before_move.king(is_white_turn)  # Opponent's king square
-
-    if opponent_king_square is None:  # No king found (invalid state)
-        return False
-
-    # The square the moving piece moved from
-    moving_piece_square = move.from_square
-
-    
-    for attacker_square, piece in board_before_move.piece_map().items():
-        if (
-            piece.color != board.turn  # Rakip taşlar
-            and piece.piece_type in [chess.BISHOP, chess.ROOK, chess.QUEEN]  # Açarak şahı oluşturabilecek taşlar
-        ):
-            # Check if there's a direct line of attack to the king
-            ray = chess.SquareSet(chess.ray(attacker_square, opponent_king_square) or [])
-            if not ray:  # No direct line
-                continue
-
-       
-            if moving_piece_square in ray:
-                if board.is_attacked_by(piece.color, opponent_king_square):
-               
-                    if moving_piece_square != attacker_square:
-                        print(f"Discovered check detected: Attacker {piece.symbol()} at {chess.square_name(attacker_square)}, King at {chess.square_name(opponent_king_square)}")
-                        return True  # Açarak şahı tespit edildis
-
-    return False
-
+    return bool(classify_check(board, move)[1])
 
 def is_double_check(board, move):
     """Check if the move results in a double check."""
-    board_before_move = board.copy()
-    board_before_move.pop() 
-    king_square = board_before_move.king(not board_before_move.turn)  
-
-   
-    pre_move_attackers = list(board_before_move.attackers(not board_before_move.turn, king_square))
-    
-   
-    post_move_attackers = list(board.attackers(not board.turn, king_square))
-    
-    # Double check happens if:
-    # 1. After the move, there are two or more attackers.
-    # 2. At least one of these attackers was NOT threatening the king before the move.
-    if len(post_move_attackers) > 1 and len(pre_move_attackers) < len(post_move_attackers):
-        return True
-    return False
+    return chess.popcount(board.checkers_mask()) > 1
+
+
+class CheckAnalyzer(Analyzer):
+    """
+    Count direct, discovered and double checks for both sides and attribute
+    every check to the pieces giving it. A double check is also counted as
+    discovered, and as direct when the moved piece is one of the checkers.
+    """
+
+    name = "checks"
+
+    def start(self, game, board):
+        self.white_checks = 0
+        self.black_checks = 0
+        self.white_double_checks = 0
+        self.black_double_checks = 0
+        self.white_discovered_checks = 0
+        self.black_discovered_checks = 0
+        self.white_direct_checks = 0
+        self.black_direct_checks = 0
+        self.white_checking_pieces = {}
+        self.black_checking_pieces = {}
+        self.wh_dc = []
+        self.bl_dc = []
+
+    def after_push(self, ctx):
+        checkers = ctx.checkers
+        if not checkers:
+            return
+        board, move = ctx.board, ctx.move
+        direct, discovered = classify_check(board, move, checkers)
+        double = chess.popcount(direct | discovered) > 1
+
+        if not board.turn:  # White gave check
+            self.white_checks += 1
+            self.white_direct_checks += bool(direct)
+            if discovered:
+                self.wh_dc.append(move)
+                self.white_discovered_checks += 1
+            self.white_double_checks += double
+            pieces = self.white_checking_pieces
+        else:  # Black gave check
+            self.black_checks += 1
+            self.black_direct_checks += bool(direct)
+            if discovered:
+                self.bl_dc.append(move)
+                self.black_discovered_checks += 1
+            self.black_double_checks += double
+            pieces = self.black_checking_pieces
+
+        for square in chess.scan_forward(direct | discovered):
+            symbol = board.piece_at(square).symbol()
+            pieces[symbol] = pieces.get(symbol, 0) + 1
+
+    def finish(self, game, board):
+        return {
+            "white_checks": self.white_checks,
+            "black_checks": self.black_checks,
+            "white_double_checks": self.white_double_checks,
+            "black_double_checks": self.black_double_checks,
+            "white_discovered_checks": self.white_discovered_checks,
+            "black_discovered_checks": self.black_discovered_checks,
+            "white_direct_checks": self.white_direct_checks,
+            "black_direct_checks": self.black_direct_checks,
+            "white_checking_pieces": self.white_checking_pieces,
+            "black_checking_pieces": self.black_checking_pieces,
+            "whdc" : self.wh_dc,
+            "bldc" : self.bl_dc
+
+        }
 
 
 def analyze_checks(game):
     """Analyze the game to count checks, double checks, and discovered checks."""
-    board = game.board()
-    white_checks = 0
-    black_checks = 0
-    white_double_checks = 0
-    black_double_checks = 0
-    white_discovered_checks = 0
-    black_discovered_checks = 0
-    wh_dc = []
-    bl_dc = []
-    for move in game.mainline_moves():
-        board.push(move)
-
-        if board.is_check():
-            # Debug: Print the move and the check
-            # print(f"Check detected: {move}, Turn: {'White' if board.turn else 'Black'}")
-
-            if not board.turn:  # White gave check
-                white_checks += 1
-                if is_discovered_check(board, move):
-                    wh_dc.append(move)
-                    white_discovered_checks += 1
-                if is_double_check(board, move):
-                    white_double_checks += 1
-            else:  # Black gave check
-                black_checks += 1
-                if is_discovered_check(board, move):
-                    bl_dc.append(move)
-                    black_discovered_checks += 1
-                if is_double_check(board, move):
-                    black_double_checks += 1
-
-    return {
-        "white_checks": white_checks,
-        "black_checks": black_checks,
-        "white_double_checks": white_double_checks,
-        "black_double_checks": black_double_checks,
-        "white_discovered_checks": white_discovered_checks,
-        "black_discovered_checks": black_discovered_checks,
-        "whdc" : wh_dc,
-        "bldc" : bl_dc
-       
-    }
+    return walk_game(game, [CheckAnalyzer()])
@@ -0,0 +1,269 @@
+import array
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from collections.abc import Sequence
+
+import chess
+
+from eco_utils import EcoIndex, parse_eco_directory, position_key
+
+CACHE_FILENAME = ".eco_cache.bin"
+CACHE_VERSION = 1
+
+_MAGIC = b"ECOBIN01"
+# (section name, array typecode). Every section is stored as a native array
+# aligned to 8 bytes so it can be cast straight out of the mmap.
+_SECTIONS = (
+    ("records", "I"),      # 6 x u32 per opening, see _RECORD_FIELDS
+    ("moves", "H"),        # packed moves of every opening, back to back
+    ("node_first", "I"),   # trie node -> index of its first edge
+    ("node_count", "I"),   # trie node -> number of edges
+    ("node_record", "i"),  # trie node -> opening record, -1 if none
+    ("edge_move", "H"),    # edge -> packed move, sorted within a node
+    ("edge_child", "I"),   # edge -> child node
+    ("pos_key", "Q"),      # sorted position keys of final positions
+    ("pos_record", "I"),   # position key -> opening record
+    ("strings", "B"),      # utf-8 eco codes, names and final FENs
+)
+_RECORD_FIELDS = ("strings_offset", "eco_length", "name_length", "fen_length", "moves_offset", "move_count")
+_RECORD_SIZE = len(_RECORD_FIELDS)
+_HEADER = struct.Struct("<8sI" + "QQ" * len(_SECTIONS))
+
+def pack_move(move):
+    """Pack a move into 16 bits: from | to << 6 | promotion << 12."""
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+def unpack_move(code):
+    return chess.Move(code & 63, code >> 6 & 63, code >> 12 or None)
+
+def _source_manifest(eco_directory, with_hashes):
+    files = []
+    for filename in sorted(os.listdir(eco_directory)):
+        if filename.endswith(".tsv"):
+            file_path = os.path.join(eco_directory, filename)
+            stat = os.stat(file_path)
+            entry = {"name": filename, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            if with_hashes:
+                with open(file_path, "rb") as tsvfile:
+                    entry["sha1"] = hashlib.sha1(tsvfile.read()).hexdigest()
+            files.append(entry)
+    return {"version": CACHE_VERSION, "byteorder": sys.byteorder, "files": files}
+
+def _read_manifest(cache_path):
+    try:
+        with open(cache_path, "rb") as cache_file:
+            header = cache_file.read(_HEADER.size)
+            if len(header) != _HEADER.size:
+                return None
+            magic, manifest_length = _HEADER.unpack(header)[:2]
+            if magic != _MAGIC:
+                return None
+            return json.loads(cache_file.read(manifest_length))
+    except (OSError, ValueError):
+        return None
+
+def is_cache_valid(eco_directory, cache_path):
+    """
+    Check a compiled cache against the TSV sources.
+
+    Matching sizes and mtimes are accepted without reading the sources; otherwise
+    the cache is still valid if the content hashes are unchanged.
+    """
+    cached = _read_manifest(cache_path)
+    if cached is None or cached.get("version") != CACHE_VERSION or cached.get("byteorder") != sys.byteorder:
+        return False
+    current = _source_manifest(eco_directory, with_hashes=False)
+    stat_keys = ("name", "size", "mtime_ns")
+    if [[f[k] for k in stat_keys] for f in current["files"]] == [[f[k] for k in stat_keys] for f in cached["files"]]:
+        return True
+    current = _source_manifest(eco_directory, with_hashes=True)
+    if [[f["name"], f["sha1"]] for f in current["files"]] != [[f["name"], f["sha1"]] for f in cached["files"]]:
+        return False
+    # Same content, new mtimes (a touch or a checkout): record them so the
+    # next start takes the fast path again.
+    _rewrite_manifest(cache_path, current)
+    return True
+
+def _compile_sections(eco_database):
+    index = EcoIndex(eco_database)
+    record_ids = {id(opening): i for i, opening in enumerate(eco_database)}
+    sections = {name: array.array(typecode) for name, typecode in _SECTIONS}
+    strings = bytearray()
+
+    for opening in eco_database:
+        eco, name, fen = (opening[k].encode("utf-8") for k in ("eco", "name", "final_fen"))
+        sections["records"].extend((
+            len(strings), len(eco), len(name), len(fen), len(sections["moves"]), len(opening["moves"])
+        ))
+        strings += eco + name + fen
+        sections["moves"].extend(pack_move(chess.Move.from_uci(uci)) for uci in opening["moves"])
+
+    # Breadth-first flattening keeps every node's edges contiguous.
+    nodes = [index.root]
+    for node in nodes:
+        sections["node_first"].append(len(sections["edge_move"]))
+        sections["node_count"].append(len(node.children))
+        sections["node_record"].append(-1 if node.opening is None else record_ids[id(node.opening)])
+        for code, child in sorted((pack_move(chess.Move.from_uci(uci)), child) for uci, child in node.children.items()):
+            sections["edge_move"].append(code)
+            sections["edge_child"].append(len(nodes))
+            nodes.append(child)
+
+    for key, opening in sorted(index.positions.items()):
+        sections["pos_key"].append(key)
+        sections["pos_record"].append(record_ids[id(opening)])
+
+    sections["strings"] = array.array("B", bytes(strings))
+    return sections
+
+def _write_cache(cache_path, manifest, sections):
+    """Write ``manifest`` and the ``sections`` (any buffers) to ``cache_path`` atomically."""
+    manifest = json.dumps(manifest).encode("utf-8")
+    offset = _HEADER.size + len(manifest)
+    layout = []
+    for name, _ in _SECTIONS:
+        offset += -offset % 8
+        size = memoryview(sections[name]).nbytes
+        layout.append((offset, size))
+        offset += size
+
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as cache_file:
+        cache_file.write(_HEADER.pack(_MAGIC, len(manifest), *(v for pair in layout for v in pair)))
+        cache_file.write(manifest)
+        for (name, _), (section_offset, _) in zip(_SECTIONS, layout):
+            cache_file.write(b"\0" * (section_offset - cache_file.tell()))
+            cache_file.write(sections[name])
+    os.replace(temp_path, cache_path)
+
+def _rewrite_manifest(cache_path, manifest):
+    """Replace the manifest of a valid cache, keeping its compiled sections."""
+    database = CompiledEcoDatabase(cache_path)
+    try:
+        _write_cache(cache_path, manifest, database.sections)
+    finally:
+        database.close()
+
+def compile_eco_database(eco_directory, cache_path):
+    """Parse the TSV sources and write the compiled cache atomically."""
+    manifest = _source_manifest(eco_directory, with_hashes=True)
+    _write_cache(cache_path, manifest, _compile_sections(parse_eco_directory(eco_directory)))
+
+class CompiledEcoIndex:
+    """:class:`eco_utils.EcoIndex` lookups answered directly from the mapped cache."""
+
+    def __init__(self, database):
+        self.database = database
+        s = database.sections
+        self.node_first, self.node_count, self.node_record = s["node_first"], s["node_count"], s["node_record"]
+        self.edge_move, self.edge_child = s["edge_move"], s["edge_child"]
+        self.pos_key, self.pos_record = s["pos_key"], s["pos_record"]
+        self.max_depth = max((database.move_count(i) for i in range(len(database))), default=0)
+
+    def _child(self, node, code):
+        first = self.node_first[node]
+        last = first + self.node_count[node]
+        i = bisect.bisect_left(self.edge_move, code, first, last)
+        if i < last and self.edge_move[i] == code:
+            return self.edge_child[i]
+        return None
+
+    def _position(self, key):
+        i = bisect.bisect_left(self.pos_key, key)
+        if i < len(self.pos_key) and self.pos_key[i] == key:
+            return self.pos_record[i]
+        return None
+
+    def match(self, board):
+        replay = board.root()
+        node = 0
+        best = None
+        for move in board.move_stack[:self.max_depth]:
+            replay.push(move)
+            if node is not None:
+                node = self._child(node, pack_move(move))
+            if node is not None and self.node_record[node] >= 0:
+                best = self.node_record[node]
+            else:
+                record = self._position(position_key(replay))
+                if record is not None:
+                    best = record
+        return None if best is None else self.database[best]
+
+class CompiledEcoDatabase(Sequence):
+    """
+    Read-only ECO database backed by a memory-mapped compiled cache.
+
+    Entries are decoded on access into the same dicts ``load_eco_database``
+    has always returned. The mapping is shared by processes that open the
+    same cache file, including forked workers.
+    """
+
+    def __init__(self, cache_path):
+        with open(cache_path, "rb") as cache_file:
+            self._mmap = mmap.mmap(cache_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = view = memoryview(self._mmap)
+        header = _HEADER.unpack_from(view)
+        manifest = json.loads(bytes(view[_HEADER.size:_HEADER.size + header[1]]))
+        digest = hashlib.blake2b(digest_size=8)
+        for source in manifest["files"]:
+            digest.update(f"{source['name']}:{source['sha1']}\n".encode("utf-8"))
+        # Identifies the TSV contents, not their mtimes: see eco_utils.eco_database_hash.
+        self.content_hash = digest.hexdigest()
+        self.sections = {}
+        for i, (name, typecode) in enumerate(_SECTIONS):
+            offset, size = header[2 + 2 * i], header[3 + 2 * i]
+            self.sections[name] = view[offset:offset + size].cast(typecode)
+        self._records = self.sections["records"]
+        self._index = None
+
+    def __len__(self):
+        return len(self._records) // _RECORD_SIZE
+
+    def close(self):
+        """Unmap the cache; entries already decoded stay usable."""
+        for section in self.sections.values():
+            section.release()
+        self._view.release()
+        self._mmap.close()
+
+    def move_count(self, i):
+        return self._records[_RECORD_SIZE * i + _RECORD_SIZE - 1]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("ECO record index out of range")
+        start, eco_length, name_length, fen_length, moves_start, move_count = \
+            self._records[_RECORD_SIZE * i:_RECORD_SIZE * (i + 1)]
+        strings = self.sections["strings"]
+        name_start = start + eco_length
+        fen_start = name_start + name_length
+        return {
+            "eco": bytes(strings[start:name_start]).decode("utf-8"),
+            "name": bytes(strings[name_start:fen_start]).decode("utf-8"),
+            "moves": [unpack_move(code).uci() for code in self.sections["moves"][moves_start:moves_start + move_count]],
+            "final_fen": bytes(strings[fen_start:fen_start + fen_length]).decode("utf-8"),
+        }
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = CompiledEcoIndex(self)
+        return self._index
+
+def load_compiled_eco_database(eco_directory, cache_path=None):
+    """Open the compiled cache for ``eco_directory``, rebuilding it when stale."""
+    if cache_path is None:
+        cache_path = os.path.join(eco_directory, CACHE_FILENAME)
+    if not is_cache_valid(eco_directory, cache_path):
+        compile_eco_database(eco_directory, cache_path)
+    return CompiledEcoDatabase(cache_path)
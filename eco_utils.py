@@ -1,9 +1,93 @@
 import chess
+import chess.polyglot
 import os
 import csv
+import hashlib
+import json
 
-def load_eco_database(eco_directory):
-    eco_database = []
+# Placement + side to move only; castling rights and en passant squares are
+# ignored so that transposed move orders land on the same key.
+_POSITION_HASHER = chess.polyglot.ZobristHasher(chess.polyglot.POLYGLOT_RANDOM_ARRAY)
+
+def position_key(board):
+    """64-bit Zobrist key of the piece placement and the side to move."""
+    return _POSITION_HASHER.hash_board(board) ^ _POSITION_HASHER.hash_turn(board)
+
+def final_position_key(final_fen, ply_count):
+    """Position key of an opening's ``final_fen`` reached after ``ply_count`` plies."""
+    board = chess.Board(None)
+    board.set_board_fen(final_fen)
+    board.turn = ply_count % 2 == 0
+    return position_key(board)
+
+class _TrieNode:
+    __slots__ = ("children", "opening")
+
+    def __init__(self):
+        self.children = {}
+        self.opening = None
+
+class EcoIndex:
+    """
+    Opening index over an ECO database.
+
+    Openings are stored in a UCI move trie for longest-prefix matching and in
+    a dictionary keyed by the position key of their final position, so that a
+    game reaching an opening by a different move order is still classified.
+    """
+
+    def __init__(self, eco_database):
+        self.root = _TrieNode()
+        self.positions = {}
+        self.max_depth = 0
+        for opening in eco_database:
+            self.add(opening)
+
+    def add(self, opening):
+        moves = opening["moves"]
+        if not moves:
+            return
+        node = self.root
+        for uci in moves:
+            child = node.children.get(uci)
+            if child is None:
+                child = node.children[uci] = _TrieNode()
+            node = child
+        # Keep the first opening for duplicated move lists, like the linear scan did.
+        if node.opening is None:
+            node.opening = opening
+        self.positions.setdefault(final_position_key(opening["final_fen"], len(moves)), opening)
+        self.max_depth = max(self.max_depth, len(moves))
+
+    def match(self, board):
+        """Return the deepest opening reached by the game in ``board.move_stack``, or None."""
+        replay = board.root()
+        node = self.root
+        best = None
+        for move in board.move_stack[:self.max_depth]:
+            replay.push(move)
+            if node is not None:
+                node = node.children.get(move.uci())
+            if node is not None and node.opening is not None:
+                best = node.opening
+            else:
+                best = self.positions.get(position_key(replay), best)
+        return best
+
+class EcoDatabase(list):
+    """List of ECO entries that builds its :class:`EcoIndex` on first use."""
+
+    _index = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = EcoIndex(self)
+        return self._index
+
+def parse_eco_directory(eco_directory):
+    """Parse the ECO TSV files, replaying every line to get UCI moves and final FENs."""
+    eco_database = EcoDatabase()
     for filename in os.listdir(eco_directory):
         if filename.endswith(".tsv"):
             file_path = os.path.join(eco_directory, filename)
@@ -30,17 +114,40 @@ def load_eco_database(eco_directory):
                         })
     return eco_database
 
+def load_eco_database(eco_directory, use_cache=True):
+    """
+    Load the ECO database, going through the compiled cache in ``eco_directory``.
+
+    The cache is rebuilt when a TSV file changes. If it cannot be written the
+    TSV files are parsed directly.
+    """
+    if use_cache:
+        from eco_cache import load_compiled_eco_database
+        try:
+            return load_compiled_eco_database(eco_directory)
+        except OSError as e:
+            print(f"Could not use compiled ECO cache: {e}")
+    return parse_eco_directory(eco_directory)
+
+def eco_database_hash(eco_database):
+    """
+    A short hash of the openings in ``eco_database``, for keys of results
+    depending on them. The compiled cache takes it from the hashes of its
+    sources; a parsed database is hashed entry by entry.
+    """
+    content_hash = getattr(eco_database, "content_hash", None)
+    if content_hash is None:
+        digest = hashlib.blake2b(digest_size=8)
+        for opening in eco_database:
+            digest.update(json.dumps(opening, sort_keys=True).encode("utf-8"))
+        content_hash = digest.hexdigest()
+    return content_hash
+
 def get_opening_name_and_code(board, eco_database):
-    game_moves = [move.uci() for move in board.move_stack]
-    best_match = {"eco": "Unknown", "name": "Unknown", "length": 0}
-
-    for opening in eco_database:
-        if game_moves[:len(opening["moves"])] == opening["moves"]:
-            if len(opening["moves"]) > best_match["length"]:
-                best_match = {
-                    "eco": opening["eco"],
-                    "name": opening["name"],
-                    "length": len(opening["moves"])
-                }
-
-    return best_match["eco"], best_match["name"]
+    index = getattr(eco_database, "index", None)
+    if index is None:
+        index = EcoIndex(eco_database)
+    opening = index.match(board)
+    if opening is None:
+        return "Unknown", "Unknown"
+    return opening["eco"], opening["name"]
@@ -1,6 +1,30 @@
 import chess
 import chess.pgn
 
+from move_walker import Analyzer, walk_game
+
+class EnPassantAnalyzer(Analyzer):
+    """Count the en passant captures made by White and Black."""
+
+    name = "en_passant"
+
+    def start(self, game, board):
+        self.white_en_passant_count = 0
+        self.black_en_passant_count = 0
+
+    def before_push(self, ctx):
+        if ctx.board.is_en_passant(ctx.move):
+            if not ctx.board.turn:
+                self.black_en_passant_count += 1
+            else:
+                self.white_en_passant_count += 1
+
+    def finish(self, game, board):
+        return {
+            "white_en_passant_count": self.white_en_passant_count,
+            "black_en_passant_count": self.black_en_passant_count
+        }
+
 def count_en_passant_moves(game):
     """
     Count the number of en passant moves made by White and Black in a chess game.
@@ -11,21 +35,4 @@ def count_en_passant_moves(game):
     Returns:
         A dictionary with counts of en passant moves for White and Black.
     """
-    board = game.board()
-    white_en_passant_count = 0
-    black_en_passant_count = 0
-
-    for move in game.mainline_moves():
-        if board.is_en_passant(move):
-            if not board.turn: 
-                black_en_passant_count += 1
-            else:  
-                white_en_passant_count += 1
-
-        # Push the move to update the board
-        board.push(move)
-
-    return {
-        "white_en_passant_count": white_en_passant_count,
-        "black_en_passant_count": black_en_passant_count
-    }
\ No newline at end of file
+    return walk_game(game, [EnPassantAnalyzer()])
\ No newline at end of file
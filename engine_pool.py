@@ -0,0 +1,180 @@
+import asyncio
+import concurrent.futures
+import threading
+
+import chess.engine
+
+class EnginePool:
+    """
+    A pool of UCI engine processes behind one request queue.
+
+    Every engine runs in its own worker task, taking analysis requests from
+    the shared queue, so independent positions are searched concurrently
+    across the pool. ``options`` is one dict of UCI options for every engine
+    (for example ``{"Hash": 256, "Threads": 1}``) or a list with one dict per
+    engine. Idle engines are pinged every ``health_interval`` seconds, and an
+    engine that dies or stops answering is restarted. The request it was
+    working on is retried once on the new process.
+    """
+
+    def __init__(self, engine_path, size=2, options=None, health_interval=30.0, ping_timeout=10.0):
+        self.engine_path = engine_path
+        self.size = size
+        if options is None or isinstance(options, dict):
+            options = [options or {}] * size
+        if len(options) != size:
+            raise ValueError("Need one options dict per engine.")
+        self.options = options
+        self.health_interval = health_interval
+        self.ping_timeout = ping_timeout
+        self.restarts = 0
+        self._queue = None
+        self._workers = []
+        self._engines = [None] * size
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        for slot in range(self.size):
+            await self._open(slot)
+        self._workers = [asyncio.create_task(self._work(slot)) for slot in range(self.size)]
+        return self
+
+    async def _open(self, slot):
+        _, engine = await chess.engine.popen_uci(self.engine_path)
+        if self.options[slot]:
+            await engine.configure(self.options[slot])
+        self._engines[slot] = engine
+
+    async def _restart(self, slot):
+        self.restarts += 1
+        try:
+            await asyncio.wait_for(self._engines[slot].quit(), self.ping_timeout)
+        except Exception:
+            pass
+        await self._open(slot)
+
+    async def _healthy(self, slot):
+        try:
+            await asyncio.wait_for(self._engines[slot].ping(), self.ping_timeout)
+            return True
+        except (chess.engine.EngineError, asyncio.TimeoutError):
+            return False
+
+    async def _work(self, slot):
+        while True:
+            try:
+                request = await asyncio.wait_for(self._queue.get(), self.health_interval)
+            except asyncio.TimeoutError:
+                if not await self._healthy(slot):
+                    try:
+                        await self._restart(slot)
+                    except Exception:
+                        pass  # Retried on the next health check or request.
+                continue
+            if request is None:
+                self._queue.task_done()
+                return
+            future, board, limit, kwargs = request
+            # The waiter may have been cancelled before or during the search.
+            if not future.done():
+                await self._serve(slot, future, board, limit, kwargs)
+            self._queue.task_done()
+
+    async def _serve(self, slot, future, board, limit, kwargs):
+        # A terminated engine is restarted and the search retried once.
+        for _ in range(2):
+            try:
+                result = await self._engines[slot].analyse(board, limit, **kwargs)
+            except chess.engine.EngineTerminatedError as e:
+                error = e
+                try:
+                    await self._restart(slot)
+                except Exception as restart_error:
+                    error = restart_error
+                    break
+            except Exception as e:
+                error = e
+                break
+            else:
+                if not future.done():
+                    future.set_result(result)
+                return
+        if not future.done():
+            future.set_exception(error)
+
+    async def analyse(self, board, limit, **kwargs):
+        """Queue a search of ``board`` and wait for its result (same arguments as ``Protocol.analyse``)."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((future, board.copy(), limit, kwargs))
+        return await future
+
+    async def analyse_many(self, boards, limit, **kwargs):
+        return await asyncio.gather(*(self.analyse(board, limit, **kwargs) for board in boards))
+
+    async def close(self):
+        for _ in self._workers:
+            await self._queue.put(None)
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        for engine in self._engines:
+            if engine is not None:
+                try:
+                    await asyncio.wait_for(engine.quit(), self.ping_timeout)
+                except Exception:
+                    pass
+        self._engines = [None] * self.size
+
+class SyncEnginePool:
+    """
+    Blocking facade over :class:`EnginePool` running on a background event loop.
+
+    ``analyse`` has the same signature as ``SimpleEngine.analyse``, so the pool
+    can be passed wherever the analyzers expect an engine. ``submit`` and
+    ``analyse_many`` return or wait for several searches at once.
+    """
+
+    def __init__(self, engine_path, size=2, options=None, **pool_kwargs):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="engine-pool", daemon=True)
+        self._thread.start()
+        self.pool = EnginePool(engine_path, size, options, **pool_kwargs)
+        try:
+            self._call(self.pool.start())
+        except Exception:
+            self._stop_loop()
+            raise
+
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def submit(self, board, limit, **kwargs):
+        """Queue a search and return a ``concurrent.futures.Future`` for its result."""
+        return asyncio.run_coroutine_threadsafe(self.pool.analyse(board, limit, **kwargs), self._loop)
+
+    def analyse(self, board, limit, **kwargs):
+        return self.submit(board, limit, **kwargs).result()
+
+    def analyse_many(self, boards, limit, **kwargs):
+        futures = [self.submit(board, limit, **kwargs) for board in boards]
+        return [future.result() for future in futures]
+
+    def _stop_loop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def quit(self):
+        if self._loop.is_closed():
+            return
+        try:
+            self._call(self.pool.close())
+        except concurrent.futures.CancelledError:
+            pass
+        self._stop_loop()
+
+    close = quit
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.quit()
@@ -0,0 +1,218 @@
+import concurrent.futures
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import chess
+import chess.engine
+import chess.polyglot
+
+from result_store import engine_settings
+
+LIMIT_KINDS = ("depth", "nodes", "time")
+# Stored in the SQLite user_version; files of another version are emptied.
+EVAL_CACHE_VERSION = 2
+
+def limit_key(limit):
+    """
+    Return ``(kind, amount)`` for a limit on exactly one of depth, nodes or
+    time, or None for limits the cache cannot compare (clocks, mate, mixed).
+    """
+    set_fields = {field: value for field, value in vars(limit).items() if value is not None}
+    if len(set_fields) != 1:
+        return None
+    kind, amount = next(iter(set_fields.items()))
+    if kind not in LIMIT_KINDS:
+        return None
+    return kind, amount
+
+def _signed(key):
+    # SQLite integers are signed 64-bit.
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+def _encode_info(info):
+    score = info["score"].relative
+    encoded = {"mate": score.mate()} if score.is_mate() else {"cp": score.score()}
+    for field in ("depth", "seldepth", "nodes", "multipv"):
+        if field in info:
+            encoded[field] = info[field]
+    if "pv" in info:
+        encoded["pv"] = [move.uci() for move in info["pv"]]
+    return encoded
+
+def _decode_info(encoded, turn):
+    info = dict(encoded)
+    score = chess.engine.Mate(info.pop("mate")) if "mate" in info else chess.engine.Cp(info.pop("cp"))
+    info["score"] = chess.engine.PovScore(score, turn)
+    if "pv" in info:
+        info["pv"] = [chess.Move.from_uci(uci) for uci in info["pv"]]
+    return info
+
+class EvalCache:
+    """
+    Engine results keyed by Zobrist hash, side to move, search limit and
+    engine (a :func:`result_store.engine_settings` string, so engines or
+    options sharing one file never answer for each other).
+
+    An in-memory LRU tier of ``memory_size`` positions sits in front of an
+    optional SQLite file shared by runs and processes. A stored result
+    satisfies any request of the same limit kind with an equal or smaller
+    amount (a depth-20 search answers a depth-15 request) and an equal or
+    smaller MultiPV count, or fewer lines when it has one for every legal move.
+    """
+
+    def __init__(self, path=None, memory_size=100000):
+        self.memory_size = memory_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._db = None
+        if path is not None:
+            # Autocommit: several worker processes write to the same file, so
+            # no write lock is held between searches.
+            self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("BEGIN IMMEDIATE")
+            if self._db.execute("PRAGMA user_version").fetchone()[0] != EVAL_CACHE_VERSION:
+                # Entries of older files do not say which engine computed them.
+                self._db.execute("DROP TABLE IF EXISTS evals")
+                self._db.execute(f"PRAGMA user_version = {EVAL_CACHE_VERSION}")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS evals ("
+                "hash INTEGER, turn INTEGER, kind TEXT, engine TEXT, amount REAL, multipv INTEGER, data TEXT, "
+                "PRIMARY KEY (hash, turn, kind, engine, amount, multipv))"
+            )
+            self._db.execute("COMMIT")
+
+    @property
+    def hits(self):
+        return self.memory_hits + self.disk_hits
+
+    def stats(self):
+        return {"hits": self.hits, "memory_hits": self.memory_hits, "disk_hits": self.disk_hits,
+                "misses": self.misses, "memory_entries": len(self._memory)}
+
+    def _remember(self, key, entry):
+        current = self._memory.get(key)
+        # Only a strictly deeper/wider entry already in memory is kept over the new one.
+        deeper = current is not None and current[0] >= entry[0] and current[1] >= entry[1]
+        if not deeper or current[:2] == entry[:2]:
+            self._memory[key] = entry
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, board, limit, multipv=None, engine=""):
+        """Return a cached result of ``engine`` in the shape ``analyse`` would, or None."""
+        kind_amount = limit_key(limit)
+        if kind_amount is None:
+            return None
+        kind, amount = kind_amount
+        wanted_lines = multipv or 1
+        # A position with fewer legal moves than ``multipv`` is stored with
+        # one line per move, which is all any later search can return.
+        needed_lines = min(wanted_lines, max(board.legal_moves.count(), 1)) if wanted_lines > 1 else 1
+        key = (chess.polyglot.zobrist_hash(board), board.turn, kind, engine)
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] >= amount and entry[1] >= needed_lines:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+            else:
+                entry = None
+                if self._db is not None:
+                    row = self._db.execute(
+                        "SELECT amount, multipv, data FROM evals WHERE hash = ? AND turn = ? AND kind = ? "
+                        "AND engine = ? AND amount >= ? AND multipv >= ? ORDER BY amount DESC, multipv DESC LIMIT 1",
+                        (_signed(key[0]), int(key[1]), kind, engine, amount, needed_lines),
+                    ).fetchone()
+                    if row is not None:
+                        entry = (row[0], row[1], json.loads(row[2]))
+                        self._remember(key, entry)
+                        self.disk_hits += 1
+                if entry is None:
+                    self.misses += 1
+                    return None
+
+        infos = [_decode_info(encoded, board.turn) for encoded in entry[2][:wanted_lines]]
+        return infos if multipv is not None else infos[0]
+
+    def put(self, board, limit, result, multipv=None, engine=""):
+        kind_amount = limit_key(limit)
+        if kind_amount is None:
+            return
+        kind, amount = kind_amount
+        infos = result if isinstance(result, list) else [result]
+        if not infos or any("score" not in info for info in infos):
+            return
+        encoded = [_encode_info(info) for info in infos]
+        key = (chess.polyglot.zobrist_hash(board), board.turn, kind, engine)
+        entry = (amount, len(encoded), encoded)
+
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO evals VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (_signed(key[0]), int(key[1]), kind, engine, amount, len(encoded), json.dumps(encoded)),
+                )
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+class CachedEngine:
+    """
+    Engine wrapper that answers ``analyse`` from an :class:`EvalCache`.
+
+    Calls with options other than ``multipv`` bypass the cache. Entries are
+    kept apart per engine and the UCI ``options`` it was configured with.
+    When the wrapped engine is an engine pool, ``submit`` is offered as well
+    so that concurrent callers keep their concurrency.
+    """
+
+    def __init__(self, engine, cache, options=None):
+        self.engine = engine
+        self.cache = cache
+        self.settings = engine_settings(engine, options)
+        if hasattr(engine, "submit"):
+            self.submit = self._submit
+
+    def analyse(self, board, limit, multipv=None, **kwargs):
+        if kwargs:
+            return self.engine.analyse(board, limit, multipv=multipv, **kwargs)
+        result = self.cache.get(board, limit, multipv, self.settings)
+        if result is None:
+            result = self.engine.analyse(board, limit, multipv=multipv)
+            self.cache.put(board, limit, result, multipv, self.settings)
+        return result
+
+    def _submit(self, board, limit, multipv=None, **kwargs):
+        if kwargs:
+            return self.engine.submit(board, limit, multipv=multipv, **kwargs)
+        result = self.cache.get(board, limit, multipv, self.settings)
+        if result is not None:
+            future = concurrent.futures.Future()
+            future.set_result(result)
+            return future
+        board = board.copy()
+        future = self.engine.submit(board, limit, multipv=multipv)
+
+        def store(done):
+            if not done.cancelled() and done.exception() is None:
+                self.cache.put(board, limit, done.result(), multipv, self.settings)
+
+        future.add_done_callback(store)
+        return future
+
+    def quit(self):
+        self.cache.close()
+        self.engine.quit()
+
+    close = quit
@@ -0,0 +1,132 @@
+import time
+
+import chess
+import chess.engine
+
+from stockfish_utils import analyse_many
+
+DEFAULT_LIMIT = chess.engine.Limit(time=0.1)
+MATE_SCORE = 100000
+
+# With a time budget, this share is spread evenly over every ply; the rest
+# goes to the plies whose evaluation swings the most.
+FIRST_PASS_SHARE = 0.4
+REFINE_FRACTION = 0.25
+MIN_SEARCH_TIME = 0.01
+
+class TimeBudget:
+    """
+    Engine time shared by a batch of games.
+
+    Each game is allotted an equal share of what is left when it starts, so
+    time a game does not use goes to the games after it. Time is wall-clock
+    seconds of the thread or process searching; a budget is not shared
+    between workers, so parallel workers each spend their own.
+    """
+
+    def __init__(self, seconds, games=1):
+        self.remaining = seconds
+        self.games_left = games
+
+    def allocate(self):
+        share = self.remaining / max(self.games_left, 1)
+        self.games_left = max(self.games_left - 1, 0)
+        return share
+
+    def spend(self, seconds):
+        self.remaining = max(self.remaining - seconds, 0.0)
+
+class EvalTimeline:
+    """
+    Engine lines for every position of a game's mainline.
+
+    ``boards[0]`` is the starting position and ``boards[ply]`` the position
+    after ``ply`` moves; ``lines[ply]`` holds the MultiPV infos for it, best
+    line first, with scores relative to the side to move there.
+    """
+
+    def __init__(self, boards, multipv):
+        self.boards = boards
+        self.multipv = multipv
+        self.lines = [None] * len(boards)
+        self.limits = [None] * len(boards)
+
+    def __len__(self):
+        return len(self.boards)
+
+    def best(self, ply):
+        return self.lines[ply][0]
+
+    def white_score(self, ply):
+        """Best score at ``ply`` from White's point of view, in centipawns."""
+        return self.best(ply)["score"].white().score(mate_score=MATE_SCORE)
+
+    def swings(self):
+        """Largest evaluation change into or out of every ply."""
+        scores = [self.white_score(ply) for ply in range(len(self))]
+        changes = [abs(b - a) for a, b in zip(scores, scores[1:])]
+        return [max(changes[ply - 1] if ply else 0, changes[ply] if ply < len(changes) else 0)
+                for ply in range(len(self))]
+
+    def search(self, engine, plies, limits):
+        for ply, limit, lines in zip(plies, limits, analyse_many(
+                engine, [self.boards[ply] for ply in plies], limits, multipv=self.multipv)):
+            self.lines[ply] = lines
+            self.limits[ply] = limit
+
+def search_settings(time_budget=None):
+    """The timeline search settings engine analyses depend on, for :func:`result_store.engine_settings`."""
+    return {"timeline_limit": repr(DEFAULT_LIMIT), "time_budget": time_budget}
+
+def share_eval_timeline(game, engine, analyzers, budget=None):
+    """
+    Build one eval timeline of ``game`` for ``analyzers`` and hand it to
+    every analyzer with a ``timeline`` attribute, so all engine analyzers
+    share one search per ply. Nothing is searched unless an analyzer asks
+    for lines (``timeline_multipv``); the timeline then has the most lines
+    any of them needs. Returns the timeline, or None.
+    """
+    multipv = max((analyzer.timeline_multipv for analyzer in analyzers), default=0)
+    timeline = build_eval_timeline(game, engine, multipv=multipv, budget=budget) if multipv else None
+    for analyzer in analyzers:
+        if hasattr(analyzer, "timeline"):
+            # Also clears the timeline of the previous game.
+            analyzer.timeline = timeline
+    return timeline
+
+def build_eval_timeline(game, engine, limit=DEFAULT_LIMIT, multipv=1, budget=None):
+    """
+    Search every mainline position of ``game`` once.
+
+    Without a budget each position gets ``limit``. With a :class:`TimeBudget`
+    the game's allotment is split in two passes: an even first pass over all
+    plies, then deeper searches for the plies whose evaluation swings most.
+    """
+    board = game.board()
+    boards = [board.copy()]
+    for move in game.mainline_moves():
+        board.push(move)
+        boards.append(board.copy())
+    timeline = EvalTimeline(boards, multipv)
+    plies = list(range(len(boards)))
+
+    if budget is None:
+        timeline.search(engine, plies, [limit] * len(plies))
+        return timeline
+
+    started = time.monotonic()
+    seconds = budget.allocate()
+    first_pass = max(seconds * FIRST_PASS_SHARE / len(plies), MIN_SEARCH_TIME)
+    timeline.search(engine, plies, [chess.engine.Limit(time=first_pass)] * len(plies))
+
+    remaining = seconds - (time.monotonic() - started)
+    swings = timeline.swings()
+    refine = sorted(plies, key=lambda ply: swings[ply], reverse=True)[:max(1, int(len(plies) * REFINE_FRACTION))]
+    refine = [ply for ply in refine if swings[ply] > 0]
+    total_swing = sum(swings[ply] for ply in refine)
+    if remaining > 0 and total_swing:
+        limits = [chess.engine.Limit(time=max(first_pass, remaining * swings[ply] / total_swing)) for ply in refine]
+        timeline.search(engine, refine, limits)
+
+    budget.spend(time.monotonic() - started)
+    return timeline
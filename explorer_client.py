@@ -0,0 +1,190 @@
+import email.utils
+import json
+import math
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_BASE_URL = "https://explorer.lichess.ovh/lichess"
+DEFAULT_CONCURRENCY = 4
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0  # seconds, doubled on every retry
+RATE_LIMIT_PAUSE = 60.0  # Lichess asks clients to wait a minute after a 429
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+def retry_after_seconds(value, default=RATE_LIMIT_PAUSE):
+    """
+    Seconds to wait for a ``Retry-After`` header, given either as seconds or
+    as an HTTP date; ``default`` when it is missing or unreadable.
+    """
+    if not value:
+        return default
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return default
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        seconds = (when - datetime.now(timezone.utc)).total_seconds()
+    return max(seconds, 0.0) if math.isfinite(seconds) else default
+
+def position_key(fen):
+    """The explorer only depends on placement, turn, castling and en passant."""
+    return " ".join(fen.split()[:4])
+
+class ResponseCache:
+    """
+    Explorer responses keyed by (FEN, speeds, ratings), in memory and, when
+    ``path`` is given, in a SQLite file that later runs reuse.
+    """
+
+    def __init__(self, path=None):
+        self._memory = {}
+        self._lock = threading.Lock()
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "fen TEXT, speeds TEXT, ratings TEXT, data TEXT, PRIMARY KEY (fen, speeds, ratings))"
+            )
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                return self._memory[key]
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT data FROM responses WHERE fen = ? AND speeds = ? AND ratings = ?", key
+            ).fetchone()
+            if row is None:
+                return None
+            data = self._memory[key] = json.loads(row[0])
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            self._memory[key] = data
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (*key, json.dumps(data)))
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+class ExplorerClient:
+    """
+    Opening explorer client with one pooled HTTP session.
+
+    Up to ``concurrency`` requests run at once on a thread pool. Rate limits
+    (429) pause every request for ``Retry-After`` seconds, or a minute
+    without that header. Server errors and dropped connections are retried
+    with exponential backoff. Responses are cached by (FEN, speeds, ratings),
+    on disk when ``cache_path`` is given. ``base_url`` may point at any
+    server speaking the explorer API, such as a local stand-in.
+    """
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, cache_path=None, concurrency=DEFAULT_CONCURRENCY,
+                 token=None, max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, timeout=30):
+        self.base_url = base_url
+        self.cache = ResponseCache(cache_path)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        self.requests_made = 0
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="explorer")
+        self._pause_lock = threading.Lock()
+        self._paused_until = 0.0
+
+    def _wait_for_pause(self):
+        while True:
+            with self._pause_lock:
+                delay = self._paused_until - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def _pause(self, seconds):
+        with self._pause_lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _fetch(self, fen, speeds, ratings):
+        params = {"fen": fen, "speeds": speeds, "ratings": ratings}
+        error = None
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_pause()
+            with self._pause_lock:
+                self.requests_made += 1
+            try:
+                response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                error = e
+            else:
+                if response.status_code == 429:
+                    self._pause(retry_after_seconds(response.headers.get("Retry-After")))
+                    error = f"rate limited ({response.status_code})"
+                    continue
+                if response.status_code not in RETRY_STATUSES:
+                    try:
+                        response.raise_for_status()
+                        return response.json()
+                    except (requests.exceptions.RequestException, ValueError) as e:
+                        print(f"Error fetching data from Lichess API: {e}")
+                        print(f"Response status code: {response.status_code}")
+                        print(f"Response content: {response.text}")
+                        print(f"Full URL: {response.url}")
+                        return None
+                error = f"server error ({response.status_code})"
+            if attempt < self.max_retries:
+                time.sleep(self.backoff_base * 2 ** attempt * (1 + random.random() / 2))
+        print(f"Error fetching data from Lichess API: {error} after {self.max_retries + 1} attempts")
+        return None
+
+    def get(self, fen, speeds, ratings):
+        """Return the explorer JSON for ``fen``, or None if it could not be fetched."""
+        key = (position_key(fen), speeds, ratings)
+        data = self.cache.get(key)
+        if data is None:
+            data = self._fetch(fen, speeds, ratings)
+            if data is not None:
+                self.cache.put(key, data)
+        return data
+
+    def submit(self, fen, speeds, ratings):
+        """Fetch ``fen`` on the client's thread pool; returns a future."""
+        return self._executor.submit(self.get, fen, speeds, ratings)
+
+    def get_many(self, fens, speeds, ratings):
+        """Fetch several positions concurrently; results are in ``fens`` order."""
+        futures = [self.submit(fen, speeds, ratings) for fen in fens]
+        return [future.result() for future in futures]
+
+    def close(self):
+        self._executor.shutdown()
+        self.session.close()
+        self.cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# Deterministic stand-in for a UCI engine, for benchmarks and runs without
+# Stockfish. Start it through python-chess with a command list:
+#
+#     chess.engine.SimpleEngine.popen_uci([sys.executable, "fake_uci.py", "--latency", "0.01"])
+#
+# Scores and move orders depend only on the position, so every run returns
+# the same lines. Every "go" takes --latency seconds (or the Latency option,
+# in milliseconds), whatever limit it was given.
+import argparse
+import sys
+import time
+
+import chess
+import chess.polyglot
+
+MASK_64 = (1 << 64) - 1
+SCORE_RANGE = 400  # centipawns, centred on zero
+LINE_SPREAD = 30  # centipawns between consecutive MultiPV lines
+
+def position_score(key):
+    return key % (SCORE_RANGE + 1) - SCORE_RANGE // 2
+
+def ordered_moves(board, key):
+    """Legal moves in a pseudo-random order fixed by the position."""
+    return sorted(board.legal_moves,
+                  key=lambda move: ((key ^ ((move.from_square << 6 | move.to_square) * 0x9E3779B97F4A7C15)) & MASK_64,
+                                    move.promotion or 0))
+
+def search(board, multipv, depth):
+    """Return the ``info`` lines and the ``bestmove`` line of a search."""
+    key = chess.polyglot.zobrist_hash(board)
+    moves = ordered_moves(board, key)
+    if not moves:
+        score = "mate 0" if board.is_check() else "cp 0"
+        return [f"info depth 0 score {score}"], "bestmove (none)"
+    base = position_score(key)
+    infos = [f"info depth {depth} seldepth {depth} multipv {rank} score cp {base - LINE_SPREAD * (rank - 1)} "
+             f"nodes {depth * 1000} pv {move.uci()}"
+             for rank, move in enumerate(moves[:multipv], 1)]
+    return infos, f"bestmove {moves[0].uci()}"
+
+def parse_position(tokens):
+    if tokens[0] == "startpos":
+        board, rest = chess.Board(), tokens[1:]
+    else:
+        board, rest = chess.Board(" ".join(tokens[1:7])), tokens[7:]
+    for uci in rest[1:] if rest and rest[0] == "moves" else []:
+        board.push_uci(uci)
+    return board
+
+def run(latency, stdin=sys.stdin, stdout=sys.stdout):
+    board = chess.Board()
+    multipv = 1
+
+    def send(line):
+        stdout.write(line + "\n")
+        stdout.flush()
+
+    for line in stdin:
+        tokens = line.split()
+        if not tokens:
+            continue
+        command = tokens[0]
+        if command == "uci":
+            send("id name FakeUCI")
+            send("id author benchmark")
+            send("option name Hash type spin default 16 min 1 max 65536")
+            send("option name Threads type spin default 1 min 1 max 512")
+            send("option name MultiPV type spin default 1 min 1 max 500")
+            send(f"option name Latency type spin default {round(latency * 1000)} min 0 max 100000")
+            send("uciok")
+        elif command == "isready":
+            send("readyok")
+        elif command == "setoption" and "value" in tokens:
+            name = " ".join(tokens[tokens.index("name") + 1:tokens.index("value")])
+            value = tokens[tokens.index("value") + 1]
+            if name == "MultiPV":
+                multipv = int(value)
+            elif name == "Latency":
+                latency = int(value) / 1000
+        elif command == "ucinewgame":
+            board = chess.Board()
+        elif command == "position":
+            board = parse_position(tokens[1:])
+        elif command == "go":
+            depth = int(tokens[tokens.index("depth") + 1]) if "depth" in tokens else 10
+            if latency:
+                time.sleep(latency)
+            infos, bestmove = search(board, multipv, depth)
+            for info in infos:
+                send(info)
+            send(bestmove)
+        elif command == "quit":
+            break
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic stand-in UCI engine.")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds spent on every search")
+    args = parser.parse_args()
+    run(args.latency)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 import chess
 import chess.pgn
 
+from move_walker import Analyzer, walk_game
+
 PIECE_VALUES = {
     chess.PAWN: 1,
     chess.KNIGHT: 3,
@@ -12,94 +14,141 @@ PIECE_VALUES = {
 
 def is_protected(board, square, attacker_color):
     """Check if a square is protected by the opponent."""
-    opponent_color = not attacker_color
-    return any(board.is_attacked_by(opponent_color, sq) for sq in [square])
-
-def detect_fork_on_move(board, move):
-    """Detect if the given move creates a fork or exposes the player to a fork."""
-    fork_targets = []
-    counter_fork_targets = []
+    return bool(board.attackers_mask(not attacker_color, square))
+
+def pinned_mask(board, color):
+    """Bitboard of the pieces of ``color`` pinned to their king."""
+    king = board.king(color)
+    if king is None:
+        return 0
+    snipers = board.occupied_co[not color] & (
+        (chess.BB_RANK_ATTACKS[king][0] | chess.BB_FILE_ATTACKS[king][0]) & (board.rooks | board.queens)
+        | chess.BB_DIAG_ATTACKS[king][0] & (board.bishops | board.queens))
+    pinned = 0
+    for sniper in chess.scan_reversed(snipers):
+        blockers = chess.between(king, sniper) & board.occupied
+        # Exactly one piece in between, and it is one of ours.
+        if blockers and not blockers & (blockers - 1) and blockers & board.occupied_co[color]:
+            pinned |= blockers
+    return pinned
+
+def attacks_mask(piece_type, color, square, occupied):
+    """Attacks of a ``piece_type`` piece of ``color`` on ``square`` with the given occupancy."""
+    if piece_type == chess.PAWN:
+        return chess.BB_PAWN_ATTACKS[color][square]
+    if piece_type == chess.KNIGHT:
+        return chess.BB_KNIGHT_ATTACKS[square]
+    if piece_type == chess.KING:
+        return chess.BB_KING_ATTACKS[square]
+    attacks = 0
+    if piece_type in (chess.BISHOP, chess.QUEEN):
+        attacks |= chess.BB_DIAG_ATTACKS[square][chess.BB_DIAG_MASKS[square] & occupied]
+    if piece_type in (chess.ROOK, chess.QUEEN):
+        attacks |= (chess.BB_RANK_ATTACKS[square][chess.BB_RANK_MASKS[square] & occupied]
+                    | chess.BB_FILE_ATTACKS[square][chess.BB_FILE_MASKS[square] & occupied])
+    return attacks
+
+def reply_attacks_mask(board, reply):
+    """
+    Attacks of the piece standing on ``reply.to_square`` once ``reply`` is
+    played, computed from the occupancy after the move instead of a pushed
+    copy of the board. Returns 0 when no piece ends up on that square.
+    """
+    from_mask = chess.BB_SQUARES[reply.from_square]
+    to_square = reply.to_square
+    if board.is_castling(reply):
+        rank = chess.square_rank(reply.from_square)
+        kingside = board.is_kingside_castling(reply)
+        king_to = chess.square(6 if kingside else 2, rank)
+        rook_to = chess.square(5 if kingside else 3, rank)
+        if to_square == king_to:
+            return chess.BB_KING_ATTACKS[to_square]
+        if to_square == rook_to:  # Chess960 notation with a rook that stays put
+            occupied = board.occupied & ~from_mask | chess.BB_SQUARES[king_to]
+            return attacks_mask(chess.ROOK, board.turn, to_square, occupied)
+        return 0
+    occupied = board.occupied & ~from_mask | chess.BB_SQUARES[to_square]
+    piece_type = reply.promotion or board.piece_type_at(reply.from_square)
+    return attacks_mask(piece_type, board.turn, to_square, occupied)
+
+def counter_fork_targets(board, color, legal_moves=None):
+    """
+    Pieces of ``color`` (kings excluded) attacked by the moved piece of each
+    of the opponent's replies, in reply order; a square shows up once for
+    every reply that attacks it.
+    """
+    targets = board.occupied_co[color] & ~board.kings
+    found = []
+    for reply in (board.legal_moves if legal_moves is None else legal_moves):
+        for square in chess.scan_forward(reply_attacks_mask(board, reply) & targets):
+            piece_type = board.piece_type_at(square)
+            found.append((square, chess.Piece(piece_type, color).symbol(), PIECE_VALUES[piece_type]))
+    return found
+
+def detect_fork_on_move(board, move, legal_moves=None):
+    """
+    Detect if the given move creates a fork or exposes the player to a fork.
+    ``legal_moves`` may pass the already generated legal moves of ``board``.
+
+    Everything is read from attack and occupancy bitboards of ``board``; the
+    opponent's replies are only generated once the fork itself holds.
+    """
     attacker_square = move.to_square
     attacking_piece = board.piece_at(attacker_square)
-
-    if attacking_piece:
-        attacked_squares = board.attacks(attacker_square)
-
-        # Check each attacked square
-        for square in attacked_squares:
-            target_piece = board.piece_at(square)
-            if target_piece and target_piece.color != attacking_piece.color:  # Enemy piece
-                # Check if the target is pinned
-                is_pinned = board.is_pinned(target_piece.color, square)
-                # Check if the target square is protected
-                is_protected_status = is_protected(board, square, attacking_piece.color)
-                is_forcing = target_piece.piece_type == chess.KING  
-                
-                # Add target only if it's not pinned and meets other conditions
-                if not is_pinned and (not is_protected_status or is_forcing):
-                    fork_targets.append((square, target_piece.symbol(), PIECE_VALUES[target_piece.piece_type]))
-
-        # Check if the attacker itself becomes exposed to a fork
-        for opponent_move in board.legal_moves:
-            temp_board = board.copy()
-            temp_board.push(opponent_move)
-            opponent_attacker = temp_board.piece_at(opponent_move.to_square)
-            if opponent_attacker and opponent_attacker.color != attacking_piece.color:
-                opponent_attacked_squares = temp_board.attacks(opponent_move.to_square)
-                for opponent_square in opponent_attacked_squares:
-                    opponent_target_piece = temp_board.piece_at(opponent_square)
-                    if (
-                        opponent_target_piece
-                        and opponent_target_piece.color == attacking_piece.color
-                        and opponent_target_piece.piece_type != chess.KING
-                    ):
-                        counter_fork_targets.append(
-                            (opponent_square, opponent_target_piece.symbol(), PIECE_VALUES[opponent_target_piece.piece_type])
-                        )
-
-        # Check if the attacker is safe
-        attacker_is_safe = all(
-            PIECE_VALUES[attacking_piece.piece_type] >= PIECE_VALUES[board.piece_at(attacker).piece_type]
-            for attacker in board.attackers(not attacking_piece.color, attacker_square)
-        )
-
-        # Add a check for fork validity when targets are defended
-        fork_is_valid = True
-        for square, symbol, value in fork_targets:
-            defenders = board.attackers(not attacking_piece.color, square)
-            for defender in defenders:
-                defender_piece = board.piece_at(defender)
-                if defender_piece and PIECE_VALUES[defender_piece.piece_type] <= value:
-                    fork_is_valid = False
-
-        # Check if at least two valuable targets are threatened
-        if len(fork_targets) >= 2 and attacker_is_safe and fork_is_valid:
-            return {
-                "attacker": attacking_piece.symbol(),
-                "attacker_square": chess.square_name(attacker_square),
-                "targets": [
-                    {
-                        "target_piece": target[1],
-                        "position": chess.square_name(target[0]),
-                        "value": target[2],
-                        "protected": is_protected(board, target[0], attacking_piece.color),
-              
-                    }
-                    for target in fork_targets
-                ],
-                "counter_fork": len(counter_fork_targets) >= 2,  # Exposed to counter-fork
-                "counter_fork_targets": [
-                    {
-                        "target_piece": target[1],
-                        "position": chess.square_name(target[0]),
-                        "value": target[2],
-                    }
-                    for target in counter_fork_targets
-                ],
+    if not attacking_piece:
+        return None
+    color = attacking_piece.color
+    enemies = board.occupied_co[not color]
+
+    # Enemy pieces hit by the moved piece that are undefended (or the king) and not pinned
+    attacked = board.attacks_mask(attacker_square) & enemies
+    if chess.popcount(attacked) < 2:
+        return None
+    attacked &= ~pinned_mask(board, not color)
+    fork_targets = []
+    for square in chess.scan_forward(attacked):
+        piece_type = board.piece_type_at(square)
+        if piece_type == chess.KING or not board.attackers_mask(not color, square):
+            fork_targets.append((square, piece_type))
+    if len(fork_targets) < 2:
+        return None
+
+    # As in the original check, the attacker counts as safe unless an enemy
+    # piece worth *more* than it attacks it; cheaper attackers are ignored.
+    attacker_value = PIECE_VALUES[attacking_piece.piece_type]
+    for square in chess.scan_forward(board.attackers_mask(not color, attacker_square)):
+        if PIECE_VALUES[board.piece_type_at(square)] > attacker_value:
+            return None
+
+    # A target defended by a piece worth no more than itself spoils the fork
+    for square, piece_type in fork_targets:
+        for defender in chess.scan_forward(board.attackers_mask(not color, square)):
+            if PIECE_VALUES[board.piece_type_at(defender)] <= PIECE_VALUES[piece_type]:
+                return None
+
+    counter_targets = counter_fork_targets(board, color, legal_moves)
+    return {
+        "attacker": attacking_piece.symbol(),
+        "attacker_square": chess.square_name(attacker_square),
+        "targets": [
+            {
+                "target_piece": chess.Piece(piece_type, not color).symbol(),
+                "position": chess.square_name(square),
+                "value": PIECE_VALUES[piece_type],
+                "protected": is_protected(board, square, color),
             }
-    return None
-
-
+            for square, piece_type in fork_targets
+        ],
+        "counter_fork": len(counter_targets) >= 2,  # Exposed to counter-fork
+        "counter_fork_targets": [
+            {
+                "target_piece": target[1],
+                "position": chess.square_name(target[0]),
+                "value": target[2],
+            }
+            for target in counter_targets
+        ],
+    }
 
 
 def format_fork_details(fork_details):
@@ -123,29 +172,38 @@ def format_fork_details(fork_details):
     return formatted_details
 
 
-def analyze_forks(game):
-    """Analyze a chess game for forks based on played moves."""
-    board = game.board()
-    white_fork_count = 0
-    black_fork_count = 0
-    white_fork_details = []
-    black_fork_details = []
+class ForkAnalyzer(Analyzer):
+    """Detect forks created by the played moves."""
+
+    name = "forks"
+
+    def start(self, game, board):
+        self.white_fork_count = 0
+        self.black_fork_count = 0
+        self.white_fork_details = []
+        self.black_fork_details = []
 
-    for move in game.mainline_moves():
-        board.push(move)  # Play the move
-        fork = detect_fork_on_move(board, move)  # Detect fork caused by this move
+    def after_push(self, ctx):
+        board = ctx.board
+        fork = detect_fork_on_move(board, ctx.move)  # Detect fork caused by this move
 
         if fork:
             if board.turn:  # If it's White's turn, the previous move was Black's
-                black_fork_count += 1
-                black_fork_details.append(fork)
+                self.black_fork_count += 1
+                self.black_fork_details.append(fork)
             else:
-                white_fork_count += 1
-                white_fork_details.append(fork)
+                self.white_fork_count += 1
+                self.white_fork_details.append(fork)
 
-    return {
-        "White fork count": white_fork_count,
-        "White fork details": white_fork_details,
-        "Black fork count": black_fork_count,
-        "Black fork details": black_fork_details,
-    }
\ No newline at end of file
+    def finish(self, game, board):
+        return {
+            "White fork count": self.white_fork_count,
+            "White fork details": self.white_fork_details,
+            "Black fork count": self.black_fork_count,
+            "Black fork details": self.black_fork_details,
+        }
+
+
+def analyze_forks(game):
+    """Analyze a chess game for forks based on played moves."""
+    return walk_game(game, [ForkAnalyzer()])
\ No newline at end of file
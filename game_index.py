@@ -0,0 +1,276 @@
+import argparse
+import itertools
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from pgn_utils import collect_pgn_files, read_game_at, scan_game_summaries
+
+MANIFEST_NAME = "manifest.json"
+INDEX_VERSION = 3
+RESULT_CODES = {"*": 0, "1-0": 1, "0-1": 2, "1/2-1/2": 3}
+DECISIVE_CODES = (1, 2)
+
+def _elo(headers, name):
+    try:
+        elo = int(headers.get(name, ""))
+    except ValueError:
+        return 0
+    # Stored as int32; a header too large for that counts as unrated.
+    return elo if -2 ** 31 <= elo < 2 ** 31 else 0
+
+def date_code(date):
+    """"YYYY.MM.DD" as the integer YYYYMMDD, unknown parts ("??") as zeros."""
+    parts = (date.split(".") + ["", "", ""])[:3]
+    code = 0
+    for part, width in zip(parts, (10000, 100, 1)):
+        if part.isdigit():
+            code += int(part) * width
+    return code
+
+def eco_code(eco):
+    """"B90" as 190 (letter index * 100 + number), -1 when missing or malformed."""
+    if len(eco) == 3 and eco[0] in "ABCDE" and eco[1:].isdigit():
+        return "ABCDE".index(eco[0]) * 100 + int(eco[1:])
+    return -1
+
+def eco_range(prefix):
+    """
+    Inclusive code range of an ECO prefix: "B" -> B00-B99, "B9" -> B90-B99,
+    "B90" -> B90. Raises ValueError for anything else.
+    """
+    if not re.fullmatch(r"[A-E][0-9]{0,2}", prefix):
+        raise ValueError(f"Malformed ECO code or prefix {prefix!r}, expected a letter A-E and up to two digits.")
+    low = "ABCDE".index(prefix[0]) * 100
+    if len(prefix) == 1:
+        return low, low + 99
+    if len(prefix) == 2:
+        return low + int(prefix[1]) * 10, low + int(prefix[1]) * 10 + 9
+    return low + int(prefix[1:]), low + int(prefix[1:])
+
+def scan_file(pgn_file_path):
+    """
+    Header columns of every game of a file, read without parsing move text.
+    Player and event names are stored once per file and referenced by index.
+    """
+    columns = {name: [] for name in ("offset", "white_elo", "black_elo", "result", "date", "eco", "ply_count")}
+    strings = {"white": [], "black": [], "event": []}
+    for offset, headers, ply_count in scan_game_summaries(pgn_file_path):
+        columns["offset"].append(offset)
+        columns["white_elo"].append(_elo(headers, "WhiteElo"))
+        columns["black_elo"].append(_elo(headers, "BlackElo"))
+        columns["result"].append(RESULT_CODES.get(headers.get("Result", "*"), 0))
+        columns["date"].append(date_code(headers.get("Date", "")))
+        columns["eco"].append(eco_code(headers.get("ECO", "")))
+        columns["ply_count"].append(ply_count)
+        strings["white"].append(headers.get("White", "?"))
+        strings["black"].append(headers.get("Black", "?"))
+        strings["event"].append(headers.get("Event", "?"))
+
+    arrays = {
+        "offset": np.array(columns["offset"], dtype=np.int64),
+        "white_elo": np.array(columns["white_elo"], dtype=np.int32),
+        "black_elo": np.array(columns["black_elo"], dtype=np.int32),
+        "result": np.array(columns["result"], dtype=np.int8),
+        "date": np.array(columns["date"], dtype=np.int32),
+        "eco": np.array(columns["eco"], dtype=np.int16),
+        "ply_count": np.array(columns["ply_count"], dtype=np.int32),
+    }
+    names, inverse = np.unique(np.array(strings["white"] + strings["black"] + strings["event"], dtype=str),
+                               return_inverse=True)
+    count = len(columns["offset"])
+    arrays["names"] = names
+    arrays["white"] = inverse[:count].astype(np.int32)
+    arrays["black"] = inverse[count:2 * count].astype(np.int32)
+    arrays["event"] = inverse[2 * count:].astype(np.int32)
+    return arrays
+
+class GameIndex:
+    """
+    Header-only, columnar index of the games in a set of PGN files.
+
+    Every indexed file gets one ``.npz`` of NumPy columns in ``directory``
+    (byte offset, Elos, result, date, ECO, ply count and player/event name
+    ids), listed in ``manifest.json`` with the file's size and mtime so that
+    only new or changed files are scanned again. Filters are evaluated as
+    vectorized masks over the columns; the move text is never read.
+    Matching games are loaded afterwards with :func:`pgn_utils.read_game_at`.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._chunks = {}
+        self.files = {}
+        try:
+            with open(os.path.join(directory, MANIFEST_NAME), "r", encoding="utf-8") as manifest_file:
+                manifest = json.load(manifest_file)
+            if manifest.get("version") == INDEX_VERSION:
+                self.files = manifest["files"]
+        except (OSError, ValueError):
+            pass
+
+    def _chunk_path(self, file_id):
+        return os.path.join(self.directory, f"{file_id}.npz")
+
+    def _save_manifest(self):
+        manifest_path = os.path.join(self.directory, MANIFEST_NAME)
+        temp_path = f"{manifest_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as manifest_file:
+            json.dump({"version": INDEX_VERSION, "files": self.files}, manifest_file)
+        os.replace(temp_path, manifest_path)
+
+    def update(self, pgn_files, workers=None):
+        """
+        Index new files and re-index files whose size or mtime changed, in
+        parallel over files. Indexed files that no longer exist are dropped
+        with their chunks. Returns the paths that were (re)indexed.
+        """
+        removed = [path for path in self.files if not os.path.exists(path)]
+        for path in removed:
+            file_id = self.files.pop(path)["id"]
+            self._chunks.pop(file_id, None)
+            try:
+                os.remove(self._chunk_path(file_id))
+            except FileNotFoundError:
+                pass
+        stale = []
+        for path in map(os.path.abspath, pgn_files):
+            stat = os.stat(path)
+            entry = self.files.get(path)
+            if entry is None or (entry["size"], entry["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+                stale.append((path, stat))
+        if not stale:
+            if removed:
+                self._save_manifest()
+            return []
+
+        next_id = max((entry["id"] for entry in self.files.values()), default=-1) + 1
+        with ProcessPoolExecutor(workers or os.cpu_count() or 1) as pool:
+            for (path, stat), arrays in zip(stale, pool.map(scan_file, [path for path, _ in stale])):
+                entry = self.files.get(path)
+                if entry is None:
+                    entry = {"id": next_id}
+                    next_id += 1
+                np.savez(self._chunk_path(entry["id"]), **arrays)
+                entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns, games=len(arrays["offset"]))
+                self.files[path] = entry
+                self._chunks.pop(entry["id"], None)
+        self._save_manifest()
+        return [path for path, _ in stale]
+
+    def _chunk(self, file_id):
+        chunk = self._chunks.get(file_id)
+        if chunk is None:
+            with np.load(self._chunk_path(file_id)) as data:
+                chunk = self._chunks[file_id] = {name: data[name] for name in data.files}
+        return chunk
+
+    def query(self, min_elo=None, max_elo=None, eco=None, result=None, decisive=None, max_moves=None,
+              min_moves=None, player=None, white=None, black=None, event=None, date_from=None, date_to=None,
+              limit=None):
+        """
+        Return ``(pgn_file_path, offset)`` for the games matching every given
+        filter, in file and game order. ``min_elo``/``max_elo`` apply to both
+        players (games without ratings never match them); ``eco`` is a code
+        or prefix ("B90", "B9"); ``max_moves``/``min_moves`` count full
+        moves; ``player`` matches either side; dates are "YYYY.MM.DD".
+        """
+        matches = []
+        for path, entry in sorted(self.files.items(), key=lambda item: item[1]["id"]):
+            if not entry["games"]:
+                continue
+            chunk = self._chunk(entry["id"])
+            mask = np.ones(entry["games"], dtype=bool)
+            if min_elo is not None:
+                mask &= (chunk["white_elo"] >= min_elo) & (chunk["black_elo"] >= min_elo)
+            if max_elo is not None:
+                mask &= (chunk["white_elo"] > 0) & (chunk["white_elo"] <= max_elo)
+                mask &= (chunk["black_elo"] > 0) & (chunk["black_elo"] <= max_elo)
+            if eco:
+                low, high = eco_range(eco)
+                mask &= (chunk["eco"] >= low) & (chunk["eco"] <= high)
+            if result:
+                mask &= chunk["result"] == RESULT_CODES[result]
+            if decisive is not None:
+                is_decisive = (chunk["result"] == DECISIVE_CODES[0]) | (chunk["result"] == DECISIVE_CODES[1])
+                mask &= is_decisive if decisive else ~is_decisive
+            if max_moves is not None:
+                mask &= chunk["ply_count"] <= max_moves * 2
+            if min_moves is not None:
+                mask &= chunk["ply_count"] >= min_moves * 2 - 1
+            if date_from:
+                mask &= chunk["date"] >= date_code(date_from)
+            if date_to:
+                mask &= chunk["date"] <= date_code(date_to)
+            for column, name in (("white", white), ("black", black), ("event", event), (None, player)):
+                if not name:
+                    continue
+                ids = np.flatnonzero(chunk["names"] == name)
+                if column is None:
+                    mask &= np.isin(chunk["white"], ids) | np.isin(chunk["black"], ids)
+                else:
+                    mask &= np.isin(chunk[column], ids)
+            matches.extend(zip(itertools.repeat(path), chunk["offset"][mask].tolist()))
+            if limit is not None and len(matches) >= limit:
+                return matches[:limit]
+        return matches
+
+    def count(self):
+        return sum(entry["games"] for entry in self.files.values())
+
+def main():
+    parser = argparse.ArgumentParser(description="Index PGN headers and filter games without parsing moves.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    update = subparsers.add_parser("update", help="index new or changed PGN files")
+    update.add_argument("index", help="index directory")
+    update.add_argument("paths", nargs="+", help="PGN files or directories")
+    update.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    query = subparsers.add_parser("query", help="list the games matching the filters")
+    query.add_argument("index", help="index directory")
+    query.add_argument("--min-elo", type=int)
+    query.add_argument("--max-elo", type=int)
+    query.add_argument("--eco", help="ECO code or prefix")
+    query.add_argument("--result", choices=tuple(RESULT_CODES))
+    query.add_argument("--decisive", action=argparse.BooleanOptionalAction,
+                       help="only decisive games, or with --no-decisive only draws and unfinished games")
+    query.add_argument("--max-moves", type=int)
+    query.add_argument("--min-moves", type=int)
+    query.add_argument("--player")
+    query.add_argument("--white")
+    query.add_argument("--black")
+    query.add_argument("--event")
+    query.add_argument("--date-from")
+    query.add_argument("--date-to")
+    query.add_argument("--limit", type=int)
+    query.add_argument("--pgn", action="store_true", help="print the matching games instead of their offsets")
+    args = parser.parse_args()
+
+    index = GameIndex(args.index)
+    if args.command == "update":
+        updated = index.update(collect_pgn_files(args.paths), args.workers)
+        print(f"Indexed {len(updated)} file(s), {index.count()} games in total.")
+        return
+    if args.eco:
+        try:
+            eco_range(args.eco)
+        except ValueError as error:
+            parser.error(str(error))
+    started = time.perf_counter()
+    matches = index.query(args.min_elo, args.max_elo, args.eco, args.result, args.decisive, args.max_moves,
+                          args.min_moves, args.player, args.white, args.black, args.event, args.date_from,
+                          args.date_to, args.limit)
+    elapsed = time.perf_counter() - started
+    for path, offset in matches:
+        if args.pgn:
+            print(read_game_at(path, offset), end="\n\n")
+        else:
+            print(f"{path}\t{offset}")
+    print(f"{len(matches)} game(s) in {elapsed * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
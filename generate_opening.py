@@ -1,30 +1,20 @@
-import requests
 import chess
 import chess.pgn
-import urllib.parse
 import io
 
-def get_opening_stats(fen, time_control, rating):
-    url = "https://explorer.lichess.ovh/lichess"
-    params = {
-        "fen": fen,
-        "speeds": time_control,
-        "ratings": rating,
-    }
-    
-    encoded_params = urllib.parse.urlencode(params)
-    full_url = f"{url}?{encoded_params}"
-    
-    try:
-        response = requests.get(full_url)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching data from Lichess API: {e}")
-        print(f"Response status code: {response.status_code}")
-        print(f"Response content: {response.text}")
-        print(f"Full URL: {full_url}")
-        return None
+from explorer_client import ExplorerClient
+
+# Shared by every call that does not pass its own client.
+_default_client = None
+
+def get_default_client():
+    global _default_client
+    if _default_client is None:
+        _default_client = ExplorerClient(cache_path="explorer_cache.sqlite")
+    return _default_client
+
+def get_opening_stats(fen, time_control, rating, client=None):
+    return (client or get_default_client()).get(fen, time_control, rating)
 
 def get_best_move(stats):
     moves = stats.get("moves", [])
@@ -42,34 +32,39 @@ def get_valid_responses(stats, min_probability=0.05):
     total_games = sum(move["white"] + move["draws"] + move["black"] for move in moves)
     return [move["san"] for move in moves if (move["white"] + move["draws"] + move["black"]) / total_games >= min_probability]
 
-def create_variation_tree(node, board, depth, time_control, rating, is_player_turn=True):
-    if depth == 0:
-        return
+def create_variation_tree(node, board, depth, time_control, rating, is_player_turn=True, client=None):
+    """
+    Grow the repertoire under ``node`` breadth-first, fetching all positions
+    of one depth concurrently. The tree is the same as a depth-first walk
+    would produce, since each node's variations keep their order.
+    """
+    client = client or get_default_client()
+    frontier = [(node, board, is_player_turn)]
+    for _ in range(depth):
+        if not frontier:
+            return
+        all_stats = client.get_many([board.fen() for _, board, _ in frontier], time_control, rating)
+        next_frontier = []
+        for (node, board, is_player_turn), stats in zip(frontier, all_stats):
+            if stats is None:
+                continue
 
-    stats = get_opening_stats(board.fen(), time_control, rating)
-    if stats is None:
-        return
+            if is_player_turn:
+                # Player's move (White)
+                best_move = get_best_move(stats)
+                moves = [] if best_move is None else [best_move]
+            else:
+                # Opponent's moves (Black)
+                moves = get_valid_responses(stats)
 
-    if is_player_turn:
-        # Player's move (White)
-        
-        best_move = get_best_move(stats)
-        if best_move is None:
-            return
-        new_node = node.add_variation(board.parse_san(best_move))
-        new_board = board.copy()
-        new_board.push_san(best_move)
-        create_variation_tree(new_node, new_board, depth - 1, time_control, rating, False)
-    else:
-        # Opponent's moves (Black)
-        valid_responses = get_valid_responses(stats)
-        for response in valid_responses:
-            new_node = node.add_variation(board.parse_san(response))
-            new_board = board.copy()
-            new_board.push_san(response)
-            create_variation_tree(new_node, new_board, depth - 1, time_control, rating, True)
+            for san in moves:
+                new_node = node.add_variation(board.parse_san(san))
+                new_board = board.copy(stack=False)
+                new_board.push_san(san)
+                next_frontier.append((new_node, new_board, not is_player_turn))
+        frontier = next_frontier
 
-def create_pgn(depth, time_control, rating):
+def create_pgn(depth, time_control, rating, client=None):
     game = chess.pgn.Game()
     game.headers["Event"] = "Lichess Opening Explorer"
     game.headers["Site"] = "https://lichess.org/"
@@ -80,7 +75,7 @@ def create_pgn(depth, time_control, rating):
     game.headers["Result"] = "*"
 
     board = chess.Board()
-    create_variation_tree(game, board, depth, time_control, rating)
+    create_variation_tree(game, board, depth, time_control, rating, client=client)
 
     return game
 
@@ -0,0 +1,267 @@
+import cProfile
+import heapq
+import json
+import os
+import re
+import threading
+import time
+
+from eval_cache import limit_key
+
+PROFILE_PATTERN = re.compile(r"^\d{9}ms-.*\.prof$")
+
+def _add_search(limits, kind, seconds):
+    entry = limits.setdefault(kind, {"calls": 0, "seconds": 0.0})
+    entry["calls"] += 1
+    entry["seconds"] += seconds
+
+class InstrumentedEngine:
+    """
+    Engine wrapper counting searches and their wall time per limit kind.
+
+    Every search is also added to ``target``, the stats entry of whichever
+    analyzer :class:`Instrumentation` is timing at the moment. Pool
+    searches (``submit``) are timed from submission to completion.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.target = None
+        self.calls = 0
+        self.seconds = 0.0
+        self.limits = {}
+        self._lock = threading.Lock()
+        if hasattr(engine, "submit"):
+            self.submit = self._submit
+
+    def _record(self, target, limit, seconds):
+        kind = (limit_key(limit) or ("other",))[0]
+        with self._lock:
+            self.calls += 1
+            self.seconds += seconds
+            _add_search(self.limits, kind, seconds)
+            if target is not None:
+                target["engine_calls"] += 1
+                target["engine_s"] += seconds
+                _add_search(target["engine_limits"], kind, seconds)
+
+    def analyse(self, board, limit, **kwargs):
+        target = self.target
+        started = time.perf_counter()
+        try:
+            return self.engine.analyse(board, limit, **kwargs)
+        finally:
+            self._record(target, limit, time.perf_counter() - started)
+
+    def _submit(self, board, limit, **kwargs):
+        target = self.target
+        started = time.perf_counter()
+        future = self.engine.submit(board, limit, **kwargs)
+        future.add_done_callback(lambda done: self._record(target, limit, time.perf_counter() - started))
+        return future
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "seconds": round(self.seconds, 4),
+                    "limits": {kind: {"calls": entry["calls"], "seconds": round(entry["seconds"], 4)}
+                               for kind, entry in sorted(self.limits.items())}}
+
+    def quit(self):
+        self.engine.quit()
+
+def _analyzer_name(analyzer):
+    return analyzer.name or type(analyzer).__name__
+
+def _new_entry():
+    return {"wall_s": 0.0, "cpu_s": 0.0, "plies": 0, "engine_calls": 0, "engine_s": 0.0, "engine_limits": {},
+            "cache_hits": 0}
+
+class Instrumentation:
+    """
+    Per-game, per-analyzer timings, written as one JSON line per game.
+
+    Each line has the game's wall and CPU time and, per analyzer, wall and
+    CPU time, plies processed, engine searches with their time per limit
+    kind, and evaluation cache hits. Engine figures need the engine wrapped
+    in :class:`InstrumentedEngine` (passed as ``engine``), cache hits the
+    :class:`eval_cache.EvalCache` (``cache``). With ``profile_top`` every
+    game runs under cProfile and the profiles of the slowest games are
+    written to ``profile_dir`` by :meth:`close`.
+    """
+
+    def __init__(self, output_path=None, engine=None, cache=None, profile_top=0, profile_dir="profiles"):
+        self.engine = engine
+        self.cache = cache
+        self.profile_top = profile_top
+        self.profile_dir = profile_dir
+        self.records = [] if output_path is None else None
+        self._fd = None if output_path is None else os.open(output_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+        self._profiles = []
+        self._sequence = 0
+        self._analyzers = None
+
+    def _cache_hits(self):
+        return self.cache.hits if self.cache is not None else 0
+
+    def _enter(self, name):
+        entry = self._analyzers.get(name)
+        if entry is None:
+            entry = self._analyzers[name] = _new_entry()
+        previous = None
+        if self.engine is not None:
+            previous, self.engine.target = self.engine.target, entry
+        return entry, previous, self._cache_hits(), time.perf_counter(), time.process_time()
+
+    def _exit(self, state):
+        entry, previous, hits, wall, cpu = state
+        entry["wall_s"] += time.perf_counter() - wall
+        entry["cpu_s"] += time.process_time() - cpu
+        entry["cache_hits"] += self._cache_hits() - hits
+        if self.engine is not None:
+            self.engine.target = previous
+
+    def timed(self, analyzer, hook):
+        """Wrap an analyzer hook so its calls are charged to the analyzer."""
+        name = _analyzer_name(analyzer)
+
+        def call(*args):
+            state = self._enter(name)
+            try:
+                return hook(*args)
+            finally:
+                self._exit(state)
+        return call
+
+    def add_plies(self, analyzer, plies):
+        self._analyzers.setdefault(_analyzer_name(analyzer), _new_entry())["plies"] += plies
+
+    def track(self, name, plies=0):
+        """Context manager charging a block to analyzer ``name``, for analyzers outside ``walk_game``."""
+        return _Tracked(self, name, plies)
+
+    def game(self, game_id):
+        """Context manager around one game; writes the game's record when it ends."""
+        return _GameRecord(self, game_id)
+
+    def _write(self, record):
+        if self._fd is None:
+            self.records.append(record)
+        else:
+            # One write per line, so lines from several processes do not interleave.
+            os.write(self._fd, (json.dumps(record) + "\n").encode("utf-8"))
+
+    def _keep_profile(self, wall, game_id, profile):
+        self._sequence += 1
+        item = (wall, self._sequence, game_id, profile)
+        if len(self._profiles) < self.profile_top:
+            heapq.heappush(self._profiles, item)
+        else:
+            heapq.heappushpop(self._profiles, item)
+
+    def close(self):
+        """Write the kept profiles, named by wall time in milliseconds, and close the output."""
+        if self._profiles:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            for wall, _, game_id, profile in self._profiles:
+                name = re.sub(r"[^\w.#-]+", "_", os.path.basename(game_id))
+                profile.dump_stats(os.path.join(self.profile_dir, f"{round(wall * 1000):09d}ms-{name}.prof"))
+            self._profiles = []
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+class _Tracked:
+    def __init__(self, instrumentation, name, plies):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.plies = plies
+
+    def __enter__(self):
+        self.state = self.instrumentation._enter(self.name)
+        self.state[0]["plies"] += self.plies
+
+    def __exit__(self, *exc_info):
+        self.instrumentation._exit(self.state)
+
+class _GameRecord:
+    def __init__(self, instrumentation, game_id):
+        self.instrumentation = instrumentation
+        self.game_id = game_id
+
+    def __enter__(self):
+        instrumentation = self.instrumentation
+        instrumentation._analyzers = {}
+        self.profile = cProfile.Profile() if instrumentation.profile_top else None
+        self.wall, self.cpu = time.perf_counter(), time.process_time()
+        if self.profile is not None:
+            self.profile.enable()
+
+    def __exit__(self, exc_type, exc, traceback):
+        if self.profile is not None:
+            self.profile.disable()
+        wall = time.perf_counter() - self.wall
+        instrumentation = self.instrumentation
+        analyzers = instrumentation._analyzers
+        instrumentation._analyzers = None
+        for entry in analyzers.values():
+            for field in ("wall_s", "cpu_s", "engine_s"):
+                entry[field] = round(entry[field], 6)
+            for limit in entry["engine_limits"].values():
+                limit["seconds"] = round(limit["seconds"], 6)
+        record = {"game_id": self.game_id, "wall_s": round(wall, 6),
+                  "cpu_s": round(time.process_time() - self.cpu, 6), "analyzers": analyzers}
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        instrumentation._write(record)
+        if self.profile is not None:
+            instrumentation._keep_profile(wall, self.game_id, self.profile)
+
+def read_records(path):
+    with open(path, "r", encoding="utf-8") as records_file:
+        return [json.loads(line) for line in records_file if line.strip()]
+
+def prune_profiles(profile_dir, keep):
+    """Keep the ``keep`` slowest profiles of ``profile_dir``, as written by several processes."""
+    if not os.path.isdir(profile_dir):
+        return []
+    names = sorted((name for name in os.listdir(profile_dir) if PROFILE_PATTERN.match(name)), reverse=True)
+    for name in names[keep:]:
+        os.remove(os.path.join(profile_dir, name))
+    return [os.path.join(profile_dir, name) for name in names[:keep]]
+
+def clear_profiles(profile_dir):
+    """Remove profiles left by an earlier run."""
+    prune_profiles(profile_dir, 0)
+
+def summarize(records):
+    """Totals per analyzer over game records, slowest analyzer first."""
+    totals = {}
+    for record in records:
+        for name, entry in record["analyzers"].items():
+            total = totals.setdefault(name, {"games": 0, "wall_s": 0.0, "cpu_s": 0.0, "plies": 0, "engine_calls": 0,
+                                             "engine_s": 0.0, "cache_hits": 0, "engine_limits": {}})
+            total["games"] += 1
+            for field in ("wall_s", "cpu_s", "plies", "engine_calls", "engine_s", "cache_hits"):
+                total[field] += entry[field]
+            for kind, limit in entry["engine_limits"].items():
+                kind_total = total["engine_limits"].setdefault(kind, {"calls": 0, "seconds": 0.0})
+                kind_total["calls"] += limit["calls"]
+                kind_total["seconds"] += limit["seconds"]
+    return dict(sorted(totals.items(), key=lambda item: item[1]["wall_s"], reverse=True))
+
+def format_summary(records, slowest=5):
+    """A plain-text table of :func:`summarize`, followed by the slowest games."""
+    total_wall = sum(record["wall_s"] for record in records) or 1e-9
+    lines = [f"{'analyzer':<14}{'games':>7}{'wall s':>10}{'share':>7}{'cpu s':>10}{'plies/s':>11}"
+             f"{'engine':>8}{'engine s':>10}{'cache':>7}  limits"]
+    for name, total in summarize(records).items():
+        plies_per_s = total["plies"] / total["wall_s"] if total["wall_s"] else 0.0
+        limits = ", ".join(f"{kind} {limit['calls']}/{limit['seconds']:.2f}s"
+                           for kind, limit in sorted(total["engine_limits"].items()))
+        lines.append(f"{name:<14}{total['games']:>7}{total['wall_s']:>10.2f}{total['wall_s'] / total_wall:>7.0%}"
+                     f"{total['cpu_s']:>10.2f}{plies_per_s:>11.1f}{total['engine_calls']:>8}"
+                     f"{total['engine_s']:>10.2f}{total['cache_hits']:>7}  {limits}")
+    lines.append(f"{len(records)} games, {total_wall:.2f} s")
+    for record in sorted(records, key=lambda record: record["wall_s"], reverse=True)[:slowest]:
+        lines.append(f"  {record['wall_s']:8.3f} s  {record['game_id']}")
+    return "\n".join(lines)
@@ -0,0 +1,240 @@
+import argparse
+import functools
+import json
+import os
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import chess
+import chess.polyglot
+
+from pgn_utils import collect_pgn_files, iter_games, shard_pgn
+from eco_cache import pack_move, unpack_move
+from explorer_client import position_key
+
+# Lower bounds of the Lichess rating buckets (average rating of both players).
+RATING_BUCKETS = (0, 1000, 1200, 1400, 1600, 1800, 2000, 2200, 2500)
+SPEEDS = ("ultraBullet", "bullet", "blitz", "rapid", "classical", "correspondence")
+DEFAULT_MAX_PLIES = 50
+ANSWER_CACHE_SIZE = 100000
+RESULT_COLUMNS = {"1-0": 0, "1/2-1/2": 1, "0-1": 2}
+
+def _signed(key):
+    # SQLite integers are signed 64-bit.
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+def rating_bucket(headers):
+    """Bucket of the players' average rating; games without ratings go to the lowest one."""
+    ratings = []
+    for header in ("WhiteElo", "BlackElo"):
+        try:
+            ratings.append(int(headers.get(header, "")))
+        except ValueError:
+            pass
+    if not ratings:
+        return RATING_BUCKETS[0]
+    average = sum(ratings) / len(ratings)
+    return max(bucket for bucket in RATING_BUCKETS if bucket <= average)
+
+def game_speed(headers):
+    """
+    Speed category from the TimeControl header, with Lichess' thresholds on
+    base + 40 * increment seconds. Games without one (over-the-board
+    databases) count as classical.
+    """
+    time_control = headers.get("TimeControl", "")
+    if time_control == "-":
+        return "correspondence"
+    try:
+        base, _, increment = time_control.partition("+")
+        estimate = int(base) + 40 * int(increment or 0)
+    except ValueError:
+        return "classical"
+    if estimate < 30:
+        return "ultraBullet"
+    if estimate < 180:
+        return "bullet"
+    if estimate < 480:
+        return "blitz"
+    if estimate < 1500:
+        return "rapid"
+    return "classical"
+
+def count_shard(pgn_file_path, start, stop, max_plies=DEFAULT_MAX_PLIES):
+    """
+    Replay games ``start`` to ``stop`` of a file and count results per
+    ``(position hash, speed, rating bucket, packed move)``.
+    """
+    counts = {}
+    for game in iter_games(pgn_file_path, start, stop, mainline_only=True):
+        column = RESULT_COLUMNS.get(game.headers.get("Result"))
+        if column is None:
+            continue
+        speed = game_speed(game.headers)
+        bucket = rating_bucket(game.headers)
+        board = game.board()
+        for ply, move in enumerate(game.mainline_moves()):
+            if ply >= max_plies:
+                break
+            key = (chess.polyglot.zobrist_hash(board), speed, bucket, pack_move(move))
+            row = counts.get(key)
+            if row is None:
+                row = counts[key] = [0, 0, 0]
+            row[column] += 1
+            board.push(move)
+    return counts
+
+class LocalExplorer:
+    """
+    Opening explorer over positions counted from local PGN files.
+
+    ``get`` answers like the Lichess explorer (a dict with ``white``,
+    ``draws``, ``black`` and ``moves``), so :mod:`generate_opening` can use
+    it in place of :class:`explorer_client.ExplorerClient`. Counts live in a
+    SQLite table clustered on the position hash, so a query is one index
+    range scan; answers are also kept in an LRU of ``cache_size`` entries,
+    which repeated and transposed positions hit in about a microsecond.
+    Treat the returned dicts as read-only.
+    """
+
+    def __init__(self, path, cache_size=ANSWER_CACHE_SIZE):
+        self.path = path
+        self._answer = functools.lru_cache(maxsize=cache_size)(self._query)
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS moves ("
+            "hash INTEGER, speed TEXT, bucket INTEGER, move INTEGER, white INTEGER, draws INTEGER, black INTEGER, "
+            "PRIMARY KEY (hash, speed, bucket, move)) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS sources (path TEXT PRIMARY KEY, size INTEGER, mtime REAL)")
+        self._db.commit()
+
+    def ingested(self):
+        return {row[0] for row in self._db.execute("SELECT path FROM sources")}
+
+    def changed_sources(self):
+        """Ingested files whose size or mtime changed since they were counted; missing files are left out."""
+        changed = []
+        for path, size, mtime in self._db.execute("SELECT path, size, mtime FROM sources").fetchall():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if stat.st_size != size or stat.st_mtime != mtime:
+                changed.append(path)
+        return changed
+
+    def ingest(self, pgn_files, workers=None, max_plies=DEFAULT_MAX_PLIES):
+        """
+        Count the games of ``pgn_files`` into the index, in parallel over
+        shards of each file. Files ingested before are skipped; returns the
+        files that were added.
+
+        Counts are summed over all files, so the old games of a file that
+        changed since it was ingested cannot be taken out on their own: when
+        any has changed, the index is rebuilt from every ingested file still
+        on disk plus the new ones, and all of them are returned.
+        """
+        already = self.ingested()
+        changed = self.changed_sources()
+        if changed:
+            rebuilt = sorted(path for path in already if os.path.exists(path))
+            print(f"{len(changed)} ingested file(s) changed since they were counted "
+                  f"(e.g. {changed[0]}); rebuilding the index from {len(rebuilt)} file(s).", file=sys.stderr)
+            self._db.execute("DELETE FROM moves")
+            self._db.execute("DELETE FROM sources")
+            already = set()
+        else:
+            rebuilt = []
+        new_files = rebuilt + [os.path.abspath(path) for path in pgn_files
+                               if os.path.abspath(path) not in already and os.path.abspath(path) not in rebuilt]
+        if not new_files:
+            return []
+        workers = workers or os.cpu_count() or 1
+        tasks = [(path, start, stop) for path in new_files for start, stop in shard_pgn(path, workers * 4)]
+        with ProcessPoolExecutor(workers) as pool:
+            futures = [pool.submit(count_shard, path, start, stop, max_plies) for path, start, stop in tasks]
+            for future in futures:
+                self._merge(future.result())
+        for path in new_files:
+            stat = os.stat(path)
+            self._db.execute("INSERT INTO sources VALUES (?, ?, ?)", (path, stat.st_size, stat.st_mtime))
+        self._db.commit()
+        self._answer.cache_clear()
+        return new_files
+
+    def _merge(self, counts):
+        self._db.executemany(
+            "INSERT INTO moves VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (hash, speed, bucket, move) DO UPDATE SET "
+            "white = white + excluded.white, draws = draws + excluded.draws, black = black + excluded.black",
+            ((_signed(key[0]), key[1], key[2], key[3], *row) for key, row in counts.items()),
+        )
+
+    def get(self, fen, speeds=",".join(SPEEDS), ratings=",".join(map(str, RATING_BUCKETS))):
+        """Return explorer-shaped statistics for ``fen``, filtered by comma-separated speeds and ratings."""
+        return self._answer(position_key(fen), speeds, ratings)
+
+    def _query(self, fen, speeds, ratings):
+        board = chess.Board(fen)
+        speed_list = [speed for speed in speeds.split(",") if speed]
+        bucket_list = [int(rating) for rating in ratings.split(",") if rating]
+        rows = self._db.execute(
+            f"SELECT move, SUM(white), SUM(draws), SUM(black) FROM moves WHERE hash = ? "
+            f"AND speed IN ({','.join('?' * len(speed_list))}) AND bucket IN ({','.join('?' * len(bucket_list))}) "
+            f"GROUP BY move",
+            (_signed(chess.polyglot.zobrist_hash(board)), *speed_list, *bucket_list),
+        ).fetchall()
+
+        moves = []
+        for code, white, draws, black in rows:
+            move = unpack_move(code)
+            if not board.is_legal(move):
+                continue  # A hash collision with another position.
+            moves.append({"uci": move.uci(), "san": board.san(move), "white": white, "draws": draws, "black": black})
+        moves.sort(key=lambda m: m["white"] + m["draws"] + m["black"], reverse=True)
+        return {
+            "white": sum(m["white"] for m in moves),
+            "draws": sum(m["draws"] for m in moves),
+            "black": sum(m["black"] for m in moves),
+            "moves": moves,
+            "topGames": [],
+            "opening": None,
+        }
+
+    def get_many(self, fens, speeds=",".join(SPEEDS), ratings=",".join(map(str, RATING_BUCKETS))):
+        return [self.get(fen, speeds, ratings) for fen in fens]
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query an opening explorer from local PGN files.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    ingest = subparsers.add_parser("ingest", help="count the positions of PGN files or directories")
+    ingest.add_argument("database", help="SQLite explorer file")
+    ingest.add_argument("paths", nargs="+", help="PGN files or directories")
+    ingest.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    ingest.add_argument("--max-plies", type=int, default=DEFAULT_MAX_PLIES, help="plies counted per game")
+    query = subparsers.add_parser("query", help="print the explorer JSON of a position")
+    query.add_argument("database", help="SQLite explorer file")
+    query.add_argument("--fen", default=chess.STARTING_FEN)
+    query.add_argument("--speeds", default=",".join(SPEEDS))
+    query.add_argument("--ratings", default=",".join(map(str, RATING_BUCKETS)))
+    args = parser.parse_args()
+
+    with LocalExplorer(args.database) as explorer:
+        if args.command == "ingest":
+            added = explorer.ingest(collect_pgn_files(args.paths), args.workers, args.max_plies)
+            print(f"Ingested {len(added)} file(s).")
+        else:
+            print(json.dumps(explorer.get(args.fen, args.speeds, args.ratings), indent=2))
+
+if __name__ == "__main__":
+    main()
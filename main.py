@@ -1,12 +1,16 @@
 from pgn_utils import load_pgn
 from eco_utils import load_eco_database
-from stockfish_utils import connect_stockfish, disconnect_stockfish
-from basic_analysis import analyze_game
-from fork_analysis import analyze_forks
-from check_analysis import analyze_checks
-from en_passant import count_en_passant_moves
-from threat_analysis import analyze_game_material_threats
-from zugzwang_analysis import find_zugzwang_positions
+from stockfish_utils import connect_engine_pool, disconnect_stockfish
+from eval_cache import EvalCache, CachedEngine
+from result_store import ResultStore, analyze_incremental, engine_settings, game_hash
+from eval_timeline import search_settings
+from basic_analysis import BasicAnalyzer
+from fork_analysis import ForkAnalyzer
+from check_analysis import CheckAnalyzer
+from en_passant import EnPassantAnalyzer
+from threat_analysis import ThreatAnalyzer
+from zugzwang_analysis import ZUGZWANG_VERSION, find_zugzwang_in_game
+from result_sinks import JsonlSink
 def main():
     pgn_file = "PgnFiles/Zugzwang/Friedrich S&auml;emisch  _vs_Aron Nimzowitsch_1923.__.__.pgn"
     stockfish_path = "stockfish.exe"
@@ -16,25 +20,37 @@ def main():
     eco_database = load_eco_database(eco_directory)
 
     # PGN dosyasını yükle
-    game = load_pgn(pgn_file)
+    game = load_pgn(pgn_file, mainline_only=True)
 
-    # Stockfish'e bağlan
-    engine = connect_stockfish(stockfish_path)
+    # Stockfish havuzunu başlat (tüm analizler aynı motorları paylaşır)
+    engine_options = {"Hash": 128, "Threads": 1}
+    engine = connect_engine_pool(stockfish_path, size=2, options=engine_options)
+    # Daha önce değerlendirilen pozisyonlar önbellekten gelir
+    engine = CachedEngine(engine, EvalCache("eval_cache.sqlite"), engine_options)
 
-    # Maçı analiz et
-    results = analyze_game(game, engine, eco_database)
-    # fork_results = analyze_forks(game)
-    # results.update(fork_results)
-    check_results = analyze_checks(game)
-    results.update(check_results )
-    en_passant_stats = count_en_passant_moves(game)
-    results.update(en_passant_stats)
-    # threats = analyze_game_material_threats(game,stockfish_path)
-    # results.update(threats)
-    zugzwangs = find_zugzwang_positions(pgn_file,stockfish_path)
+    # Maçı tek geçişte analiz et
+    analyzers = [
+        BasicAnalyzer(engine, eco_database),
+        ForkAnalyzer(),
+        CheckAnalyzer(),
+        EnPassantAnalyzer(),
+        ThreatAnalyzer(),
+    ]
+    # Kayıtlı sonuçlar tekrar kullanılır, sadece eksik analizler hesaplanır
+    store = ResultStore("results.sqlite")
+    settings = engine_settings(engine, engine_options, search_settings())
+    results = analyze_incremental(game, analyzers, store, settings)
+    # Hızlı mod bu oyundaki zugzwang'ı kaçırıyor, bu yüzden tam arama yapılır
+    zugzwangs = store.get_or_compute(game_hash(game), "zugzwang-exact", ZUGZWANG_VERSION, settings,
+                                     lambda: {"zugzwang_moments": find_zugzwang_in_game(game, engine, "exact")})
     results.update(zugzwangs)
+    store.close()
     print(results)
 
+    # Düz kayıt olarak da yaz (hamleler UCI metni olur), önceki çalıştırmaların kayıtları korunur
+    with JsonlSink("results.jsonl", append=True) as sink:
+        sink(pgn_file, results)
+
     # Stockfish bağlantısını kapat
     disconnect_stockfish(engine)
 
@@ -0,0 +1,183 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+
+import chess
+import chess.pgn
+
+from pgn_utils import collect_pgn_files, iter_games
+from eco_cache import pack_move, unpack_move
+
+STORE_SUFFIX = ".pgnpack"
+_MAGIC = b"PGNPACK1"
+# magic, codec, game count, offset of the game offset table
+_HEADER = struct.Struct("<8sBxxxIQ")
+# header bytes, move count
+_GAME_HEADER = struct.Struct("<IH")
+NULL_INDEX = 255
+
+CODECS = ("packed16", "index")
+
+def _ordered_legal_codes(board):
+    # Sorted by packed code, so the order does not depend on move generation.
+    return sorted(pack_move(move) for move in board.legal_moves)
+
+def encode_moves(board, moves, codec="packed16"):
+    """
+    Encode ``moves`` played from ``board`` (which is left unchanged).
+
+    ``packed16`` stores :func:`eco_cache.pack_move` codes in two bytes and
+    decodes without move generation. ``index`` stores one byte per move,
+    its position among the legal moves ordered by packed code (255 for a
+    null move), and has to generate the legal moves of every ply to decode.
+    """
+    if codec == "packed16":
+        return struct.pack(f"<{len(moves)}H", *(pack_move(move) for move in moves))
+    board = board.copy(stack=False)
+    encoded = bytearray()
+    for move in moves:
+        if not move:
+            encoded.append(NULL_INDEX)
+        else:
+            encoded.append(_ordered_legal_codes(board).index(pack_move(move)))
+        board.push(move)
+    return bytes(encoded)
+
+def decode_moves(board, data, codec="packed16"):
+    """Yield the moves of ``data`` played from ``board``; the index codec pushes them on ``board``."""
+    if codec == "packed16":
+        for code in struct.unpack(f"<{len(data) // 2}H", data):
+            yield unpack_move(code)
+        return
+    for index in data:
+        move = chess.Move.null() if index == NULL_INDEX else unpack_move(_ordered_legal_codes(board)[index])
+        board.push(move)
+        yield move
+
+class PackedGame:
+    """
+    A stored game with the parts of ``chess.pgn.Game`` the analyzers use:
+    ``headers``, ``board()`` and ``mainline_moves()``.
+    """
+
+    def __init__(self, headers, data, codec):
+        self.headers = headers
+        self._data = data
+        self._codec = codec
+        self._moves = None
+
+    def board(self):
+        return self.headers.board()
+
+    def mainline_moves(self):
+        if self._moves is None:
+            self._moves = list(decode_moves(self.board(), self._data, self._codec))
+        return self._moves
+
+    def to_pgn_game(self):
+        game = chess.pgn.Game(self.headers)
+        game.add_line(self.mainline_moves())
+        return game
+
+def write_store(store_path, games, codec="packed16"):
+    """
+    Write ``games`` (``chess.pgn.Game``, ``MainlineGame`` or ``PackedGame``) to a
+    packed store, atomically. Only headers and the mainline are kept.
+    Returns the number of games written.
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec {codec!r}, expected one of {CODECS}.")
+    temp_path = f"{store_path}.{os.getpid()}.tmp"
+    offsets = []
+    with open(temp_path, "wb") as store_file:
+        store_file.write(_HEADER.pack(_MAGIC, CODECS.index(codec), 0, 0))
+        for game in games:
+            moves = list(game.mainline_moves())
+            headers = json.dumps(list(game.headers.items())).encode("utf-8")
+            offsets.append(store_file.tell())
+            store_file.write(_GAME_HEADER.pack(len(headers), len(moves)))
+            store_file.write(headers)
+            store_file.write(encode_moves(game.board(), moves, codec))
+        table_offset = store_file.tell()
+        store_file.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        store_file.seek(0)
+        store_file.write(_HEADER.pack(_MAGIC, CODECS.index(codec), len(offsets), table_offset))
+    os.replace(temp_path, store_path)
+    return len(offsets)
+
+class MoveStore:
+    """
+    Read-only, memory-mapped packed game store with random access by game
+    number. Replaying a stored game needs no PGN or SAN parsing.
+    """
+
+    def __init__(self, store_path):
+        self.path = store_path
+        with open(store_path, "rb") as store_file:
+            self._mmap = mmap.mmap(store_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, codec, count, table_offset = _HEADER.unpack_from(self._mmap)
+        if magic != _MAGIC:
+            raise ValueError(f"{store_path} is not a packed game store.")
+        self.codec = CODECS[codec]
+        self._offsets = memoryview(self._mmap)[table_offset:table_offset + 8 * count].cast("Q")
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __getitem__(self, game_number):
+        offset = self._offsets[game_number]
+        header_length, move_count = _GAME_HEADER.unpack_from(self._mmap, offset)
+        start = offset + _GAME_HEADER.size
+        headers = chess.pgn.Headers(json.loads(self._mmap[start:start + header_length]))
+        start += header_length
+        data = self._mmap[start:start + move_count * (2 if self.codec == "packed16" else 1)]
+        return PackedGame(headers, data, self.codec)
+
+    def iter_games(self, start=0, stop=None):
+        for game_number in range(start, len(self) if stop is None else min(stop, len(self))):
+            yield self[game_number]
+
+    def close(self):
+        self._offsets.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def pgn_to_store(pgn_paths, store_path, codec="packed16"):
+    """Pack every game of the given PGN files or directories into one store."""
+    games = (game for path in collect_pgn_files(pgn_paths) for game in iter_games(path, mainline_only=True))
+    return write_store(store_path, games, codec)
+
+def store_to_pgn(store_path, pgn_path):
+    """Write the games of a store back out as PGN text."""
+    with MoveStore(store_path) as store, open(pgn_path, "w", encoding="utf-8") as pgn_file:
+        for game in store.iter_games():
+            print(game.to_pgn_game(), file=pgn_file, end="\n\n")
+        return len(store)
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert between PGN files and packed game stores.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    pack = subparsers.add_parser("pack", help="pack PGN files or directories into a store")
+    pack.add_argument("store", help=f"output store ({STORE_SUFFIX})")
+    pack.add_argument("paths", nargs="+", help="PGN files or directories")
+    pack.add_argument("--codec", choices=CODECS, default="packed16",
+                      help="packed16 replays without move generation, index halves the move bytes")
+    unpack = subparsers.add_parser("unpack", help="write a store back out as PGN")
+    unpack.add_argument("store", help="input store")
+    unpack.add_argument("pgn", help="output PGN file")
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        print(f"Packed {pgn_to_store(args.paths, args.store, args.codec)} game(s).")
+    else:
+        print(f"Wrote {store_to_pgn(args.store, args.pgn)} game(s).")
+
+if __name__ == "__main__":
+    main()
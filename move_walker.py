@@ -0,0 +1,132 @@
+import chess
+import chess.polyglot
+
+class PlyContext:
+    """
+    State of the ply being replayed, shared by every analyzer.
+
+    ``checkers``, ``legal_moves`` and ``position_hash`` describe the current
+    board and are computed at most once per board state: in ``before_push``
+    hooks they refer to the position before the move, in ``after_push``
+    hooks to the position after it (which is also the next ply's position
+    before its move, so the values carry over).
+    """
+
+    __slots__ = ("board", "move", "ply", "mover", "_checkers", "_legal_moves", "_position_hash")
+
+    def __init__(self, board):
+        self.board = board
+        self.move = None
+        self.ply = 0
+        self.mover = board.turn
+        self._reset()
+
+    def _reset(self):
+        self._checkers = None
+        self._legal_moves = None
+        self._position_hash = None
+
+    @property
+    def checkers(self):
+        if self._checkers is None:
+            self._checkers = self.board.checkers()
+        return self._checkers
+
+    @property
+    def legal_moves(self):
+        if self._legal_moves is None:
+            self._legal_moves = list(self.board.legal_moves)
+        return self._legal_moves
+
+    @property
+    def position_hash(self):
+        if self._position_hash is None:
+            self._position_hash = chess.polyglot.zobrist_hash(self.board)
+        return self._position_hash
+
+class Analyzer:
+    """
+    Base class for analyzers driven by :func:`walk_game`.
+
+    Subclasses override only the hooks they need; hooks left as the base
+    implementation are not called at all. ``version`` is part of the key of
+    stored results (see :mod:`result_store`): bump it when the analyzer's
+    output changes. Analyzers whose output depends on the engine set
+    ``uses_engine``. Analyzers reading a shared eval timeline have a
+    ``timeline`` attribute and set ``timeline_multipv`` to the MultiPV lines
+    they need, or leave it 0 when they only reuse a timeline built for others
+    (see :func:`eval_timeline.share_eval_timeline`). Analyzers whose output
+    also depends on data other than the game and the engine, such as the ECO
+    database, set ``data_key`` to a string identifying that data; it joins
+    the key of stored results too.
+    """
+
+    name = None
+    version = 1
+    uses_engine = False
+    timeline_multipv = 0
+    data_key = ""
+
+    def start(self, game, board):
+        """Called once with the starting position before the first move."""
+
+    def before_push(self, ctx):
+        """Called with ``ctx.board`` in the position before ``ctx.move``."""
+
+    def after_push(self, ctx):
+        """Called with ``ctx.board`` in the position after ``ctx.move``."""
+
+    def finish(self, game, board):
+        """Called with the final position; returns the analyzer's result dict."""
+        return {}
+
+def _overridden(analyzers, hook, instrumentation=None):
+    base = getattr(Analyzer, hook)
+    if instrumentation is None:
+        return [getattr(a, hook) for a in analyzers if getattr(type(a), hook) is not base]
+    return [instrumentation.timed(a, getattr(a, hook)) for a in analyzers if getattr(type(a), hook) is not base]
+
+def walk_game(game, analyzers, instrumentation=None):
+    """
+    Replay the mainline of ``game`` once, driving every analyzer's hooks, and
+    return their result dicts merged in analyzer order. With an
+    :class:`instrumentation.Instrumentation` (inside its ``game`` context),
+    every hook call is timed and charged to its analyzer.
+    """
+    results = {}
+    for analyzer_results in walk_game_results(game, analyzers, instrumentation):
+        results.update(analyzer_results)
+    return results
+
+def walk_game_results(game, analyzers, instrumentation=None):
+    """Like :func:`walk_game`, but return one result dict per analyzer."""
+    board = game.board()
+    for analyzer in analyzers:
+        if instrumentation is None:
+            analyzer.start(game, board)
+        else:
+            instrumentation.timed(analyzer, analyzer.start)(game, board)
+
+    before_hooks = _overridden(analyzers, "before_push", instrumentation)
+    after_hooks = _overridden(analyzers, "after_push", instrumentation)
+    ctx = PlyContext(board)
+
+    for move in game.mainline_moves():
+        ctx.ply += 1
+        ctx.move = move
+        ctx.mover = board.turn
+        for hook in before_hooks:
+            hook(ctx)
+        board.push(move)
+        ctx._reset()
+        for hook in after_hooks:
+            hook(ctx)
+
+    results = []
+    for analyzer in analyzers:
+        if instrumentation is None:
+            results.append(analyzer.finish(game, board))
+        else:
+            instrumentation.add_plies(analyzer, ctx.ply)
+            results.append(instrumentation.timed(analyzer, analyzer.finish)(game, board))
+    return results
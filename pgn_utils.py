@@ -1,8 +1,248 @@
+import json
+import logging
+import os
+
 import chess.pgn
 
-def load_pgn(pgn_file_path):
-    with open(pgn_file_path, "r") as pgn_file:
-        game = chess.pgn.read_game(pgn_file)
+INDEX_SUFFIX = ".idx.json"
+INDEX_VERSION = 1
+SUMMARY_HEADERS = ("Event", "Date", "White", "Black", "Result")
+LOGGER = logging.getLogger("chess.pgn")
+
+def open_pgn(pgn_file_path):
+    """Open a PGN file so that ``tell()``/``seek()`` positions are byte offsets at game boundaries."""
+    return open(pgn_file_path, "r", encoding="utf-8-sig", errors="replace")
+
+class MainlineGame:
+    """
+    A game reduced to its headers and mainline, with the parts of
+    ``chess.pgn.Game`` the analyzers use: ``headers``, ``board()`` and
+    ``mainline_moves()``. ``errors`` lists the parse errors, as on ``Game``.
+    """
+
+    __slots__ = ("headers", "moves", "errors")
+
+    def __init__(self, headers, moves, errors):
+        self.headers = headers
+        self.moves = moves
+        self.errors = errors
+
+    def board(self):
+        return self.headers.board()
+
+    def mainline_moves(self):
+        return self.moves
+
+    def to_pgn_game(self):
+        game = chess.pgn.Game(self.headers)
+        game.add_line(self.moves)
+        return game
+
+class MainlineVisitor(chess.pgn.BaseVisitor):
+    """
+    Build a :class:`MainlineGame` instead of a ``GameNode`` tree: variations
+    are skipped without parsing their moves, and comments and NAGs are
+    dropped.
+    """
+
+    def begin_game(self):
+        self.headers = chess.pgn.Headers()
+        self.moves = []
+        self.errors = []
+
+    def visit_header(self, tagname, tagvalue):
+        self.headers[tagname] = tagvalue
+
+    def begin_variation(self):
+        return chess.pgn.SKIP
+
+    def visit_move(self, board, move):
+        self.moves.append(move)
+
+    def handle_error(self, error):
+        LOGGER.error("%s while parsing %r", error, self.headers)
+        self.errors.append(error)
+
+    def result(self):
+        return MainlineGame(self.headers, self.moves, self.errors)
+
+def _visitor(mainline_only):
+    return MainlineVisitor if mainline_only else chess.pgn.GameBuilder
+
+def load_pgn(pgn_file_path, game_number=0, mainline_only=False):
+    """
+    Load one game, by default the first. Later games are reached through the
+    offset index. With ``mainline_only`` a lighter :class:`MainlineGame` is
+    returned.
+    """
+    if game_number:
+        game = read_game_at(pgn_file_path, load_pgn_index(pgn_file_path)[game_number]["offset"], mainline_only)
+    else:
+        with open_pgn(pgn_file_path) as pgn_file:
+            game = chess.pgn.read_game(pgn_file, Visitor=_visitor(mainline_only))
     if not game:
         raise ValueError("No valid game found in the PGN file.")
     return game
+
+def read_game_at(pgn_file_path, offset, mainline_only=False):
+    """Read the game starting at a byte offset taken from the index."""
+    with open_pgn(pgn_file_path) as pgn_file:
+        pgn_file.seek(offset)
+        return chess.pgn.read_game(pgn_file, Visitor=_visitor(mainline_only))
+
+def iter_games(pgn_file_path, start=0, stop=None, mainline_only=False):
+    """
+    Yield the games of a PGN file one at a time.
+
+    Only one game is held in memory. ``start`` and ``stop`` are game numbers;
+    a non-zero ``start`` seeks through the offset index instead of reading
+    the preceding games, so interrupted runs can resume where they stopped.
+    ``mainline_only`` yields :class:`MainlineGame` objects, which are cheaper
+    to build and hold than full games.
+    """
+    if stop is not None and stop <= start:
+        return
+    with open_pgn(pgn_file_path) as pgn_file:
+        if start:
+            index = load_pgn_index(pgn_file_path)
+            if start >= len(index):
+                return
+            pgn_file.seek(index[start]["offset"])
+        game_number = start
+        while stop is None or game_number < stop:
+            game = chess.pgn.read_game(pgn_file, Visitor=_visitor(mainline_only))
+            if game is None:
+                break
+            yield game
+            game_number += 1
+
+class SummaryVisitor(chess.pgn.BaseVisitor):
+    """
+    Collect a game's headers and count its mainline plies without parsing
+    SAN: every move token becomes a null move, which keeps the reader's
+    variation tracking working, and variations are skipped.
+    """
+
+    def begin_game(self):
+        self.headers = chess.pgn.Headers()
+        self.ply_count = 0
+
+    def visit_header(self, tagname, tagvalue):
+        self.headers[tagname] = tagvalue
+
+    def begin_variation(self):
+        return chess.pgn.SKIP
+
+    def parse_san(self, board, san):
+        return chess.Move.null()
+
+    def visit_move(self, board, move):
+        self.ply_count += 1
+
+    def result(self):
+        return self.headers, self.ply_count
+
+def scan_game_summaries(pgn_file_path):
+    """
+    Yield ``(offset, headers, ply_count)`` for every game of a PGN file.
+    Only headers and move tokens are read, which is far cheaper than
+    ``read_game``.
+    """
+    with open_pgn(pgn_file_path) as pgn_file:
+        while True:
+            offset = pgn_file.tell()
+            summary = chess.pgn.read_game(pgn_file, Visitor=SummaryVisitor)
+            if summary is None:
+                break
+            headers, ply_count = summary
+            yield offset, headers, ply_count
+
+def _index_path(pgn_file_path):
+    return pgn_file_path + INDEX_SUFFIX
+
+def _source_stamp(pgn_file_path):
+    stat = os.stat(pgn_file_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def build_pgn_index(pgn_file_path):
+    """
+    Scan a PGN file once and record, for every game, its byte offset and a
+    summary of its headers. Move text is skipped, not parsed.
+    """
+    entries = []
+    with open_pgn(pgn_file_path) as pgn_file:
+        while True:
+            offset = pgn_file.tell()
+            headers = chess.pgn.read_headers(pgn_file)
+            if headers is None:
+                break
+            entry = {"offset": offset}
+            for name in SUMMARY_HEADERS:
+                entry[name] = headers.get(name, "?")
+            entries.append(entry)
+    return entries
+
+def load_pgn_index(pgn_file_path, rebuild=False):
+    """
+    Return the offset index of a PGN file.
+
+    The index is persisted next to the file as ``<file>.idx.json`` and reused
+    until the file's size or mtime changes.
+    """
+    index_path = _index_path(pgn_file_path)
+    stamp = _source_stamp(pgn_file_path)
+    if not rebuild:
+        try:
+            with open(index_path, "r", encoding="utf-8") as index_file:
+                cached = json.load(index_file)
+            if cached.get("version") == INDEX_VERSION and cached.get("source") == stamp:
+                return cached["games"]
+        except (OSError, ValueError):
+            pass
+
+    entries = build_pgn_index(pgn_file_path)
+    try:
+        temp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as index_file:
+            json.dump({"version": INDEX_VERSION, "source": stamp, "games": entries}, index_file)
+        os.replace(temp_path, index_path)
+    except OSError as e:
+        print(f"Could not write PGN index {index_path}: {e}")
+    return entries
+
+def shard_pgn(pgn_file_path, shard_count):
+    """
+    Split a PGN file into at most ``shard_count`` contiguous ``(start, stop)``
+    game ranges of roughly equal size in bytes.
+    """
+    index = load_pgn_index(pgn_file_path)
+    if not index:
+        return []
+    total_size = _source_stamp(pgn_file_path)["size"]
+    shards = []
+    start = 0
+    for shard in range(1, shard_count):
+        boundary = total_size * shard // shard_count
+        stop = start
+        while stop < len(index) and index[stop]["offset"] < boundary:
+            stop += 1
+        if stop > start:
+            shards.append((start, stop))
+            start = stop
+    if start < len(index):
+        shards.append((start, len(index)))
+    return shards
+
+def collect_pgn_files(paths, suffixes=(".pgn",)):
+    """
+    Expand directories into the files they contain ending in one of
+    ``suffixes`` (PGN files by default), recursively and sorted.
+    """
+    pgn_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, filenames in os.walk(path):
+                pgn_files.extend(os.path.join(root, f) for f in filenames if f.lower().endswith(suffixes))
+        else:
+            pgn_files.append(path)
+    return sorted(pgn_files)
@@ -1,2 +1,125 @@
 import chess
-import chess.pgn
\ No newline at end of file
+import chess.pgn
+
+from move_walker import Analyzer, walk_game
+from fork_analysis import PIECE_VALUES, is_protected
+
+ABSOLUTE_PIN = "absolute pin"
+RELATIVE_PIN = "relative pin"
+SKEWER = "skewer"
+XRAY = "x-ray"
+KINDS = (ABSOLUTE_PIN, RELATIVE_PIN, SKEWER, XRAY)
+
+# Squares strictly between two squares (0 unless they share a line), and the
+# empty-board lines of rooks and bishops through each square.
+BB_BETWEEN = [[chess.between(a, b) for b in chess.SQUARES] for a in chess.SQUARES]
+BB_STRAIGHT_LINES = [chess.BB_RANK_ATTACKS[square][0] | chess.BB_FILE_ATTACKS[square][0] for square in chess.SQUARES]
+BB_DIAGONAL_LINES = [chess.BB_DIAG_ATTACKS[square][0] for square in chess.SQUARES]
+
+def line_tactics(board, color):
+    """
+    Pins, skewers and x-rays of the sliders of ``color`` on ``board``, as
+    ``(kind, sniper, front, back)`` square tuples.
+
+    The back piece is an enemy piece other than a pawn with exactly one piece
+    between it and a rook, bishop or queen on a line that slider moves along.
+    With an enemy piece in front this is an absolute pin (the back piece is
+    the king), a skewer (the front piece is the king or worth more) or a
+    relative pin (worth less); with a piece of ``color`` in front it is an
+    x-ray. Everything is read from the line and between tables, so no piece
+    is checked with ``is_pinned``.
+    """
+    own = board.occupied_co[color]
+    straight = own & (board.rooks | board.queens)
+    diagonal = own & (board.bishops | board.queens)
+    if not straight | diagonal:
+        return []
+    occupied = board.occupied
+    found = []
+    for back in chess.scan_forward(board.occupied_co[not color] & ~board.pawns):
+        snipers = straight & BB_STRAIGHT_LINES[back] | diagonal & BB_DIAGONAL_LINES[back]
+        for sniper in chess.scan_forward(snipers):
+            blockers = BB_BETWEEN[sniper][back] & occupied
+            if not blockers or blockers & (blockers - 1):
+                continue
+            front = chess.lsb(blockers)
+            if blockers & own:
+                if blockers & board.kings:
+                    continue
+                kind = XRAY
+            elif blockers & board.kings:
+                kind = SKEWER
+            elif board.kings & chess.BB_SQUARES[back]:
+                kind = ABSOLUTE_PIN
+            else:
+                front_value = PIECE_VALUES[board.piece_type_at(front)]
+                back_value = PIECE_VALUES[board.piece_type_at(back)]
+                if front_value == back_value:
+                    continue
+                kind = SKEWER if front_value > back_value else RELATIVE_PIN
+            found.append((kind, sniper, front, back))
+    return found
+
+def describe_line_tactic(board, color, tactic):
+    """The detail dict of a :func:`line_tactics` tuple, in the style of the fork details."""
+    kind, sniper, front, back = tactic
+    front_piece = board.piece_at(front)
+    back_piece = board.piece_at(back)
+    return {
+        "type": kind,
+        "attacker": board.piece_at(sniper).symbol(),
+        "attacker_square": chess.square_name(sniper),
+        "front": {
+            "piece": front_piece.symbol(),
+            "position": chess.square_name(front),
+            "value": PIECE_VALUES[front_piece.piece_type],
+        },
+        "back": {
+            "piece": back_piece.symbol(),
+            "position": chess.square_name(back),
+            "value": PIECE_VALUES[back_piece.piece_type],
+            "protected": is_protected(board, back, color),
+        },
+    }
+
+class PinAnalyzer(Analyzer):
+    """
+    Detect pins, skewers and x-ray attacks as they appear. After every ply
+    the line tactics of both sides are compared with those of the previous
+    position, and the new ones are credited to the side owning the slider,
+    so a pin that holds for many moves is counted once.
+    """
+
+    name = "pins"
+
+    def start(self, game, board):
+        self.counts = {color: dict.fromkeys(KINDS, 0) for color in chess.COLORS}
+        self.details = {color: [] for color in chess.COLORS}
+        self.previous = {color: set(line_tactics(board, color)) for color in chess.COLORS}
+
+    def after_push(self, ctx):
+        board = ctx.board
+        for color in chess.COLORS:
+            tactics = line_tactics(board, color)
+            previous = self.previous[color]
+            for tactic in tactics:
+                if tactic not in previous:
+                    self.counts[color][tactic[0]] += 1
+                    self.details[color].append(describe_line_tactic(board, color, tactic))
+            self.previous[color] = set(tactics)
+
+    def finish(self, game, board):
+        results = {}
+        for color, side in ((chess.WHITE, "White"), (chess.BLACK, "Black")):
+            counts = self.counts[color]
+            results[f"{side} absolute pin count"] = counts[ABSOLUTE_PIN]
+            results[f"{side} relative pin count"] = counts[RELATIVE_PIN]
+            results[f"{side} skewer count"] = counts[SKEWER]
+            results[f"{side} x-ray count"] = counts[XRAY]
+            results[f"{side} pin details"] = self.details[color]
+        return results
+
+
+def analyze_pins(game):
+    """Analyze a chess game for pins, skewers and x-ray attacks; the details include all four kinds."""
+    return walk_game(game, [PinAnalyzer()])
@@ -0,0 +1,269 @@
+import argparse
+import asyncio
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from pgn_utils import collect_pgn_files
+from eco_utils import load_eco_database
+from eval_cache import EvalCache, CachedEngine
+from eval_timeline import TimeBudget, share_eval_timeline
+from stockfish_utils import connect_engine_pool
+from move_walker import walk_game
+from batch import ANALYZERS, ENGINE_ANALYZERS, SOURCE_SUFFIXES, iter_source
+from result_sinks import open_sink
+
+# Engine analyzers run on threads sharing one engine pool; those of a game
+# share one eval timeline. Board analyzers run on worker processes.
+ENGINE_TASKS = tuple(name for name in ANALYZERS if name in ENGINE_ANALYZERS)
+BOARD_ANALYZERS = tuple(name for name in ANALYZERS if name not in ENGINE_ANALYZERS)
+DEFAULT_QUEUE_SIZE = 64
+
+# Board analyzers of a CPU worker process, set up once by _init_cpu_worker.
+_cpu_worker = {}
+
+def _init_cpu_worker(analyzer_names):
+    _cpu_worker["analyzers"] = [ANALYZERS[name](None, None) for name in analyzer_names]
+
+def _analyze_board(game):
+    return walk_game(game, _cpu_worker["analyzers"])
+
+def _no_results(game):
+    return {}
+
+class StageCounter:
+    """Games through one pipeline stage: finished, failed and currently in progress."""
+
+    def __init__(self, name, queue=None):
+        self.name = name
+        self.queue = queue
+        self.done = 0
+        self.errors = 0
+        self.busy = 0
+        self.started = time.monotonic()
+
+    def rate(self):
+        return self.done / max(time.monotonic() - self.started, 1e-9)
+
+    def stats(self):
+        stats = {"done": self.done, "errors": self.errors, "busy": self.busy, "per_s": round(self.rate(), 2)}
+        if self.queue is not None:
+            stats["queued"] = self.queue.qsize()
+        return stats
+
+    def __str__(self):
+        queued = f", {self.queue.qsize()}/{self.queue.maxsize} queued" if self.queue is not None else ""
+        return f"{self.name} {self.done} ({self.rate():.1f}/s, {self.busy} busy{queued})"
+
+class Pipeline:
+    """
+    Read games, run the board analyzers, run the engine analyses and hand
+    the merged results to a sink, as concurrent asyncio stages.
+
+    Stages are joined by queues of ``queue_size`` games, so a slow stage
+    holds up the ones before it and memory stays flat however large the
+    input is. Board analyzers run on ``cpu_workers`` processes; engine
+    analyses run on ``engine_threads`` threads sharing ``engine``, enough to
+    keep every engine of a pool searching while the processes replay other
+    games. The engine analyzers of a game share one eval timeline, spread
+    over ``time_budget`` engine seconds per game when given. The budget is
+    per game and per engine thread: up to ``engine_threads`` games search at
+    once, each against its own budget.
+    ``sink(game_id, results, error)`` is called on the event loop in
+    completion order; an exception it raises stops the pipeline and is
+    raised by :meth:`run`.
+    """
+
+    def __init__(self, analyzer_names, engine=None, eco_database=None, cpu_workers=1, engine_threads=4,
+                 queue_size=DEFAULT_QUEUE_SIZE, sink=None, time_budget=None):
+        self.board_analyzers = [name for name in analyzer_names if name in BOARD_ANALYZERS]
+        self.engine_tasks = [name for name in analyzer_names if name in ENGINE_TASKS]
+        if self.engine_tasks and engine is None:
+            raise ValueError(f"An engine is needed by {', '.join(self.engine_tasks)}.")
+        self.engine = engine
+        self.eco_database = eco_database
+        self.time_budget = time_budget
+        self.cpu_workers = cpu_workers
+        self.engine_threads = engine_threads if self.engine_tasks else 1
+        self.sink = sink or (lambda game_id, results, error: print(f"{game_id}\t{error if error else results}"))
+        self.parsed = asyncio.Queue(queue_size)
+        self.analyzed = asyncio.Queue(queue_size)
+        self.finished = asyncio.Queue(queue_size)
+        self.counters = {
+            "read": StageCounter("read", self.parsed),
+            "cpu": StageCounter("cpu", self.analyzed),
+            "engine": StageCounter("engine", self.finished),
+            "sink": StageCounter("sink"),
+        }
+
+    def stats(self):
+        return {name: counter.stats() for name, counter in self.counters.items()}
+
+    async def _read(self, pgn_files, executor):
+        loop = asyncio.get_running_loop()
+        counter = self.counters["read"]
+        for path in pgn_files:
+            games = iter_source(path)
+            game_number = 0
+            while True:
+                counter.busy = 1
+                try:
+                    game = await loop.run_in_executor(executor, next, games, None)
+                except Exception as e:
+                    # The rest of a file that fails to parse is skipped.
+                    counter.errors += 1
+                    await self.finished.put((f"{path}#{game_number}", None, f"{type(e).__name__}: {e}"))
+                    break
+                finally:
+                    counter.busy = 0
+                if game is None:
+                    break
+                counter.done += 1
+                await self.parsed.put((f"{path}#{game_number}", game, {}))
+                game_number += 1
+
+    async def _work(self, stage, inbox, outbox, run, executor):
+        loop = asyncio.get_running_loop()
+        counter = self.counters[stage]
+        while True:
+            item = await inbox.get()
+            if item is None:
+                return
+            game_id, game, results = item
+            if game is None:  # Already failed upstream.
+                await outbox.put(item)
+                continue
+            counter.busy += 1
+            try:
+                results.update(await loop.run_in_executor(executor, run, game))
+            except Exception as e:
+                counter.errors += 1
+                await outbox.put((game_id, None, f"{type(e).__name__}: {e}"))
+                continue
+            finally:
+                counter.busy -= 1
+            counter.done += 1
+            await outbox.put((game_id, game, results))
+
+    def _run_engine_tasks(self, game):
+        # Fresh analyzers per game: several threads run them at once.
+        analyzers = [ANALYZERS[name](self.engine, self.eco_database) for name in self.engine_tasks]
+        budget = TimeBudget(self.time_budget) if self.time_budget else None
+        share_eval_timeline(game, self.engine, analyzers, budget)
+        return walk_game(game, analyzers)
+
+    async def _sink(self):
+        counter = self.counters["sink"]
+        while True:
+            item = await self.finished.get()
+            if item is None:
+                return
+            game_id, game, results = item
+            try:
+                if game is None:
+                    self.sink(game_id, None, results)
+                else:
+                    self.sink(game_id, results, None)
+            except Exception:
+                # A failing sink (a full disk, a closed file) fails the run; see run().
+                counter.errors += 1
+                raise
+            counter.done += 1
+
+    async def _monitor(self, interval, stream):
+        while True:
+            await asyncio.sleep(interval)
+            stream.write("\r" + " | ".join(map(str, self.counters.values())))
+            stream.flush()
+
+    async def _feed(self, pgn_files, reader_executor, cpu_workers, engine_workers, sink):
+        # Read everything, then shut the stages down in order once their queues drain.
+        await self._read(pgn_files, reader_executor)
+        for stage_workers, queue in ((cpu_workers, self.parsed), (engine_workers, self.analyzed),
+                                     ([sink], self.finished)):
+            for _ in stage_workers:
+                await queue.put(None)
+            await asyncio.gather(*stage_workers)
+
+    async def run(self, pgn_files, progress_interval=None, stream=sys.stderr):
+        """Process every game of ``pgn_files`` (PGN files or packed stores); returns :meth:`stats`."""
+        for counter in self.counters.values():
+            counter.started = time.monotonic()
+        cpu_run = _analyze_board if self.board_analyzers else _no_results
+        engine_run = self._run_engine_tasks if self.engine_tasks else _no_results
+        with ThreadPoolExecutor(1, thread_name_prefix="pgn-reader") as reader_executor, \
+                ProcessPoolExecutor(self.cpu_workers, initializer=_init_cpu_worker,
+                                    initargs=(tuple(self.board_analyzers),)) as cpu_executor, \
+                ThreadPoolExecutor(self.engine_threads, thread_name_prefix="engine-analysis") as engine_executor:
+            monitor = None
+            if progress_interval:
+                monitor = asyncio.create_task(self._monitor(progress_interval, stream))
+            sink = asyncio.create_task(self._sink())
+            engine_workers = [asyncio.create_task(self._work("engine", self.analyzed, self.finished, engine_run,
+                                                             engine_executor))
+                              for _ in range(self.engine_threads)]
+            cpu_workers = [asyncio.create_task(self._work("cpu", self.parsed, self.analyzed, cpu_run, cpu_executor))
+                           for _ in range(self.cpu_workers)]
+            feeder = asyncio.create_task(self._feed(pgn_files, reader_executor, cpu_workers, engine_workers, sink))
+            try:
+                # A stage task that dies would leave the others blocked on its queue: stop at the first failure.
+                done, _ = await asyncio.wait([feeder, *cpu_workers, *engine_workers, sink],
+                                             return_when=asyncio.FIRST_EXCEPTION)
+                for task in done:
+                    if task.exception() is not None:
+                        raise task.exception()
+            finally:
+                for task in [feeder, *cpu_workers, *engine_workers, sink]:
+                    task.cancel()
+                if monitor is not None:
+                    monitor.cancel()
+                    stream.write("\r" + " | ".join(map(str, self.counters.values())) + "\n")
+        return self.stats()
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Analyze PGN files with overlapping parsing, analysis and engine work.")
+    parser.add_argument("paths", nargs="+", help="PGN files or directories, or packed stores")
+    parser.add_argument("--analyzers", default=",".join(BOARD_ANALYZERS),
+                        help=f"comma-separated subset of {','.join(BOARD_ANALYZERS + tuple(ENGINE_TASKS))}")
+    parser.add_argument("--stockfish", default=None, help="engine path, needed by the engine analyses")
+    parser.add_argument("--engines", type=int, default=2, help="engine processes in the pool")
+    parser.add_argument("--engine-threads", type=int, default=None,
+                        help="games analysed with the engine at once (default: twice --engines)")
+    parser.add_argument("--cpu-workers", type=int, default=1, help="processes running the board analyzers")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="games held between stages")
+    parser.add_argument("--eco", default="OpeningCodes/tsv", help="ECO TSV directory")
+    parser.add_argument("--time-budget", type=float, default=None,
+                        help="engine seconds per game, spread over the eval timeline shared by the engine analyses; "
+                             "every engine thread spends it on its own game, so it is per game, per thread")
+    parser.add_argument("--eval-cache", default=None, help="SQLite file caching engine evaluations across runs")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between stage counter updates")
+    parser.add_argument("--output", default=None,
+                        help="write one flat record per game to a .jsonl, .csv or .npz (chunk prefix) file "
+                             "instead of printing")
+    args = parser.parse_args()
+
+    analyzer_names = [name for name in args.analyzers.split(",") if name]
+    unknown = set(analyzer_names) - set(BOARD_ANALYZERS) - set(ENGINE_TASKS)
+    if unknown:
+        parser.error(f"unknown analyzers: {', '.join(sorted(unknown))}")
+    engine = None
+    if set(analyzer_names) & set(ENGINE_TASKS):
+        if not args.stockfish:
+            parser.error("--stockfish is required by the engine analyses")
+        engine = connect_engine_pool(args.stockfish, size=args.engines)
+        if args.eval_cache:
+            engine = CachedEngine(engine, EvalCache(args.eval_cache))
+    sink = open_sink(args.output) if args.output else None
+    try:
+        pipeline = Pipeline(analyzer_names, engine, load_eco_database(args.eco), args.cpu_workers,
+                            args.engine_threads or 2 * args.engines, args.queue_size, sink, args.time_budget)
+        asyncio.run(pipeline.run(collect_pgn_files(args.paths, SOURCE_SUFFIXES), args.interval))
+    finally:
+        if sink is not None:
+            sink.close()
+        if engine is not None:
+            engine.quit()
+
+if __name__ == "__main__":
+    main()
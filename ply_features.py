@@ -0,0 +1,213 @@
+import argparse
+import array
+import json
+import os
+
+import chess
+import numpy as np
+
+from pgn_utils import collect_pgn_files
+from batch import SOURCE_SUFFIXES, iter_source
+from fork_analysis import PIECE_VALUES
+
+# Move flags, combined in the ``flags`` column.
+CAPTURE = 1
+CHECK = 2
+CASTLE_SHORT = 4
+CASTLE_LONG = 8
+EN_PASSANT = 16
+PROMOTION = 32
+CASTLE = CASTLE_SHORT | CASTLE_LONG
+FLAGS = {"capture": CAPTURE, "check": CHECK, "castle_short": CASTLE_SHORT, "castle_long": CASTLE_LONG,
+         "castle": CASTLE, "en_passant": EN_PASSANT, "promotion": PROMOTION}
+
+# Per-ply columns: (name, array typecode, dtype). Material and occupancy
+# describe the position after the move, mobility the position before it
+# (the legal moves the mover chose from).
+PLY_COLUMNS = (
+    ("game", "I", np.uint32),
+    ("ply", "H", np.uint16),
+    ("white", "B", np.bool_),
+    ("piece", "B", np.uint8),
+    ("from_square", "B", np.uint8),
+    ("to_square", "B", np.uint8),
+    ("flags", "B", np.uint8),
+    ("material", "h", np.int16),
+    ("mobility", "H", np.uint16),
+    ("white_occupied", "Q", np.uint64),
+    ("black_occupied", "Q", np.uint64),
+)
+MISSING_ELO = -1
+FEATURES_VERSION = 2
+
+def _material(board):
+    balance = 0
+    for piece_type in (chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN):
+        mask = board.pieces_mask(piece_type, chess.WHITE), board.pieces_mask(piece_type, chess.BLACK)
+        balance += PIECE_VALUES[piece_type] * (chess.popcount(mask[0]) - chess.popcount(mask[1]))
+    return balance
+
+def _elo(headers, name):
+    try:
+        elo = int(headers.get(name, ""))
+    except ValueError:
+        return MISSING_ELO
+    # Stored as int32; a header too large for that is as good as missing.
+    return elo if -2 ** 31 <= elo < 2 ** 31 else MISSING_ELO
+
+def extract_features(games, mobility=True):
+    """
+    Per-ply facts of ``games`` as dense NumPy arrays, for corpus statistics
+    as array reductions instead of analyzer runs.
+
+    Ply columns are those of :data:`PLY_COLUMNS`; ``game`` indexes the
+    per-game columns ``game_start`` (first row of each game, plus the total
+    row count at the end), ``white_elo``/``black_elo`` (``MISSING_ELO`` when
+    unknown), ``eco`` and ``result`` (header values, empty when missing).
+    ``material`` is White minus Black in pawns. ``mobility=False`` skips
+    legal move generation and leaves the column zero.
+    """
+    columns = {name: array.array(typecode) for name, typecode, _ in PLY_COLUMNS}
+    game_start, white_elo, black_elo, eco, result = array.array("q"), array.array("i"), array.array("i"), [], []
+    rows = 0
+    for game_number, game in enumerate(games):
+        game_start.append(rows)
+        white_elo.append(_elo(game.headers, "WhiteElo"))
+        black_elo.append(_elo(game.headers, "BlackElo"))
+        eco.append(game.headers.get("ECO", ""))
+        result.append(game.headers.get("Result", ""))
+        board = game.board()
+        material = _material(board)
+        ply = 0
+        for move in game.mainline_moves():
+            ply += 1
+            mover = board.turn
+            flags = 0
+            if board.is_castling(move):
+                flags |= CASTLE_SHORT if board.is_kingside_castling(move) else CASTLE_LONG
+            elif board.is_en_passant(move):
+                flags |= CAPTURE | EN_PASSANT
+                material += PIECE_VALUES[chess.PAWN] if mover else -PIECE_VALUES[chess.PAWN]
+            else:
+                captured = board.piece_type_at(move.to_square)
+                if captured is not None:
+                    flags |= CAPTURE
+                    material += PIECE_VALUES[captured] if mover else -PIECE_VALUES[captured]
+            if move.promotion:
+                flags |= PROMOTION
+                gain = PIECE_VALUES[move.promotion] - PIECE_VALUES[chess.PAWN]
+                material += gain if mover else -gain
+            columns["mobility"].append(board.legal_moves.count() if mobility else 0)
+            columns["piece"].append(board.piece_type_at(move.from_square))
+            board.push(move)
+            if board.is_check():
+                flags |= CHECK
+            columns["game"].append(game_number)
+            columns["ply"].append(ply)
+            columns["white"].append(mover)
+            columns["from_square"].append(move.from_square)
+            columns["to_square"].append(move.to_square)
+            columns["flags"].append(flags)
+            columns["material"].append(material)
+            columns["white_occupied"].append(board.occupied_co[chess.WHITE])
+            columns["black_occupied"].append(board.occupied_co[chess.BLACK])
+        rows += ply
+    game_start.append(rows)
+    features = {name: np.array(columns[name], dtype=dtype) for name, _, dtype in PLY_COLUMNS}
+    features["game_start"] = np.array(game_start, dtype=np.int64)
+    features["white_elo"] = np.array(white_elo, dtype=np.int32)
+    features["black_elo"] = np.array(black_elo, dtype=np.int32)
+    features["eco"] = np.array(eco, dtype="U3")
+    features["result"] = np.array(result, dtype="U7")
+    return features
+
+def save_features(path, features):
+    np.savez(path, version=np.array(FEATURES_VERSION), **features)
+
+def load_features(path):
+    """Load :func:`save_features` output; raises ValueError for another version."""
+    with np.load(path) as data:
+        if int(data["version"]) != FEATURES_VERSION:
+            raise ValueError(f"{path} has feature version {int(data['version'])}, expected {FEATURES_VERSION}.")
+        return {name: data[name] for name in data.files if name != "version"}
+
+def has_flag(features, flag):
+    """Boolean mask of the plies carrying any of ``flag``."""
+    return (features["flags"] & flag) != 0
+
+def count_per_game(features, flag, white=None):
+    """Plies with ``flag`` in each game, for both sides or only White (``True``) or Black (``False``)."""
+    mask = has_flag(features, flag)
+    if white is not None:
+        mask &= features["white"] == white
+    return np.bincount(features["game"][mask], minlength=len(features["white_elo"]))
+
+def first_ply(features, flag, white=None):
+    """Ply of the first move with ``flag`` in each game, -1 when there is none."""
+    mask = has_flag(features, flag)
+    if white is not None:
+        mask &= features["white"] == white
+    rows = np.flatnonzero(mask)
+    # Rows are in game and ply order, so the first row of each game holds its earliest ply.
+    games, first_rows = np.unique(features["game"][rows], return_index=True)
+    first = np.full(len(features["white_elo"]), -1, dtype=np.int32)
+    first[games] = features["ply"][rows[first_rows]]
+    return first
+
+def mover_elo(features):
+    """Elo of the player making each ply (``MISSING_ELO`` when unknown)."""
+    return np.where(features["white"], features["white_elo"][features["game"]],
+                    features["black_elo"][features["game"]])
+
+def rate_by_elo_band(features, flag, band=200):
+    """``{band start: (plies, plies with flag)}`` over the plies of rated players."""
+    elo = mover_elo(features)
+    rated = elo != MISSING_ELO
+    bands = elo[rated] // band
+    plies = np.bincount(bands)
+    hits = np.bincount(bands, weights=has_flag(features, flag)[rated], minlength=len(plies))
+    return {int(index * band): (int(plies[index]), int(hits[index])) for index in np.flatnonzero(plies)}
+
+def mean_by_eco(features, values, valid):
+    """``{ECO code: (games, mean)}`` of per-game ``values`` over the games where ``valid`` is set."""
+    codes, inverse = np.unique(features["eco"], return_inverse=True)
+    games = np.bincount(inverse, weights=valid, minlength=len(codes))
+    totals = np.bincount(inverse, weights=np.where(valid, values, 0), minlength=len(codes))
+    return {str(code): (int(games[index]), float(totals[index] / games[index]))
+            for index, code in enumerate(codes) if code and games[index]}
+
+def report(features):
+    """The corpus statistics printed by ``report``: en passant rate by Elo band and castling ply by ECO."""
+    en_passant = {elo: round(1000 * hits / plies, 3)
+                  for elo, (plies, hits) in rate_by_elo_band(features, EN_PASSANT).items()}
+    castling = {}
+    for white in (True, False):
+        ply = first_ply(features, CASTLE, white)
+        by_eco = mean_by_eco(features, ply, ply >= 0)
+        castling["white" if white else "black"] = {code: (games, round(mean, 1))
+                                                   for code, (games, mean) in sorted(by_eco.items())}
+    return {"games": len(features["white_elo"]), "plies": len(features["ply"]),
+            "en_passant_per_1000_plies_by_elo": en_passant, "castling_ply_by_eco": castling}
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract per-ply features of PGN files as NumPy arrays.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    extract_parser = subparsers.add_parser("extract", help="replay games and save their features")
+    extract_parser.add_argument("paths", nargs="+", help="PGN files or directories, or packed stores")
+    extract_parser.add_argument("--output", default="features.npz", help="output .npz file")
+    extract_parser.add_argument("--no-mobility", action="store_true", help="skip legal move counts")
+    report_parser = subparsers.add_parser("report", help="print corpus statistics of saved features")
+    report_parser.add_argument("features", help=".npz file written by extract")
+    args = parser.parse_args()
+
+    if args.command == "extract":
+        games = (game for path in collect_pgn_files(args.paths, SOURCE_SUFFIXES) for game in iter_source(path))
+        features = extract_features(games, mobility=not args.no_mobility)
+        save_features(args.output, features)
+        print(f"{len(features['white_elo'])} games, {len(features['ply'])} plies -> {args.output} "
+              f"({os.path.getsize(args.output)} bytes)")
+    else:
+        print(json.dumps(report(load_features(args.features)), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import chess
+import numpy as np
+
+from pgn_utils import collect_pgn_files, iter_games, load_pgn_index, read_game_at, shard_pgn
+from eco_utils import final_position_key, load_eco_database, position_key
+
+MANIFEST_NAME = "manifest.json"
+INDEX_VERSION = 1
+
+# Position entries, sorted by key, and per-game columns of a segment.
+ENTRY_COLUMNS = (("keys", np.uint64), ("games", np.uint32), ("plies", np.uint16))
+GAME_COLUMNS = (("game_file", np.uint32), ("game_number", np.uint32), ("game_offset", np.int64),
+                ("game_final", np.uint64), ("game_plies", np.uint16))
+
+def index_shard(pgn_file_path, file_no, start, stop):
+    """
+    Replay games ``start`` to ``stop`` of a file and return the position key
+    of every ply (the starting position is ply 0) plus per-game columns.
+    """
+    offsets = load_pgn_index(pgn_file_path)
+    keys, games, plies = [], [], []
+    game_columns = {name: [] for name, _ in GAME_COLUMNS}
+    for local, game in enumerate(iter_games(pgn_file_path, start, stop, mainline_only=True)):
+        board = game.board()
+        key = position_key(board)
+        keys.append(key)
+        ply = 0
+        for move in game.mainline_moves():
+            board.push(move)
+            ply += 1
+            key = position_key(board)
+            keys.append(key)
+        games.extend([local] * (ply + 1))
+        plies.extend(range(ply + 1))
+        game_columns["game_file"].append(file_no)
+        game_columns["game_number"].append(start + local)
+        game_columns["game_offset"].append(offsets[start + local]["offset"])
+        game_columns["game_final"].append(key)
+        game_columns["game_plies"].append(ply)
+    arrays = {"keys": keys, "games": games, "plies": plies, **game_columns}
+    return {name: np.array(arrays[name], dtype=dtype) for name, dtype in ENTRY_COLUMNS + GAME_COLUMNS}
+
+class PositionIndex:
+    """
+    Which games reached a position, answered without replaying the database.
+
+    Every ``update`` replays the new PGN files once and writes a segment:
+    the :func:`eco_utils.position_key` of every ply, sorted, next to the
+    game and ply it came from, as ``.npy`` columns that are memory-mapped
+    and binary searched at query time. Keys ignore castling rights and en
+    passant, so transpositions and an opening's ``final_fen`` match. Files
+    that changed since they were indexed are retired and indexed again in
+    the new segment; ``compact`` merges all segments into one.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.files = []
+        self.segments = []
+        self._mapped = {}
+        try:
+            with open(os.path.join(directory, MANIFEST_NAME), "r", encoding="utf-8") as manifest_file:
+                manifest = json.load(manifest_file)
+            if manifest.get("version") == INDEX_VERSION:
+                self.files, self.segments = manifest["files"], manifest["segments"]
+        except (OSError, ValueError):
+            pass
+
+    def _save_manifest(self):
+        manifest_path = os.path.join(self.directory, MANIFEST_NAME)
+        temp_path = f"{manifest_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as manifest_file:
+            json.dump({"version": INDEX_VERSION, "files": self.files, "segments": self.segments}, manifest_file)
+        os.replace(temp_path, manifest_path)
+
+    def _segment(self, name):
+        segment = self._mapped.get(name)
+        if segment is None:
+            path = os.path.join(self.directory, name)
+            segment = self._mapped[name] = {
+                column: np.load(os.path.join(path, f"{column}.npy"), mmap_mode="r")
+                for column, _ in ENTRY_COLUMNS + GAME_COLUMNS
+            }
+        return segment
+
+    def _write_segment(self, arrays):
+        name = f"seg-{max((int(s[4:]) for s in self.segments), default=0) + 1:06d}"
+        path = os.path.join(self.directory, name)
+        os.makedirs(path, exist_ok=True)
+        order = np.argsort(arrays["keys"], kind="stable")
+        for column, _ in ENTRY_COLUMNS:
+            np.save(os.path.join(path, f"{column}.npy"), arrays[column][order])
+        for column, _ in GAME_COLUMNS:
+            np.save(os.path.join(path, f"{column}.npy"), arrays[column])
+        return name
+
+    def update(self, pgn_files, workers=None):
+        """
+        Index new files, and files whose size or mtime changed, into one new
+        segment, replaying shards in parallel. Returns the indexed paths.
+        """
+        current = {entry["path"]: entry for entry in self.files if not entry["retired"]}
+        stale = []
+        for path in map(os.path.abspath, pgn_files):
+            stat = os.stat(path)
+            entry = current.get(path)
+            if entry is None or (entry["size"], entry["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+                if entry is not None:
+                    entry["retired"] = True
+                self.files.append({"path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                                   "retired": False})
+                stale.append((path, len(self.files) - 1))
+        if not stale:
+            return []
+
+        workers = workers or os.cpu_count() or 1
+        tasks = [(path, file_no, start, stop) for path, file_no in stale
+                 for start, stop in shard_pgn(path, workers * 4)]
+        with ProcessPoolExecutor(workers) as pool:
+            parts = list(pool.map(index_shard, *zip(*tasks))) if tasks else []
+        self.segments.append(self._write_segment(self._concatenate(parts)))
+        self._save_manifest()
+        return [path for path, _ in stale]
+
+    @staticmethod
+    def _concatenate(parts):
+        # Local game numbers of each part continue after the previous parts.
+        first_game = 0
+        for part in parts:
+            part["games"] = part["games"] + np.uint32(first_game)
+            first_game += len(part["game_file"])
+        return {column: np.concatenate([part[column] for part in parts]) if parts else np.array([], dtype=dtype)
+                for column, dtype in ENTRY_COLUMNS + GAME_COLUMNS}
+
+    def compact(self):
+        """Merge every segment into one, dropping the games of retired files."""
+        live = np.array([not entry["retired"] for entry in self.files], dtype=bool)
+        parts = []
+        for name in self.segments:
+            segment = self._segment(name)
+            keep_game = live[segment["game_file"]] if len(segment["game_file"]) else np.zeros(0, dtype=bool)
+            new_number = np.cumsum(keep_game) - 1
+            keep_entry = keep_game[segment["games"]]
+            part = {column: np.asarray(segment[column])[keep_entry] for column, _ in ENTRY_COLUMNS}
+            part["games"] = new_number[part["games"]].astype(np.uint32)
+            part.update({column: np.asarray(segment[column])[keep_game] for column, _ in GAME_COLUMNS})
+            parts.append(part)
+        old_segments = self.segments
+        merged = self._write_segment(self._concatenate(parts))
+        self.segments = [merged]
+        self._save_manifest()
+        self._mapped.clear()
+        for name in old_segments:
+            path = os.path.join(self.directory, name)
+            for column, _ in ENTRY_COLUMNS + GAME_COLUMNS:
+                os.remove(os.path.join(path, f"{column}.npy"))
+            os.rmdir(path)
+
+    def lookup(self, key):
+        """Yield ``(pgn_file_path, game_number, offset, ply)`` for every occurrence of ``key``."""
+        for name in self.segments:
+            segment = self._segment(name)
+            keys = segment["keys"]
+            start = np.searchsorted(keys, np.uint64(key), side="left")
+            stop = np.searchsorted(keys, np.uint64(key), side="right")
+            for game, ply in zip(segment["games"][start:stop].tolist(), segment["plies"][start:stop].tolist()):
+                entry = self.files[segment["game_file"][game]]
+                if not entry["retired"]:
+                    yield entry["path"], int(segment["game_number"][game]), int(segment["game_offset"][game]), ply
+
+    def find_fen(self, fen):
+        """Occurrences of the position of ``fen`` (placement and side to move)."""
+        return list(self.lookup(position_key(chess.Board(fen))))
+
+    def find_opening(self, opening):
+        """Games passing through an ECO entry's ``final_fen``."""
+        return list(self.lookup(final_position_key(opening["final_fen"], len(opening["moves"]))))
+
+    def find_duplicates(self):
+        """
+        Groups of ``(pgn_file_path, game_number, offset)`` with the same
+        final position and ply count: likely the same game stored twice.
+        """
+        games = {}
+        for name in self.segments:
+            segment = self._segment(name)
+            for game, (file_no, final, ply_count) in enumerate(zip(
+                    segment["game_file"].tolist(), segment["game_final"].tolist(), segment["game_plies"].tolist())):
+                entry = self.files[file_no]
+                if not entry["retired"]:
+                    games.setdefault((final, ply_count), []).append(
+                        (entry["path"], int(segment["game_number"][game]), int(segment["game_offset"][game])))
+        return [group for group in games.values() if len(group) > 1]
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the games that reached a position.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    update = subparsers.add_parser("update", help="index new or changed PGN files")
+    update.add_argument("index", help="index directory")
+    update.add_argument("paths", nargs="+", help="PGN files or directories")
+    update.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    compact = subparsers.add_parser("compact", help="merge all segments into one")
+    compact.add_argument("index", help="index directory")
+    query = subparsers.add_parser("query", help="list the games that reached a position or opening")
+    query.add_argument("index", help="index directory")
+    target = query.add_mutually_exclusive_group(required=True)
+    target.add_argument("--fen", help="position to look up")
+    target.add_argument("--eco", help="ECO code or opening name, looked up in the ECO database")
+    query.add_argument("--eco-directory", default="OpeningCodes/tsv", help="ECO TSV directory")
+    query.add_argument("--pgn", action="store_true", help="print the matching games")
+    duplicates = subparsers.add_parser("duplicates", help="list games stored more than once")
+    duplicates.add_argument("index", help="index directory")
+    args = parser.parse_args()
+
+    index = PositionIndex(args.index)
+    if args.command == "update":
+        updated = index.update(collect_pgn_files(args.paths), args.workers)
+        print(f"Indexed {len(updated)} file(s) into {len(index.segments)} segment(s).")
+    elif args.command == "compact":
+        index.compact()
+        print("Compacted into one segment.")
+    elif args.command == "duplicates":
+        for group in index.find_duplicates():
+            print("\t".join(f"{path}#{game_number}" for path, game_number, _ in group))
+    else:
+        if args.fen:
+            occurrences = index.find_fen(args.fen)
+        else:
+            openings = [entry for entry in load_eco_database(args.eco_directory)
+                        if args.eco in (entry["eco"], entry["name"])]
+            if not openings:
+                parser.error(f"no opening matches {args.eco!r}")
+            occurrences = [occurrence for opening in openings for occurrence in index.find_opening(opening)]
+        for path, game_number, offset, ply in occurrences:
+            if args.pgn:
+                print(read_game_at(path, offset), end="\n\n")
+            else:
+                print(f"{path}#{game_number}\tply {ply}")
+        print(f"{len(occurrences)} occurrence(s)")
+
+if __name__ == "__main__":
+    main()
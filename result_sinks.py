@@ -0,0 +1,253 @@
+import csv
+import glob
+import json
+import os
+
+import chess
+import numpy as np
+
+# One flat record per game: (column, kind, analyzer output key). "int"
+# columns hold numbers (Elo headers included), "str" text, "json" lists and
+# dicts as JSON text with moves in UCI, and "count" the length of a list.
+# Keys an analyzer returns that are not listed here go to the "extra" column.
+COLUMNS = (
+    ("white", "str", "White"),
+    ("black", "str", "Black"),
+    ("white_elo", "int", "WhiteElo"),
+    ("black_elo", "int", "BlackElo"),
+    ("result", "str", "Result"),
+    ("total_moves", "int", "TotalMoves"),
+    ("eco_code", "str", "ECOCode"),
+    ("opening_name", "str", "OpeningName"),
+    ("white_castling", "str", "WhiteCastling"),
+    ("black_castling", "str", "BlackCastling"),
+    ("draw_type", "str", "DrawType"),
+    ("winning_method", "str", "WinningMethod"),
+    ("miniature", "str", "Miniature"),
+    ("resignation_analysis", "str", "ResignationAnalysis"),
+    ("white_forks", "int", "White fork count"),
+    ("black_forks", "int", "Black fork count"),
+    ("white_fork_details", "json", "White fork details"),
+    ("black_fork_details", "json", "Black fork details"),
+    ("white_checks", "int", "white_checks"),
+    ("black_checks", "int", "black_checks"),
+    ("white_direct_checks", "int", "white_direct_checks"),
+    ("black_direct_checks", "int", "black_direct_checks"),
+    ("white_discovered_checks", "int", "white_discovered_checks"),
+    ("black_discovered_checks", "int", "black_discovered_checks"),
+    ("white_double_checks", "int", "white_double_checks"),
+    ("black_double_checks", "int", "black_double_checks"),
+    ("white_checking_pieces", "json", "white_checking_pieces"),
+    ("black_checking_pieces", "json", "black_checking_pieces"),
+    ("white_discovered_check_moves", "json", "whdc"),
+    ("black_discovered_check_moves", "json", "bldc"),
+    ("white_en_passant", "int", "white_en_passant_count"),
+    ("black_en_passant", "int", "black_en_passant_count"),
+    ("white_threats", "count", "white_threats"),
+    ("black_threats", "count", "black_threats"),
+    ("white_threat_details", "json", "white_threats"),
+    ("black_threat_details", "json", "black_threats"),
+    ("white_absolute_pins", "int", "White absolute pin count"),
+    ("black_absolute_pins", "int", "Black absolute pin count"),
+    ("white_relative_pins", "int", "White relative pin count"),
+    ("black_relative_pins", "int", "Black relative pin count"),
+    ("white_skewers", "int", "White skewer count"),
+    ("black_skewers", "int", "Black skewer count"),
+    ("white_xrays", "int", "White x-ray count"),
+    ("black_xrays", "int", "Black x-ray count"),
+    ("white_pin_details", "json", "White pin details"),
+    ("black_pin_details", "json", "Black pin details"),
+    ("white_zwischenzugs", "int", "White zwischenzug count"),
+    ("black_zwischenzugs", "int", "Black zwischenzug count"),
+    ("white_zwischenzug_types", "json", "White zwischenzug types"),
+    ("black_zwischenzug_types", "json", "Black zwischenzug types"),
+    ("zugzwangs", "count", "zugzwang_moments"),
+    ("zugzwang_moments", "json", "zugzwang_moments"),
+)
+SOURCE_KEYS = {key for _, _, key in COLUMNS}
+FIELDS = ("game_id", "error", *(column for column, _, _ in COLUMNS), "extra")
+INT_FIELDS = {column for column, kind, _ in COLUMNS if kind in ("int", "count")}
+MISSING_INT = -1  # stands for a missing number in .npz chunks
+NPZ_CHUNK_ROWS = 100000
+
+def _chunk_paths(prefix):
+    return sorted(glob.glob(f"{glob.escape(prefix)}-[0-9][0-9][0-9][0-9][0-9].npz"))
+
+def _json_default(value):
+    if isinstance(value, chess.Move):
+        return value.uci()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def to_json(value):
+    return json.dumps(value, default=_json_default, separators=(",", ":"), ensure_ascii=False)
+
+def _int(value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    # Number columns are int32 in .npz chunks; a value too large for that is as good as missing.
+    return value if -2 ** 31 <= value < 2 ** 31 else None
+
+def normalize(game_id, results, error=None):
+    """
+    Flatten one game's merged analyzer results into a record with the
+    fields of :data:`FIELDS`; fields of analyzers that did not run are None.
+    """
+    results = results or {}
+    record = {"game_id": game_id, "error": error}
+    for column, kind, key in COLUMNS:
+        value = results.get(key)
+        if value is None:
+            record[column] = None
+        elif kind == "int":
+            record[column] = _int(value)
+        elif kind == "count":
+            record[column] = len(value)
+        elif kind == "json":
+            record[column] = to_json(value)
+        else:
+            record[column] = str(value)
+    extra = {key: value for key, value in results.items() if key not in SOURCE_KEYS}
+    record["extra"] = to_json(extra) if extra else None
+    return record
+
+class _Sink:
+    # Sinks are callables with the (game_id, results, error) signature that
+    # batch.run_batch yields and pipeline.Pipeline calls.
+
+    def __call__(self, game_id, results, error=None):
+        self.write(normalize(game_id, results, error))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class JsonlSink(_Sink):
+    """
+    One JSON object per line; ``json`` fields stay JSON text, so every line
+    has the same shape. ``append`` adds to an existing file instead of
+    replacing it.
+    """
+
+    def __init__(self, path, flush_every=1000, append=False):
+        self._file = open(path, "a" if append else "w", encoding="utf-8")
+        self.flush_every = flush_every
+        self.rows = 0
+
+    def write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.rows += 1
+        if self.rows % self.flush_every == 0:
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+class CsvSink(_Sink):
+    """CSV with a header of :data:`FIELDS`; missing values are empty cells."""
+
+    def __init__(self, path, flush_every=1000):
+        self._file = open(path, "w", encoding="utf-8", newline="")
+        self._writer = csv.DictWriter(self._file, FIELDS)
+        self._writer.writeheader()
+        self.flush_every = flush_every
+        self.rows = 0
+
+    def write(self, record):
+        self._writer.writerow(record)
+        self.rows += 1
+        if self.rows % self.flush_every == 0:
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+class NpzSink(_Sink):
+    """
+    Columnar chunks ``<prefix>-00000.npz``, ``<prefix>-00001.npz``, ... of
+    ``chunk_rows`` games each, so memory stays bounded. Number columns are
+    int32 arrays with :data:`MISSING_INT` for missing values; text columns
+    are stored as UTF-8 bytes plus int64 offsets (``<name>.data`` and
+    ``<name>.offsets``), with a ``<name>.missing`` mask. Read them back with
+    :func:`load_npz`. Chunks left under the same prefix by an earlier run
+    are removed.
+    """
+
+    def __init__(self, prefix, chunk_rows=NPZ_CHUNK_ROWS):
+        self.prefix = prefix[:-4] if prefix.endswith(".npz") else prefix
+        self.chunk_rows = chunk_rows
+        self.chunks = 0
+        self.rows = 0
+        self._buffer = {field: [] for field in FIELDS}
+        for path in _chunk_paths(self.prefix):
+            os.remove(path)
+
+    def write(self, record):
+        for field in FIELDS:
+            self._buffer[field].append(record[field])
+        self.rows += 1
+        if len(self._buffer["game_id"]) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer["game_id"]:
+            return
+        arrays = {}
+        for field, values in self._buffer.items():
+            if field in INT_FIELDS:
+                arrays[field] = np.array([MISSING_INT if value is None else value for value in values], dtype=np.int32)
+            else:
+                encoded = [b"" if value is None else value.encode("utf-8") for value in values]
+                arrays[f"{field}.data"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+                arrays[f"{field}.offsets"] = np.cumsum([0] + [len(value) for value in encoded], dtype=np.int64)
+                arrays[f"{field}.missing"] = np.array([value is None for value in values], dtype=bool)
+        np.savez(f"{self.prefix}-{self.chunks:05d}.npz", **arrays)
+        self.chunks += 1
+        self._buffer = {field: [] for field in FIELDS}
+
+    def close(self):
+        self.flush()
+
+def _decode_text(data, offsets, missing):
+    raw = data.tobytes()
+    bounds = offsets.tolist()
+    return [None if absent else raw[start:stop].decode("utf-8")
+            for start, stop, absent in zip(bounds, bounds[1:], missing.tolist())]
+
+def load_npz(prefix, fields=None):
+    """
+    Concatenate the chunks written by :class:`NpzSink`. Number fields come
+    back as int32 arrays, text fields as lists of str (None when missing).
+    Loading only the needed ``fields`` skips decoding the others.
+    """
+    prefix = prefix[:-4] if prefix.endswith(".npz") else prefix
+    fields = fields or FIELDS
+    columns = {field: [] for field in fields}
+    for path in _chunk_paths(prefix):
+        with np.load(path) as chunk:
+            for field in fields:
+                if field in INT_FIELDS:
+                    columns[field].append(chunk[field])
+                else:
+                    columns[field].extend(_decode_text(chunk[f"{field}.data"], chunk[f"{field}.offsets"],
+                                                       chunk[f"{field}.missing"]))
+    for field in fields:
+        if field in INT_FIELDS:
+            columns[field] = np.concatenate(columns[field]) if columns[field] else np.zeros(0, dtype=np.int32)
+    return columns
+
+def open_sink(path):
+    """A sink chosen by the extension of ``path``: ``.jsonl``, ``.csv`` or ``.npz`` (chunk prefix)."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".jsonl", ".json"):
+        return JsonlSink(path)
+    if extension == ".csv":
+        return CsvSink(path)
+    if extension == ".npz":
+        return NpzSink(path)
+    raise ValueError(f"Unknown result format {extension!r}, expected .jsonl, .csv or .npz.")
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from move_walker import walk_game_results
+
+def game_hash(game):
+    """
+    Content hash of a game: its headers, starting position and mainline.
+    Games read from different files or offsets share results when equal.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps(sorted(game.headers.items())).encode("utf-8"))
+    digest.update(game.board().fen().encode("ascii"))
+    digest.update(" ".join(move.uci() for move in game.mainline_moves()).encode("ascii"))
+    return digest.hexdigest()
+
+def engine_settings(engine, options=None, search=None):
+    """
+    A string identifying the engine behind ``engine`` (through any wrappers),
+    the UCI ``options`` it was configured with and, for result keys, the
+    ``search`` settings the analyses ran with (see
+    :func:`eval_timeline.search_settings`).
+    """
+    while not hasattr(engine, "id") and (hasattr(engine, "engine") or hasattr(engine, "pool")):
+        engine = getattr(engine, "engine", None) or engine.pool
+    if hasattr(engine, "id"):
+        name = engine.id.get("name", "")
+    else:
+        # Engine pools only know the executable they start.
+        name = os.path.basename(getattr(engine, "engine_path", type(engine).__name__))
+    settings = {"engine": name, "options": options or {}}
+    if search:
+        settings["search"] = search
+    return json.dumps(settings, sort_keys=True)
+
+def _analyzer_key(analyzer, settings):
+    settings = " ".join(part for part in (settings if analyzer.uses_engine else "", analyzer.data_key) if part)
+    return analyzer.name or type(analyzer).__name__, analyzer.version, settings
+
+class ResultStore:
+    """
+    Analyzer results per game, in a SQLite file shared by runs and processes.
+
+    Results are pickled and keyed by (game content hash, analyzer name,
+    analyzer version, settings). The settings are the engine settings of
+    engine analyzers followed by the ``data_key`` of analyzers that read
+    other data (the ECO database hash of ``basic``); the rest are stored
+    with empty settings, so switching engines only recomputes engine
+    analyzers and editing the ECO files only those using them.
+    Entries of older versions or settings stay in the file until
+    :meth:`prune` removes them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Autocommit, as in EvalCache: several workers write to the same file.
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "game TEXT, analyzer TEXT, version INTEGER, settings TEXT, data BLOB, created REAL, "
+            "PRIMARY KEY (game, analyzer, version, settings))"
+        )
+
+    def get(self, game, analyzer, version, settings=""):
+        """Return the stored result, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data FROM results WHERE game = ? AND analyzer = ? AND version = ? AND settings = ?",
+                (game, analyzer, version, settings),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return pickle.loads(row[0])
+
+    def put(self, game, analyzer, version, settings, result):
+        data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                             (game, analyzer, version, settings, data, time.time()))
+
+    def get_or_compute(self, game, analyzer, version, settings, compute):
+        """Return the stored result, computing and storing it first when missing."""
+        result = self.get(game, analyzer, version, settings)
+        if result is None:
+            result = compute()
+            self.put(game, analyzer, version, settings, result)
+        return result
+
+    def prune(self, current):
+        """
+        Delete the entries of analyzers in ``current``, a dict of name to
+        ``(version, settings)``, stored under another version or settings.
+        Returns the number of entries deleted.
+        """
+        deleted = 0
+        with self._lock:
+            for analyzer, (version, settings) in current.items():
+                deleted += self._db.execute(
+                    "DELETE FROM results WHERE analyzer = ? AND NOT (version = ? AND settings = ?)",
+                    (analyzer, version, settings),
+                ).rowcount
+        return deleted
+
+    def stats(self):
+        with self._lock:
+            rows = self._db.execute("SELECT analyzer, version, COUNT(*) FROM results GROUP BY analyzer, version")
+            entries = {f"{analyzer} v{version}": count for analyzer, version, count in rows}
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def analyze_incremental(game, analyzers, store, settings="", instrumentation=None, prepare=None):
+    """
+    Return the merged results of ``analyzers`` for ``game``, as
+    :func:`move_walker.walk_game` would, replaying the game only for the
+    analyzers without a stored result and storing theirs. ``settings`` is
+    the :func:`engine_settings` of the engine the analyzers use.
+    ``prepare`` is called with the analyzers about to run before the
+    replay, e.g. to share an eval timeline among them.
+    """
+    key = game_hash(game)
+    keys = [_analyzer_key(analyzer, settings) for analyzer in analyzers]
+    stored = [store.get(key, *analyzer_key) for analyzer_key in keys]
+    missing = [index for index, result in enumerate(stored) if result is None]
+    if missing:
+        running = [analyzers[index] for index in missing]
+        if prepare is not None:
+            prepare(running)
+        fresh = walk_game_results(game, running, instrumentation)
+        for index, result in zip(missing, fresh):
+            store.put(key, *keys[index], result)
+            stored[index] = result
+    results = {}
+    for result in stored:
+        results.update(result)
+    return results
@@ -0,0 +1,90 @@
+import chess
+
+# Exchange values in pawns. The king only matters as the last capturer.
+SEE_VALUES = {
+    chess.PAWN: 1,
+    chess.KNIGHT: 3,
+    chess.BISHOP: 3,
+    chess.ROOK: 5,
+    chess.QUEEN: 9,
+    chess.KING: 100
+}
+
+def least_valuable_attacker(board, attackers):
+    """Return ``(square, piece_type)`` of the cheapest piece in the ``attackers`` mask."""
+    pieces = (board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings)
+    for piece_type, mask in zip(chess.PIECE_TYPES, pieces):
+        mask &= attackers
+        if mask:
+            return chess.lsb(mask), piece_type
+    return None, None
+
+def _swap(board, square, side, occupied, attacker_square, attacker_type, gain):
+    """
+    Play out the capture sequence on ``square`` with least valuable attackers
+    first. ``gain`` holds the balance after the first capture; removing each
+    capturer from ``occupied`` uncovers the sliders behind it (x-rays).
+    """
+    gains = [gain]
+    occupied &= ~chess.BB_SQUARES[attacker_square]
+    on_square = attacker_type
+    while True:
+        attackers = board.attackers_mask(side, square, occupied) & occupied
+        if not attackers:
+            break
+        attacker_square, attacker_type = least_valuable_attacker(board, attackers)
+        if attacker_type == chess.KING and board.attackers_mask(not side, square, occupied) & occupied:
+            break  # The king may not capture into a defended square.
+        gains.append(SEE_VALUES[on_square] - gains[-1])
+        occupied &= ~chess.BB_SQUARES[attacker_square]
+        on_square = attacker_type
+        side = not side
+
+    # Each side may stop capturing whenever continuing would lose material.
+    while len(gains) > 1:
+        last = gains.pop()
+        gains[-1] = -max(-gains[-1], last)
+    return gains[0]
+
+def see(board, move):
+    """
+    Static exchange evaluation of ``move`` for the side making it, in pawns:
+    the material it wins (or loses) once both sides have made every capture
+    on the destination square that pays off.
+    """
+    from_square, to_square = move.from_square, move.to_square
+    side = board.color_at(from_square)
+    occupied = board.occupied
+    if board.is_en_passant(move):
+        captured_square = to_square + (-8 if side else 8)
+        occupied &= ~chess.BB_SQUARES[captured_square]
+        gain = SEE_VALUES[chess.PAWN]
+    elif board.is_castling(move):
+        return 0
+    else:
+        target = board.piece_type_at(to_square)
+        gain = SEE_VALUES[target] if target else 0
+    moving_type = board.piece_type_at(from_square)
+    if move.promotion:
+        gain += SEE_VALUES[move.promotion] - SEE_VALUES[chess.PAWN]
+        moving_type = move.promotion
+    # The destination counts as occupied by the mover for the replies.
+    occupied |= chess.BB_SQUARES[to_square]
+    return _swap(board, to_square, not side, occupied, from_square, moving_type, gain)
+
+def see_square(board, square, color):
+    """
+    Material ``color`` wins by starting the exchange on ``square`` with its
+    least valuable attacker, in pawns; 0 when ``color`` does not attack the
+    square or it holds no enemy piece. Negative values are losing captures.
+    """
+    target = board.piece_type_at(square)
+    if target is None or board.color_at(square) == color:
+        return 0
+    attackers = board.attackers_mask(color, square)
+    if not attackers:
+        return 0
+    attacker_square, attacker_type = least_valuable_attacker(board, attackers)
+    if attacker_type == chess.KING and board.attackers_mask(not color, square):
+        return 0
+    return _swap(board, square, not color, board.occupied, attacker_square, attacker_type, SEE_VALUES[target])
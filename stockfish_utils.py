@@ -3,8 +3,35 @@ import chess.engine
 def evaluate_position(engine, board):
     return engine.analyse(board, chess.engine.Limit(time=0.1))
 
+def analyse_many(engine, boards, limit, **kwargs):
+    """
+    Yield the results of searching several positions, in order.
+    ``limit`` may also be a list with one limit per board.
+
+    An engine pool gets every search queued up front so they run
+    concurrently; a single engine searches lazily, so callers that stop
+    early skip the remaining searches.
+    """
+    limits = limit if isinstance(limit, list) else [limit] * len(boards)
+    if hasattr(engine, "submit"):
+        futures = [engine.submit(board, board_limit, **kwargs) for board, board_limit in zip(boards, limits)]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+    else:
+        for board, board_limit in zip(boards, limits):
+            yield engine.analyse(board, board_limit, **kwargs)
+
 def connect_stockfish(stockfish_path):
     return chess.engine.SimpleEngine.popen_uci(stockfish_path)
 
+def connect_engine_pool(stockfish_path, size=2, options=None):
+    """Start ``size`` engines sharing one request queue; see :class:`engine_pool.EnginePool`."""
+    from engine_pool import SyncEnginePool
+    return SyncEnginePool(stockfish_path, size, options)
+
 def disconnect_stockfish(engine):
     engine.quit()
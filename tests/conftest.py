@@ -0,0 +1,37 @@
+import os
+import sys
+
+import chess.engine
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pgn_utils import collect_pgn_files, iter_games  # noqa: E402
+from eco_utils import parse_eco_directory  # noqa: E402
+
+PGN_DIRECTORY = os.path.join(ROOT, "PgnFiles")
+ECO_DIRECTORY = os.path.join(ROOT, "OpeningCodes", "tsv")
+
+@pytest.fixture(scope="session")
+def games():
+    """Every game of PgnFiles/, mainline only, as the batch runner reads them."""
+    return [game for path in collect_pgn_files([PGN_DIRECTORY]) for game in iter_games(path, mainline_only=True)]
+
+@pytest.fixture(scope="session")
+def eco_database():
+    return parse_eco_directory(ECO_DIRECTORY)
+
+@pytest.fixture(scope="session")
+def engine():
+    """The deterministic fake_uci.py engine, so engine analyzers run without Stockfish."""
+    engine = chess.engine.SimpleEngine.popen_uci([sys.executable, os.path.join(ROOT, "fake_uci.py")])
+    yield engine
+    engine.quit()
+
+def positions(game):
+    """``(board, move)`` after every mainline move of ``game``, on board copies."""
+    board = game.board()
+    for move in game.mainline_moves():
+        board.push(move)
+        yield board.copy(), move
@@ -0,0 +1,124 @@
+import chess
+import pytest
+
+from conftest import positions
+from basic_analysis import analyze_game
+from batch import ANALYZERS, ENGINE_ANALYZERS
+from check_analysis import CheckAnalyzer, classify_check
+from eval_timeline import share_eval_timeline
+from fork_analysis import PIECE_VALUES, detect_fork_on_move
+from move_walker import walk_game
+from pin_analysis import ABSOLUTE_PIN, line_tactics
+from zugzwang_analysis import find_zugzwang_in_game
+from zwichenzug_analysis import analyze_zwischenzugs
+
+BOARD_ANALYZERS = [name for name in ANALYZERS if name not in ENGINE_ANALYZERS]
+
+def original_fork(board, move):
+    """detect_fork_on_move before it moved to attack bitboards, on board copies (print and comments dropped)."""
+    fork_targets = []
+    counter_fork_targets = []
+    attacker_square = move.to_square
+    attacking_piece = board.piece_at(attacker_square)
+    if not attacking_piece:
+        return None
+    for square in board.attacks(attacker_square):
+        target_piece = board.piece_at(square)
+        if target_piece and target_piece.color != attacking_piece.color:
+            protected = board.is_attacked_by(not attacking_piece.color, square)
+            if not board.is_pinned(target_piece.color, square) and (
+                    not protected or target_piece.piece_type == chess.KING):
+                fork_targets.append((square, target_piece.symbol(), PIECE_VALUES[target_piece.piece_type]))
+    for opponent_move in board.legal_moves:
+        temp_board = board.copy()
+        temp_board.push(opponent_move)
+        opponent_attacker = temp_board.piece_at(opponent_move.to_square)
+        if opponent_attacker and opponent_attacker.color != attacking_piece.color:
+            for opponent_square in temp_board.attacks(opponent_move.to_square):
+                target = temp_board.piece_at(opponent_square)
+                if target and target.color == attacking_piece.color and target.piece_type != chess.KING:
+                    counter_fork_targets.append((opponent_square, target.symbol(), PIECE_VALUES[target.piece_type]))
+    attacker_is_safe = all(
+        PIECE_VALUES[attacking_piece.piece_type] >= PIECE_VALUES[board.piece_at(attacker).piece_type]
+        for attacker in board.attackers(not attacking_piece.color, attacker_square))
+    fork_is_valid = True
+    for square, symbol, value in fork_targets:
+        for defender in board.attackers(not attacking_piece.color, square):
+            defender_piece = board.piece_at(defender)
+            if defender_piece and PIECE_VALUES[defender_piece.piece_type] <= value:
+                fork_is_valid = False
+    if len(fork_targets) >= 2 and attacker_is_safe and fork_is_valid:
+        return {
+            "attacker": attacking_piece.symbol(),
+            "attacker_square": chess.square_name(attacker_square),
+            "targets": [{"target_piece": symbol, "position": chess.square_name(square), "value": value,
+                         "protected": board.is_attacked_by(not attacking_piece.color, square)}
+                        for square, symbol, value in fork_targets],
+            "counter_fork": len(counter_fork_targets) >= 2,
+            "counter_fork_targets": [{"target_piece": symbol, "position": chess.square_name(square), "value": value}
+                                     for square, symbol, value in counter_fork_targets],
+        }
+    return None
+
+def test_fused_walk_matches_single_analyzer_walks(games):
+    for game in games:
+        fused = walk_game(game, [ANALYZERS[name](None, None) for name in BOARD_ANALYZERS])
+        separate = {}
+        for name in BOARD_ANALYZERS:
+            separate.update(walk_game(game, [ANALYZERS[name](None, None)]))
+        assert fused == separate
+
+def test_shared_timeline_matches_separate_engine_analyses(games, eco_database, engine):
+    for game in games:
+        analyzers = [ANALYZERS[name](engine, eco_database) for name in ANALYZERS]
+        share_eval_timeline(game, engine, analyzers)
+        fused = walk_game(game, analyzers)
+        separate = analyze_game(game, engine, eco_database)
+        separate["zugzwang_moments"] = find_zugzwang_in_game(game, engine)
+        separate.update(analyze_zwischenzugs(game, engine))
+        assert {key: fused[key] for key in separate} == separate
+
+def test_forks_match_original_implementation(games):
+    forks = 0
+    for game in games:
+        for board, move in positions(game):
+            fork = detect_fork_on_move(board, move)
+            assert fork == original_fork(board, move)
+            forks += fork is not None
+    assert forks > 0
+
+def test_checks_match_board_copy_reference(games):
+    checks = 0
+    for game in games:
+        for board, move in positions(game):
+            if not board.is_check():
+                continue
+            checks += 1
+            before = board.copy()
+            before.pop()
+            checkers = list(board.checkers())
+            # A checker that stood on its square before the move was uncovered, not moved.
+            discovered = [square for square in checkers if before.piece_at(square) == board.piece_at(square)]
+            direct, found_discovered = classify_check(board, move)
+            assert list(chess.SquareSet(found_discovered)) == discovered
+            assert bool(direct) == (len(discovered) < len(checkers))
+    assert checks > 0
+
+def test_check_counts_add_up(games):
+    for game in games:
+        results = walk_game(game, [CheckAnalyzer()])
+        for side in ("white", "black"):
+            assert results[f"{side}_direct_checks"] <= results[f"{side}_checks"]
+            assert results[f"{side}_double_checks"] <= results[f"{side}_discovered_checks"]
+            assert sum(results[f"{side}_checking_pieces"].values()) >= results[f"{side}_checks"]
+
+@pytest.mark.parametrize("color", chess.COLORS)
+def test_absolute_pins_match_is_pinned(games, color):
+    for game in games:
+        board = game.board()
+        for move in game.mainline_moves():
+            board.push(move)
+            pinned = {front for kind, _, front, _ in line_tactics(board, color) if kind == ABSOLUTE_PIN}
+            expected = {square for square in chess.SquareSet(board.occupied_co[not color])
+                        if board.is_pinned(not color, square)}
+            assert pinned == expected
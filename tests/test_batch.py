@@ -0,0 +1,70 @@
+import os
+import time
+
+import chess.pgn
+import pytest
+
+import batch
+from conftest import ECO_DIRECTORY, ROOT
+from move_walker import Analyzer
+from result_store import ResultStore
+
+FAKE_ENGINE = os.path.join(ROOT, "fake_uci.py")
+PGN = "".join(f'[Event "{event}"]\n\n1. e4 e5 2. Qh5 Nc6 *\n\n' for event in ("a", "b", "broken", "c", "d"))
+
+class CrashAnalyzer(Analyzer):
+    """Kills its worker process on the game with the "broken" event; other games are slow, to stay in flight."""
+
+    name = "crash"
+
+    def start(self, game, board):
+        if game.headers["Event"] == "broken":
+            os._exit(1)
+        time.sleep(0.3)
+
+@pytest.fixture
+def pgn_path(tmp_path):
+    path = tmp_path / "games.pgn"
+    path.write_text(PGN, encoding="utf-8")
+    return str(path)
+
+def test_shard_reads_on_after_a_game_that_fails_to_parse(monkeypatch, pgn_path):
+    read_game = chess.pgn.read_game
+
+    def failing_read_game(handle, *args, **kwargs):
+        game = read_game(handle, *args, **kwargs)
+        # Header scans for the offset index return bare Headers and still succeed.
+        if hasattr(game, "headers") and game.headers["Event"] == "broken":
+            raise ValueError("unreadable game")
+        return game
+
+    batch._init_worker(ECO_DIRECTORY, None, ("checks",), None)
+    monkeypatch.setattr(chess.pgn, "read_game", failing_read_game)
+    records = batch.analyze_task(pgn_path, 1, 5)
+    assert [game_id.rsplit("#", 1)[1] for game_id, _, _ in records] == ["1", "2", "3", "4"]
+    assert [error for _, _, error in records] == [None, "ValueError: unreadable game", None, None]
+    assert records[3][1]["white_checks"] == 0
+
+def test_only_the_crashing_task_is_reported(monkeypatch, pgn_path):
+    # Pool workers are forked, so they see the patched analyzer table.
+    monkeypatch.setitem(batch.ANALYZERS, "crash", lambda engine, eco_database: CrashAnalyzer())
+    tasks = batch.make_tasks([pgn_path], "game")
+    records = list(batch.run_batch(tasks, workers=2, eco_directory=ECO_DIRECTORY,
+                                   analyzer_names=("checks", "crash"), ordered=True))
+    assert [error for _, _, error in records] == [None, None, "worker crashed", None, None]
+
+def test_changing_the_time_budget_recomputes_engine_results(tmp_path, pgn_path):
+    store_path = str(tmp_path / "results.sqlite")
+    tasks = batch.make_tasks([pgn_path], "shard")
+
+    def run(time_budget):
+        list(batch.run_batch(tasks, workers=1, eco_directory=ECO_DIRECTORY, stockfish_path=FAKE_ENGINE,
+                             analyzer_names=("checks", "zwischenzug"), result_store_path=store_path,
+                             time_budget=time_budget))
+        with ResultStore(store_path) as store:
+            return dict(store._db.execute("SELECT analyzer, COUNT(*) FROM results GROUP BY analyzer"))
+
+    assert run(5.0) == {"checks": 5, "zwischenzug": 5}
+    assert run(5.0) == {"checks": 5, "zwischenzug": 5}
+    # Engine results are stored again under the new budget; board analyzer results are reused.
+    assert run(10.0) == {"checks": 5, "zwischenzug": 10}
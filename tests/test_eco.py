@@ -0,0 +1,54 @@
+import shutil
+
+import pytest
+
+from conftest import ECO_DIRECTORY
+from eco_cache import load_compiled_eco_database
+from eco_utils import EcoIndex, get_opening_name_and_code
+
+def linear_scan(board, eco_database):
+    """The original lookup: the longest opening whose moves prefix the game, first one on ties."""
+    game_moves = [move.uci() for move in board.move_stack]
+    best = None
+    for opening in eco_database:
+        if game_moves[:len(opening["moves"])] == opening["moves"]:
+            if len(opening["moves"]) > (len(best["moves"]) if best else 0):
+                best = opening
+    return best
+
+def opening_prefixes(game, max_depth):
+    board = game.board()
+    yield board.copy()
+    for move in list(game.mainline_moves())[:max_depth]:
+        board.push(move)
+        yield board.copy()
+
+@pytest.fixture(scope="module")
+def compiled(tmp_path_factory):
+    # A copy of the TSV files, so the cache is compiled here instead of next to the sources.
+    directory = tmp_path_factory.mktemp("eco") / "tsv"
+    shutil.copytree(ECO_DIRECTORY, directory, ignore=shutil.ignore_patterns(".*"))
+    database = load_compiled_eco_database(str(directory))
+    yield database
+    database.close()
+
+def test_index_finds_the_linear_scan_match_or_deeper(games, eco_database):
+    index = EcoIndex(eco_database)
+    for game in games:
+        for board in opening_prefixes(game, index.max_depth):
+            found, expected = index.match(board), linear_scan(board, eco_database)
+            if expected is None:
+                continue
+            assert found is not None
+            assert len(found["moves"]) >= len(expected["moves"])
+            game_moves = [move.uci() for move in board.move_stack]
+            if game_moves[:len(found["moves"])] == found["moves"]:
+                # Reached by its own move order: exactly what the scan returned.
+                assert found is expected
+
+def test_compiled_cache_matches_parsed_database(games, eco_database, compiled):
+    assert len(compiled) == len(eco_database)
+    assert list(compiled) == list(eco_database)
+    for game in games:
+        for board in opening_prefixes(game, compiled.index.max_depth):
+            assert get_opening_name_and_code(board, compiled) == get_opening_name_and_code(board, eco_database)
@@ -0,0 +1,34 @@
+import sqlite3
+
+import chess
+import chess.engine
+
+from eval_cache import EVAL_CACHE_VERSION, CachedEngine, EvalCache
+
+LIMIT = chess.engine.Limit(depth=5)
+
+def test_engines_with_other_options_do_not_share_entries(tmp_path, engine):
+    path = str(tmp_path / "evals.sqlite")
+    board = chess.Board()
+    with_hash = CachedEngine(engine, EvalCache(path), {"Hash": 16})
+    with_hash.analyse(board, LIMIT)
+    other = CachedEngine(engine, EvalCache(path), {"Hash": 32})
+    other.analyse(board, LIMIT)
+    assert other.cache.stats()["misses"] == 1
+    again = CachedEngine(engine, EvalCache(path), {"Hash": 16})
+    again.analyse(board, LIMIT)
+    assert again.cache.stats()["disk_hits"] == 1
+    for cached in (with_hash, other, again):
+        cached.cache.close()
+
+def test_files_of_an_older_version_are_emptied(tmp_path):
+    path = str(tmp_path / "evals.sqlite")
+    with sqlite3.connect(path) as db:
+        db.execute("CREATE TABLE evals (hash INTEGER, turn INTEGER, kind TEXT, amount REAL, multipv INTEGER, "
+                   "data TEXT, PRIMARY KEY (hash, turn, kind, amount, multipv))")
+        db.execute("INSERT INTO evals VALUES (1, 1, 'depth', 20, 1, '[]')")
+    db.close()
+    cache = EvalCache(path)
+    assert cache._db.execute("PRAGMA user_version").fetchone()[0] == EVAL_CACHE_VERSION
+    assert cache._db.execute("SELECT COUNT(*) FROM evals").fetchone()[0] == 0
+    cache.close()
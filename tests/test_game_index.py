@@ -0,0 +1,20 @@
+import os
+import shutil
+
+from conftest import PGN_DIRECTORY
+from game_index import GameIndex
+
+def test_update_drops_deleted_files(tmp_path):
+    paths = []
+    for name in ("Kirilmaz.pgn", "tal_kasparov.pgn"):
+        paths.append(str(tmp_path / name))
+        shutil.copy(os.path.join(PGN_DIRECTORY, name), paths[-1])
+    index = GameIndex(str(tmp_path / "index"))
+    assert index.update(paths, workers=1) == paths
+    deleted_chunk = index._chunk_path(index.files[paths[1]]["id"])
+    os.remove(paths[1])
+    assert GameIndex(index.directory).update(paths[:1], workers=1) == []
+    reopened = GameIndex(index.directory)
+    assert list(reopened.files) == paths[:1]
+    assert not os.path.exists(deleted_chunk)
+    assert {path for path, _ in reopened.query()} == {paths[0]}
@@ -0,0 +1,26 @@
+import pytest
+
+from move_store import CODECS, MoveStore, store_to_pgn, write_store
+from pgn_utils import iter_games
+
+def summary(game):
+    return list(game.headers.items()), list(game.mainline_moves())
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_store_round_trip(tmp_path, games, codec):
+    store_path = str(tmp_path / f"games-{codec}.pgnpack")
+    assert write_store(store_path, games, codec) == len(games)
+    with MoveStore(store_path) as store:
+        assert store.codec == codec
+        assert [summary(game) for game in store.iter_games()] == [summary(game) for game in games]
+        # Random access reads the same game as the sequential pass.
+        assert summary(store[len(store) - 1]) == summary(games[-1])
+        assert [game.board().fen() for game in store.iter_games()] == [game.board().fen() for game in games]
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_store_back_to_pgn(tmp_path, games, codec):
+    store_path = str(tmp_path / "games.pgnpack")
+    pgn_path = str(tmp_path / "games.pgn")
+    write_store(store_path, games, codec)
+    assert store_to_pgn(store_path, pgn_path) == len(games)
+    assert [summary(game) for game in iter_games(pgn_path, mainline_only=True)] == [summary(game) for game in games]
@@ -0,0 +1,11 @@
+from result_sinks import MISSING_INT, NpzSink, load_npz
+
+def test_npz_sink_stores_oversized_numbers_as_missing(tmp_path):
+    prefix = str(tmp_path / "results.npz")
+    with NpzSink(prefix) as sink:
+        sink("a", {"WhiteElo": "3000000000", "BlackElo": "2500"})
+        sink("b", {"WhiteElo": "-3000000000", "BlackElo": "bad"})
+    columns = load_npz(prefix, ["game_id", "white_elo", "black_elo"])
+    assert columns["game_id"] == ["a", "b"]
+    assert columns["white_elo"].tolist() == [MISSING_INT, MISSING_INT]
+    assert columns["black_elo"].tolist() == [2500, MISSING_INT]
@@ -1,5 +1,7 @@
 import chess
-import chess.engine
+
+from move_walker import Analyzer, walk_game
+from see import see_square
 
 PIECE_VALUES = {
     chess.PAWN: 1,
@@ -10,50 +12,53 @@ PIECE_VALUES = {
     chess.KING: float('inf')
 }
 
-def is_material_gain_threat(board, move, engine):
+def is_material_gain_threat(board, move, engine=None):
     """
-    Check if a move creates a threat for material gain.
+    Check if a move creates a threat for material gain: after the move, every
+    enemy piece the mover could win by starting an exchange on its square,
+    judged by static exchange evaluation (x-rays and capture order included).
+    Returns ``(square, piece_value, exchange_gain)`` tuples. ``engine`` is
+    ignored; it is kept for callers of the engine-based version.
     """
+    mover = board.turn
     board.push(move)  # Apply the move
     threats = []
-
-    # Analyze the current board position after the move...
-    for square, piece in board.piece_map().items():
-        if piece.color != board.turn:  # Opponent's pieces
-            defenders = board.attackers(not piece.color, square)
-            attackers = board.attackers(piece.color, square)
-
-            if attackers and (not defenders or len(attackers) > len(defenders)):
-                
-                piece_value = PIECE_VALUES[piece.piece_type]
-                defender_value = min(
-                    (PIECE_VALUES[board.piece_at(defender).piece_type] for defender in defenders),
-                    default=float('inf')  
-                )
-                if piece_value > defender_value:
-                    threats.append((square, piece_value, defender_value))
-
-    board.pop()  # Undo the move
+    try:
+        targets = board.occupied_co[not mover] & ~board.kings
+        for square in chess.scan_forward(targets):
+            if not board.attackers_mask(mover, square):
+                continue
+            gain = see_square(board, square, mover)
+            if gain > 0:
+                threats.append((square, PIECE_VALUES[board.piece_type_at(square)], gain))
+    finally:
+        board.pop()  # Undo the move
     return threats
 
-def analyze_game_material_threats(game, stockfish_path):
-    """
-    Analyze a game to find moves that create material gain threats.
-    """
-    with chess.engine.SimpleEngine.popen_uci(stockfish_path) as engine:
-        board = game.board()
-        threats = {"white_threats": [], "black_threats": []}
+class ThreatAnalyzer(Analyzer):
+    """Find moves that create material gain threats."""
 
-        for move in game.mainline_moves():
-            material_threats = is_material_gain_threat(board, move, engine)
+    name = "threats"
 
-            if material_threats:
-                if board.turn:  # Black's move
-                    threats["black_threats"].append((board.san(move), material_threats))
-                else:  # White's move
-                    threats["white_threats"].append((board.san(move), material_threats))
+    def start(self, game, board):
+        self.threats = {"white_threats": [], "black_threats": []}
 
-            board.push(move)
+    def before_push(self, ctx):
+        board, move = ctx.board, ctx.move
+        material_threats = is_material_gain_threat(board, move)
 
-    return threats
+        if material_threats:
+            if board.turn:  # White's move
+                self.threats["white_threats"].append((board.san(move), material_threats))
+            else:  # Black's move
+                self.threats["black_threats"].append((board.san(move), material_threats))
+
+    def finish(self, game, board):
+        return self.threats
 
+def analyze_game_material_threats(game, stockfish_path=None):
+    """
+    Analyze a game to find moves that create material gain threats.
+    ``stockfish_path`` is ignored: the detection no longer starts an engine.
+    """
+    return walk_game(game, [ThreatAnalyzer()])
@@ -1,11 +1,79 @@
 import chess
 import chess.pgn
 import chess.engine
+from pgn_utils import iter_games
+from stockfish_utils import analyse_many
+from move_walker import Analyzer
 
-def is_zugzwang(board, engine):
+ZUGZWANG_MODES = ("fast", "exact")
+# Part of the key of stored zugzwang results; bump when they change.
+ZUGZWANG_VERSION = 2
+
+# Fast mode: positions are only searched when they look like zugzwang material.
+CANDIDATE_MAX_MOBILITY = 6
+CANDIDATE_MAX_PIECE_MATERIAL = 13  # non-pawn material of both sides, in pawns
+FAST_DEPTH = 18
+ZUGZWANG_MARGIN = 100  # centipawns the obligation to move must cost
+MATE_SCORE = 100000
+
+PIECE_MATERIAL = {chess.KNIGHT: 3, chess.BISHOP: 3, chess.ROOK: 5, chess.QUEEN: 9}
+
+def is_zugzwang_candidate(board):
+    """
+    Cheap filter for the fast mode: the side to move is not in check and the
+    position is a pawn endgame, has little material left, or leaves few
+    legal moves.
+    """
+    if board.is_check():
+        return False
+    mobility = board.legal_moves.count()
+    if mobility == 0:
+        return False
+    piece_material = sum(value * len(board.pieces(piece_type, color))
+                         for piece_type, value in PIECE_MATERIAL.items()
+                         for color in chess.COLORS)
+    # Pawn endgames have no piece material at all.
+    return piece_material <= CANDIDATE_MAX_PIECE_MATERIAL or mobility <= CANDIDATE_MAX_MOBILITY
+
+def is_zugzwang_fast(board, engine, best=None, limit=None):
+    """
+    Confirm a zugzwang candidate with one search and one pass-turn search.
+
+    The position is zugzwang when even the best of the side to move's moves
+    scores at least ``ZUGZWANG_MARGIN`` below what it would get if it could
+    pass the turn (a null move). Only the best move matters, so a single-PV
+    search is enough: every other move scores no better. ``best`` may pass
+    the best line of an eval timeline searched with ``limit``, which then
+    replaces the first search; the pass-turn search uses the same limit.
+    """
+    if not is_zugzwang_candidate(board):
+        return False
+
+    limit = limit or chess.engine.Limit(depth=FAST_DEPTH)
+    info = best or engine.analyse(board, limit)
+    best_eval = info["score"].relative.score(mate_score=MATE_SCORE)
+
+    # Passing: same position with the opponent to move, sent as a FEN since
+    # engines do not accept null moves in the move list.
+    passed = chess.Board(board.fen())
+    passed.turn = not board.turn
+    passed.ep_square = None
+    pass_info = engine.analyse(passed, limit)
+    pass_eval = -pass_info["score"].relative.score(mate_score=MATE_SCORE)
+
+    return pass_eval - best_eval >= ZUGZWANG_MARGIN
+
+def is_zugzwang(board, engine, mode="fast", best=None, limit=None):
     """
     Check if the current position is a Zugzwang.
+    ``mode="exact"`` searches every legal move instead of the fast screen;
+    ``best`` and ``limit`` are passed to :func:`is_zugzwang_fast`.
     """
+    if mode == "fast":
+        return is_zugzwang_fast(board, engine, best, limit)
+    if mode != "exact":
+        raise ValueError(f"Unknown zugzwang mode {mode!r}, expected one of {ZUGZWANG_MODES}.")
+
     # Get evaluation for the current position
     initial_info = engine.analyse(board, chess.engine.Limit(depth=20))
     initial_eval = initial_info["score"].relative.score()
@@ -13,43 +81,74 @@ def is_zugzwang(board, engine):
     if initial_eval is None:
         return False  # If evaluation is unavailable, it's not Zugzwang
 
-    # Check all legal moves
+    # Check all legal moves; an engine pool searches them concurrently
+    replies = []
     for move in board.legal_moves:
         board.push(move)
-        try:
-            new_info = engine.analyse(board, chess.engine.Limit(depth=15))
-            new_eval = new_info["score"].relative.score()
-        finally:
-            board.pop()
-    
+        replies.append(board.copy())
+        board.pop()
+
+    for new_info in analyse_many(engine, replies, chess.engine.Limit(depth=15)):
+        new_eval = new_info["score"].relative.score()
         if new_eval is not None and new_eval >= initial_eval:
             return False
 
     # If all moves worsen the position, it's Zugzwang
     return True
 
-def find_zugzwang_positions(pgn_file_path, stockfish_path):
+def find_zugzwang_positions(pgn_file_path, stockfish_path, engine=None, mode="fast"):
     """
     Find Zugzwang positions in a PGN file.
+    A shared ``engine`` (or engine pool) is used when given; otherwise a
+    private engine is started from ``stockfish_path``. ``mode`` is passed to
+    :func:`is_zugzwang`.
     """
-    with open(pgn_file_path) as pgn_file, chess.engine.SimpleEngine.popen_uci(stockfish_path) as engine:
-        zugzwang_positions = []
-        game = chess.pgn.read_game(pgn_file)
-
-        while game:
-            board = game.board()
-            for move in game.mainline_moves():
-                board.push(move)
-                if is_zugzwang(board, engine) :
-                    zugzwang_positions.append({
-                        "fen": board.fen(),
-                        "zugzwang_side": "White" if board.turn == chess.WHITE else "Black",
-                        "last_move": move
-                    })
-
-            game = chess.pgn.read_game(pgn_file)
+    if engine is None:
+        with chess.engine.SimpleEngine.popen_uci(stockfish_path) as engine:
+            return find_zugzwang_positions(pgn_file_path, stockfish_path, engine, mode)
+
+    zugzwang_positions = []
+    for game in iter_games(pgn_file_path, mainline_only=True):
+        zugzwang_positions.extend(find_zugzwang_in_game(game, engine, mode))
     return {"zugzwang_moments": zugzwang_positions}
 
+def find_zugzwang_in_game(game, engine, mode="fast", timeline=None):
+    """
+    Zugzwang positions reached in the mainline of one game. In fast mode the
+    best lines of an eval ``timeline`` of the game replace the first search.
+    """
+    zugzwang_positions = []
+    board = game.board()
+    for ply, move in enumerate(game.mainline_moves(), 1):
+        board.push(move)
+        best = limit = None
+        if timeline is not None and mode == "fast":
+            best, limit = timeline.best(ply), timeline.limits[ply]
+        if is_zugzwang(board, engine, mode, best, limit):
+            zugzwang_positions.append({
+                "fen": board.fen(),
+                "zugzwang_side": "White" if board.turn == chess.WHITE else "Black",
+                "last_move": move
+            })
+    return zugzwang_positions
+
+class ZugzwangAnalyzer(Analyzer):
+    """Zugzwang moments of a game; fast mode reads a shared eval timeline when there is one."""
+
+    name = "zugzwang"
+    version = ZUGZWANG_VERSION
+    uses_engine = True
+
+    def __init__(self, engine, mode="fast"):
+        self.engine = engine
+        self.mode = mode
+        # Fast mode only searches candidate positions, fewer than a timeline
+        # has, so it reuses one built for other analyzers but never asks for one.
+        self.timeline = None
+
+    def finish(self, game, board):
+        return {"zugzwang_moments": find_zugzwang_in_game(game, self.engine, self.mode, self.timeline)}
+
 def correct_sides(result,board):
     if result == "1-0" and not board.turn or result == "0-1" and board.turn:
         return True
@@ -1,44 +1,89 @@
-from stockfish_utils import evaluate_position
 import chess
 import chess.pgn
-def analyze_zwischenzugs(game, engine):
-    board = game.board()
 
-    white_zwischenzug_count = 0
-    black_zwischenzug_count = 0
-    white_zwischenzug_types = []
-    black_zwischenzug_types = []
+from eval_timeline import MATE_SCORE, build_eval_timeline
+from move_walker import Analyzer
 
-    for move in game.mainline_moves():
-        current_turn = "White" if board.turn else "Black"
-        board.push(move)
+ZWISCHENZUG_MULTIPV = 5
+ZWISCHENZUG_THRESHOLD = 50  # centipawns
 
-        previous_eval = evaluate_position(engine, board)
-        previous_score = previous_eval['score'].relative
+PIECE_VALUES = {
+    chess.PAWN: 1,
+    chess.KNIGHT: 3,
+    chess.BISHOP: 3,
+    chess.ROOK: 5,
+    chess.QUEEN: 9,
+    chess.KING: 0
+}
 
-        opponent_moves = list(board.legal_moves)
-        zwischenzug_detected = False
-        zwischenzug_types = []
+def classify_reply(board, reply, score):
+    """Return the zwischenzug type of ``reply`` on ``board``, or None for a quiet move."""
+    if board.gives_check(reply):
+        return "Check"
+    if board.is_capture(reply):
+        return "Capture"
+    if score.is_mate() and score.mate() > 0:
+        return "Mate Threat"
+    # Attacks from the destination square against undefended or more valuable pieces.
+    piece = board.piece_at(reply.from_square)
+    board.push(reply)
+    try:
+        for square in board.attacks(reply.to_square) & board.occupied_co[board.turn]:
+            target = board.piece_at(square)
+            if (target.piece_type != chess.KING
+                    and (not board.is_attacked_by(board.turn, square)
+                         or PIECE_VALUES[target.piece_type] > PIECE_VALUES[piece.piece_type])):
+                return "Threatening to Capture"
+    finally:
+        board.pop()
+    return None
 
-        for opponent in opponent_moves:
-            board.push(opponent)
-            eval_after = evaluate_position(engine, board)
-            score_after = eval_after['score'].relative
+def find_zwischenzug_types(board, lines, threshold=ZWISCHENZUG_THRESHOLD):
+    """
+    Find the in-between replies among the engine's MultiPV ``lines`` for
+    ``board``: forcing replies that score more than ``threshold`` better for
+    the side to move than its best quiet reply.
+    """
+    forcing = []
+    quiet_scores = []
+    for line in lines:
+        if not line.get("pv"):
+            continue
+        score = line["score"].relative
+        cp = score.score(mate_score=MATE_SCORE)
+        reply_type = classify_reply(board, line["pv"][0], score)
+        if reply_type is None:
+            quiet_scores.append(cp)
+        else:
+            forcing.append((cp, reply_type))
+    if not forcing:
+        return []
+    # Without a quiet line the weakest line shown is the best bound available.
+    quiet_best = max(quiet_scores) if quiet_scores else min(cp for cp, _ in forcing)
+    return [reply_type for cp, reply_type in forcing if cp - quiet_best > threshold]
 
-            if abs(previous_score.score(mate_score=10000) - score_after.score(mate_score=10000)) > 50:
-                zwischenzug_detected = True
-                if board.is_check():
-                    zwischenzug_types.append("Check")
-                elif board.is_capture(opponent):
-                    zwischenzug_types.append("Capture")
-                elif board.gives_mate(opponent):
-                    zwischenzug_types.append("Mate Threat")
-                elif any(board.is_attacked_by(not board.turn, square) for square in board.legal_moves):
-                    zwischenzug_types.append("Threatening to Capture")
+def analyze_zwischenzugs(game, engine, timeline=None, budget=None):
+    """
+    Find the moves after which the opponent had a zwischenzug.
 
-            board.pop()
+    The detection reads MultiPV lines from an eval timeline: ``timeline`` may
+    be shared with other engine analyzers, otherwise one is built with one
+    search per ply, optionally spread over a :class:`eval_timeline.TimeBudget`.
+    """
+    if timeline is None or timeline.multipv < ZWISCHENZUG_MULTIPV:
+        timeline = build_eval_timeline(game, engine, multipv=ZWISCHENZUG_MULTIPV, budget=budget)
 
-        if zwischenzug_detected:
+    white_zwischenzug_count = 0
+    black_zwischenzug_count = 0
+    white_zwischenzug_types = []
+    black_zwischenzug_types = []
+
+    for ply in range(1, len(timeline)):
+        board = timeline.boards[ply]
+        current_turn = "White" if not board.turn else "Black"  # side that just moved
+        zwischenzug_types = find_zwischenzug_types(board, timeline.lines[ply])
+
+        if zwischenzug_types:
             if current_turn == "White":
                 white_zwischenzug_count += 1
                 white_zwischenzug_types.extend(zwischenzug_types)
@@ -55,3 +100,18 @@ def analyze_zwischenzugs(game, engine):
         "Black zwischenzug count": black_zwischenzug_count,
         "Black zwischenzug types": black_zwischenzug_types,
     }
+
+
+class ZwischenzugAnalyzer(Analyzer):
+    """:func:`analyze_zwischenzugs` as an analyzer, reading a shared eval timeline when there is one."""
+
+    name = "zwischenzug"
+    uses_engine = True
+    timeline_multipv = ZWISCHENZUG_MULTIPV
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.timeline = None
+
+    def finish(self, game, board):
+        return analyze_zwischenzugs(game, self.engine, self.timeline)